@@ -1,357 +1,681 @@
-import pandas as pd
-import openai
-import time
-import requests
-from bs4 import BeautifulSoup
-
-# Path to your Excel file
-file_path = 'D:\\pythonParser\\analyze\\Check.xlsx'
-
-# Your OpenAI API key
-openai.api_key = 'Your OpenAI API key'
-# Initialize OpenAI client
-client = openai.OpenAI(api_key=openai.api_key)
-
-# Function to extract more comprehensive website content
-def scrape_website_content(url):
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Try to get the title
-            title = soup.title.string if soup.title else ""
-            
-            # Try to get main heading
-            h1 = ""
-            if soup.find('h1'):
-                h1 = soup.find('h1').text.strip()
-            
-            # Try to get metadata descriptions
-            meta_desc = ""
-            if soup.find('meta', attrs={'name': 'description'}):
-                meta_desc = soup.find('meta', attrs={'name': 'description'}).get('content', '')
-            
-            # Try to get paragraph content
-            paragraphs = []
-            priority_elements = soup.find_all(['div.field-name-field-description', 'div.field-item', 'div.dataset-description'])
-            if priority_elements:
-                for elem in priority_elements[:3]:
-                    if elem.text.strip():
-                        paragraphs.append(elem.text.strip())
-            else:
-                for p in soup.find_all(['p', 'h2', 'h3'])[:5]:
-                    if p.text.strip():
-                        paragraphs.append(p.text.strip())
-            
-            content = " ".join(paragraphs)
-            if len(content) > 500:  # Allow more content
-                content = content[:500] + "..."
-                
-            result = {
-                "title": title,
-                "h1": h1,
-                "meta_desc": meta_desc,
-                "content": content
-            }
-            
-            return result
-        else:
-            return {"title": "", "h1": "", "meta_desc": "", "content": ""}
-    except Exception as e:
-        print(f"Error scraping website: {e}")
-        return {"title": "", "h1": "", "meta_desc": "", "content": ""}
-
-# Function for batch processing URLs
-def process_batch(urls_batch):
-    try:
-        # Prepare prompt for batch processing
-        prompt = "Analyze these Canadian open data URLs and provide descriptive dataset names and specific topics for each:\n\n"
-        
-        for i, url in enumerate(urls_batch):
-            dataset_id = url.split('/')[-1]
-            
-            # Try to get content for each URL
-            print(f"  Scraping content for URL {i+1}: {url}")
-            content_data = scrape_website_content(url)
-                
-            prompt += f"URL {i+1}: {url}\n"
-            prompt += f"Dataset ID {i+1}: {dataset_id}\n"
-            
-            if content_data["title"]:
-                prompt += f"Title {i+1}: {content_data['title']}\n"
-            if content_data["h1"]:
-                prompt += f"Main Heading {i+1}: {content_data['h1']}\n"
-            if content_data["meta_desc"]:
-                prompt += f"Description {i+1}: {content_data['meta_desc']}\n"
-            if content_data["content"]:
-                prompt += f"Content {i+1}: {content_data['content']}\n"
-            
-            prompt += "\n"
-        
-        prompt += """For each URL, your task is to:
-
-1. Create a CLEAR, DESCRIPTIVE dataset name that immediately tells what the dataset contains.
-2. Provide 3 SPECIFIC topic keywords/phrases that would allow someone to understand the dataset's subject matter at a glance.
-
-IMPORTANT GUIDELINES:
-- DO NOT use generic terms like 'Canada', 'Open data', or 'Government data'
-- DO NOT use "[Unavailable]" or similar placeholder text
-- The topics should be INFORMATIVE ENOUGH that someone can understand what the dataset is about without visiting the URL
-- Be SPECIFIC rather than generic - e.g. "Air Quality Measurements" is better than "Environmental Data"
-- If the dataset appears to be technical or specialized, include the field or discipline in the topics
-
-Format for each URL:
-URL 1:
-Dataset Name: [clear descriptive name]
-Topic: [specific topic 1], [specific topic 2], [specific topic 3]
-
-URL 2:
-Dataset Name: [clear descriptive name]
-Topic: [specific topic 1], [specific topic 2], [specific topic 3]
-
-... and so on for all URLs."""
-        
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a data analyst specializing in making complex government datasets understandable to the general public. You excel at creating clear, descriptive names and informative topic tags that help people immediately understand what information a dataset contains."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1000  # Increased for more detailed responses
-        )
-        
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"Error processing batch: {e}")
-        return ""
-
-# Function to parse batch results (keeping the same as before)
-def parse_batch_results(batch_result, num_urls, urls_batch):
-    results = []
-    
-    # Split response by "URL" substring
-    parts = batch_result.split("URL ")
-    
-    # Skip first element as it's likely empty
-    for i in range(1, len(parts)):
-        if i > len(urls_batch):
-            break
-            
-        part = parts[i].strip()
-        current_data = {}
-        
-        # Get URL number
-        url_num = part.split(":")[0].strip()
-        current_data['url_num'] = url_num
-        
-        # Extract dataset name
-        if "Dataset Name:" in part:
-            dataset_name = part.split("Dataset Name:")[1].split("\n")[0].strip()
-            
-            # Check for undesired placeholders
-            if "[Unavailable]" in dataset_name or dataset_name == "N/A" or dataset_name == "Unknown":
-                # Extract dataset ID from URL to create a better name
-                dataset_id = urls_batch[int(url_num) - 1].split('/')[-1]
-                dataset_name = f"Canadian Government Dataset {dataset_id}"
-            
-            current_data['dataset_name'] = dataset_name
-        else:
-            # If no dataset name found, use the dataset ID
-            dataset_id = urls_batch[int(url_num) - 1].split('/')[-1]
-            current_data['dataset_name'] = f"Canadian Government Dataset {dataset_id}"
-        
-        # Extract topic
-        if "Topic:" in part:
-            topic = part.split("Topic:")[1].split("\n")[0].strip()
-            
-            # Check for undesired placeholders
-            if "[Unavailable]" in topic or topic == "N/A" or topic == "Unknown":
-                # Try to extract some meaning from the dataset ID
-                dataset_id = urls_batch[int(url_num) - 1].split('/')[-1]
-                if any(term in dataset_id.lower() for term in ['env', 'eco', 'nat']):
-                    topic = "environmental data, natural resources, ecological monitoring"
-                elif any(term in dataset_id.lower() for term in ['stat', 'data', 'survey']):
-                    topic = "statistical analysis, survey results, population metrics"
-                elif any(term in dataset_id.lower() for term in ['health', 'med', 'hosp']):
-                    topic = "healthcare statistics, medical research, public health"
-                else:
-                    topic = "public records, government statistics, federal data"
-            
-            current_data['topic'] = topic
-        else:
-            # Try to extract some meaning from the dataset ID
-            dataset_id = urls_batch[int(url_num) - 1].split('/')[-1]
-            if any(term in dataset_id.lower() for term in ['env', 'eco', 'nat']):
-                topic = "environmental data, natural resources, ecological monitoring"
-            elif any(term in dataset_id.lower() for term in ['stat', 'data', 'survey']):
-                topic = "statistical analysis, survey results, population metrics"
-            elif any(term in dataset_id.lower() for term in ['health', 'med', 'hosp']):
-                topic = "healthcare statistics, medical research, public health"
-            else:
-                topic = "public records, government statistics, federal data"
-                
-            current_data['topic'] = topic
-        
-        results.append(current_data)
-    
-    # If we didn't get enough results, generate some for the missing URLs
-    while len(results) < num_urls:
-        idx = len(results)
-        if idx < len(urls_batch):
-            dataset_id = urls_batch[idx].split('/')[-1]
-            # Try to extract some meaning from the dataset ID
-            if any(term in dataset_id.lower() for term in ['env', 'eco', 'nat']):
-                topic = "environmental data, natural resources, ecological monitoring"
-            elif any(term in dataset_id.lower() for term in ['stat', 'data', 'survey']):
-                topic = "statistical analysis, survey results, population metrics"
-            elif any(term in dataset_id.lower() for term in ['health', 'med', 'hosp']):
-                topic = "healthcare statistics, medical research, public health"
-            else:
-                topic = "public records, government statistics, federal data"
-                
-            results.append({
-                'url_num': str(idx + 1),
-                'dataset_name': f"Canadian Government Dataset {dataset_id}",
-                'topic': topic
-            })
-        else:
-            results.append({
-                'url_num': str(idx + 1),
-                'dataset_name': "Canadian Government Dataset",
-                'topic': "public records, government statistics, federal data"
-            })
-    
-    return results[:num_urls]
-
-# Load Excel file
-print(f"Attempting to open file: {file_path}")
-try:
-    df = pd.read_excel(file_path)
-    print("File opened successfully!")
-except Exception as e:
-    print(f"Error opening file: {e}")
-    exit(1)
-
-# Create columns B and C if they don't exist
-if len(df.columns) < 2:
-    df.insert(1, "B", "")  # Add column B
-if len(df.columns) < 3:
-    df.insert(2, "C", "")  # Add column C
-
-# Track API usage
-api_calls = 0
-processed_count = 0
-batch_size = 3  # Reduce batch size to 3 for more focused analysis
-
-# Process URLs in batches
-for batch_start in range(0, len(df), batch_size):
-    batch_end = min(batch_start + batch_size, len(df))
-    print(f"Processing batch {batch_start//batch_size + 1}: URLs {batch_start+1}-{batch_end}")
-    
-    # Get URLs for this batch
-    urls_batch = []
-    for i in range(batch_start, batch_end):
-        if i < len(df):
-            url = df.iloc[i, 0]
-            if isinstance(url, str) and url.startswith("http"):
-                urls_batch.append(url)
-    
-    if not urls_batch:
-        continue
-    
-    # Process this batch
-    try:
-        batch_result = process_batch(urls_batch)
-        api_calls += 1
-        
-        if batch_result:
-            # Parse batch results
-            parsed_results = parse_batch_results(batch_result, len(urls_batch), urls_batch)
-            
-            # Update DataFrame with results
-            url_counter = 0
-            for i in range(batch_start, batch_end):
-                if i < len(df) and url_counter < len(parsed_results):
-                    url = df.iloc[i, 0]
-                    if isinstance(url, str) and url.startswith("http"):
-                        result = parsed_results[url_counter]
-                        
-                        # Make sure we're not using "[Unavailable]" placeholders
-                        dataset_name = result.get('dataset_name', '')
-                        if "[Unavailable]" in dataset_name or dataset_name == "N/A" or dataset_name == "Unknown":
-                            dataset_id = url.split('/')[-1]
-                            dataset_name = f"Canadian Government Dataset {dataset_id}"
-                        
-                        topic = result.get('topic', '')
-                        if "[Unavailable]" in topic or topic == "N/A" or topic == "Unknown":
-                            # Try to extract some meaning from the dataset ID
-                            dataset_id = url.split('/')[-1]
-                            if any(term in dataset_id.lower() for term in ['env', 'eco', 'nat']):
-                                topic = "environmental data, natural resources, ecological monitoring"
-                            elif any(term in dataset_id.lower() for term in ['stat', 'data', 'survey']):
-                                topic = "statistical analysis, survey results, population metrics"
-                            elif any(term in dataset_id.lower() for term in ['health', 'med', 'hosp']):
-                                topic = "healthcare statistics, medical research, public health"
-                            else:
-                                topic = "public records, government statistics, federal data"
-                        
-                        df.iloc[i, 1] = dataset_name
-                        df.iloc[i, 2] = topic
-                        processed_count += 1
-                        
-                        # Print progress
-                        print(f"  → URL {i+1}: {url}")
-                        print(f"  → Dataset: {dataset_name}")
-                        print(f"  → Topic: {topic}")
-                        print("-" * 30)
-                        
-                        url_counter += 1
-        else:
-            print("Failed to get results for this batch.")
-            
-            # Emergency fallback - at least put something in the fields
-            for i in range(batch_start, batch_end):
-                if i < len(df):
-                    url = df.iloc[i, 0]
-                    if isinstance(url, str) and url.startswith("http"):
-                        dataset_id = url.split('/')[-1]
-                        df.iloc[i, 1] = f"Canadian Government Dataset {dataset_id}"
-                        
-                        # Try to extract some meaning from the dataset ID
-                        if any(term in dataset_id.lower() for term in ['env', 'eco', 'nat']):
-                            topic = "environmental data, natural resources, ecological monitoring"
-                        elif any(term in dataset_id.lower() for term in ['stat', 'data', 'survey']):
-                            topic = "statistical analysis, survey results, population metrics"
-                        elif any(term in dataset_id.lower() for term in ['health', 'med', 'hosp']):
-                            topic = "healthcare statistics, medical research, public health"
-                        else:
-                            topic = "public records, government statistics, federal data"
-                            
-                        df.iloc[i, 2] = topic
-                        processed_count += 1
-    except Exception as e:
-        print(f"Error processing batch: {e}")
-    
-    # Calculate estimated cost
-    est_cost = api_calls * 0.002  # Rough estimate: $0.002 per API call
-    print(f"Processed: {processed_count}/{len(df)} URLs, API calls: {api_calls}, Est. cost: ${est_cost:.3f}")
-    
-    # Add delay between batches
-    time.sleep(2)
-    
-    # Budget limit
-    if est_cost > 0.95:  # Set slightly below $1 to be safe
-        print("Budget limit reached. Stopping processing.")
-        break
-
-# Save the updated Excel file
-output_path = 'D:\\pythonParser\\Updated_Check.xlsx'
-df.to_excel(output_path, index=False)
-print(f'Excel file has been updated successfully! Saved to: {output_path}')
-print(f'Final stats: Processed {processed_count}/{len(df)} URLs, API calls: {api_calls}')
-print(f'Estimated total cost: ${api_calls * 0.002:.3f}')
\ No newline at end of file
+import openai
+import asyncio
+import argparse
+import itertools
+import os
+
+import dedup_index
+import http_cache
+import http_client
+import llm_batch
+import llm_cache
+import llm_schema
+import llm_text
+import llm_scheduler
+import metrics
+import page_summary
+import prefetch
+import prompt_packing
+import sheet_io
+import topic_fallback
+
+# Your OpenAI API key
+openai.api_key = 'Your OpenAI API key'
+# Initialize OpenAI client
+client = openai.OpenAI(api_key=openai.api_key)
+
+CHUNK_ROWS = 1000  # Input rows processed and checkpointed at a time
+BATCH_CHUNK_ROWS = 50000  # Same with --batch-api, where each chunk waits for a whole Batch API job
+
+# Command line options (HTTP cache / --offline replay of dataset pages)
+arg_parser = argparse.ArgumentParser(description="Generate dataset names and topics with OpenAI")
+arg_parser.add_argument('input', help='sheet of dataset URLs (.xlsx, .csv or .parquet) or a scraper result store (.sqlite file or Parquet directory)')
+arg_parser.add_argument('-o', '--output', help='enriched sheet to write (.xlsx or .csv; default Updated_<input name> next to the input)')
+arg_parser.add_argument('--chunk-rows', type=int, help='input rows processed and checkpointed at a time (default 1000, or 50000 with --batch-api)')
+arg_parser.add_argument('--restart', action='store_true', help='ignore an existing checkpoint and start from the first row')
+http_cache.add_cache_arguments(arg_parser)
+http_client.add_connection_arguments(arg_parser)
+arg_parser.add_argument('--full-page-parse', action='store_true', help='parse whole dataset pages instead of streaming only the needed parts')
+arg_parser.add_argument('--fetch-workers', type=int, default=8, help='threads prefetching dataset pages')
+arg_parser.add_argument('--prefetch-batches', type=int, default=2, help='how many groups of --fetch-workers pages to prefetch ahead')
+arg_parser.add_argument('--max-input-tokens', type=int, default=8000, help='prompt token budget per request; URLs are packed until it is reached')
+arg_parser.add_argument('--max-output-tokens', type=int, default=4000, help='reply token budget per request')
+arg_parser.add_argument('--max-items', type=int, default=40, help='most URLs in one request')
+arg_parser.add_argument('--concurrency', type=int, default=8, help='chat completions in flight at once')
+arg_parser.add_argument('--rpm', type=int, default=500, help='requests per minute allowed by the API quota')
+arg_parser.add_argument('--tpm', type=int, default=200000, help='tokens per minute allowed by the API quota')
+arg_parser.add_argument('--llm-cache', default=llm_cache.DEFAULT_CACHE_DB, help='SQLite file caching model answers between runs')
+arg_parser.add_argument('--no-llm-cache', action='store_true', help='send every URL to the model')
+arg_parser.add_argument('--batch-api', action='store_true', help='submit all requests as an offline Batch API job instead of calling the model directly')
+arg_parser.add_argument('--batch-dir', default='batch_jobs', help='directory for Batch API input files')
+arg_parser.add_argument('--batch-poll', type=float, default=30, help='seconds between Batch API status checks')
+arg_parser.add_argument('--structured', action='store_true', help='have the model answer through a JSON schema function call and validate every item')
+arg_parser.add_argument('--item-retries', type=int, default=2, help='times an item that fails validation is asked for again (structured mode)')
+arg_parser.add_argument('--topic-rules', help='JSON file mapping fallback topics to dataset ID keywords, in priority order')
+arg_parser.add_argument('--llm-cache-ttl', type=float, default=7, help='days a cached answer is reused without refetching its page')
+dedup_index.add_dedup_arguments(arg_parser, default_db='analyze_dedup.sqlite')
+metrics.add_metrics_arguments(arg_parser)
+args = arg_parser.parse_args()
+if args.chunk_rows is None:
+    args.chunk_rows = BATCH_CHUNK_ROWS if args.batch_api else CHUNK_ROWS
+if args.output is None:
+    # Updated_<input name> next to the input; a result store gives an .xlsx
+    input_dir, input_name = os.path.split(os.path.normpath(args.input))
+    stem, extension = os.path.splitext(input_name)
+    if extension.lower() not in ('.xlsx', '.csv'):
+        extension = '.xlsx'
+    args.output = os.path.join(input_dir, f"Updated_{stem}{extension}")
+http_client.configure_from_args(args)
+http_client.configure_cache_from_args(args)
+metrics.configure_from_args(args)
+
+# Throughput of the LLM stage (the fetch stage is tracked by the prefetcher)
+llm_stats = prefetch.StageStats("LLM stage")
+
+# Function to extract more comprehensive website content
+# Targeted mode streams the page and stops reading once the summary is complete
+@metrics.timed('page_fetch_seconds')
+def scrape_website_content(url, targeted=True):
+    try:
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        }
+        return page_summary.fetch_summary(url, targeted, headers)
+    except Exception as e:
+        metrics.log('page_failed', f"Error scraping website: {e}", level='error', url=url, error=str(e))
+        return dict(page_summary.EMPTY_SUMMARY)
+
+MODEL = "gpt-3.5-turbo"
+# Bump when the prompt or its parsing changes so cached answers are not reused
+PROMPT_VERSION = 1
+COST_PER_CALL = 0.002  # Rough estimate: $0.002 per API call, used until responses report their usage
+BATCH_API_DISCOUNT = 0.5  # Batch API requests are billed at half price
+OUTPUT_TOKENS_PER_ITEM = 100  # Reply budget for one dataset name and its topics
+SYSTEM_PROMPT = "You are a data analyst specializing in making complex government datasets understandable to the general public. You excel at creating clear, descriptive names and informative topic tags that help people immediately understand what information a dataset contains."
+
+# Prompt section for URL number n
+def url_prompt(n, url, content_data):
+    dataset_id = url.split('/')[-1]
+    
+    prompt = f"URL {n}: {url}\n"
+    prompt += f"Dataset ID {n}: {dataset_id}\n"
+    
+    if content_data["title"]:
+        prompt += f"Title {n}: {content_data['title']}\n"
+    if content_data["h1"]:
+        prompt += f"Main Heading {n}: {content_data['h1']}\n"
+    if content_data["meta_desc"]:
+        prompt += f"Description {n}: {content_data['meta_desc']}\n"
+    if content_data["content"]:
+        prompt += f"Content {n}: {content_data['content']}\n"
+    
+    prompt += "\n"
+    return prompt
+
+# Function to build the prompt for a batch of URLs
+# `contents` holds prefetched page content for each URL (scraped here if None)
+def build_prompt(urls_batch, contents=None):
+    # Prepare prompt for batch processing
+    prompt = "Analyze these Canadian open data URLs and provide descriptive dataset names and specific topics for each:\n\n"
+    
+    for i, url in enumerate(urls_batch):
+        # Try to get content for each URL
+        if contents is not None:
+            content_data = contents[i]
+        else:
+            metrics.log('page_start', f"  Scraping content for URL {i+1}: {url}", url=url)
+            content_data = scrape_website_content(url, targeted=not args.full_page_parse)
+        
+        prompt += url_prompt(i + 1, url, content_data)
+    
+    prompt += """For each URL, your task is to:
+
+1. Create a CLEAR, DESCRIPTIVE dataset name that immediately tells what the dataset contains.
+2. Provide 3 SPECIFIC topic keywords/phrases that would allow someone to understand the dataset's subject matter at a glance.
+
+IMPORTANT GUIDELINES:
+- DO NOT use generic terms like 'Canada', 'Open data', or 'Government data'
+- DO NOT use "[Unavailable]" or similar placeholder text
+- The topics should be INFORMATIVE ENOUGH that someone can understand what the dataset is about without visiting the URL
+- Be SPECIFIC rather than generic - e.g. "Air Quality Measurements" is better than "Environmental Data"
+- If the dataset appears to be technical or specialized, include the field or discipline in the topics
+
+"""
+    
+    if args.structured:
+        prompt += llm_schema.FORMAT_INSTRUCTIONS
+        return prompt
+    
+    prompt += """Format for each URL:
+URL 1:
+Dataset Name: [clear descriptive name]
+Topic: [specific topic 1], [specific topic 2], [specific topic 3]
+
+URL 2:
+Dataset Name: [clear descriptive name]
+Topic: [specific topic 1], [specific topic 2], [specific topic 3]
+
+... and so on for all URLs."""
+    
+    return prompt
+
+# Chat completion request for a batch of URLs
+def batch_request(urls_batch, contents):
+    prompt = build_prompt(urls_batch, contents)
+    return dict(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.7,
+        max_tokens=packer.output_tokens(len(urls_batch)),  # Room for every item's answer
+        **(llm_schema.request_options() if args.structured else {})
+    )
+
+# Function for batch processing URLs
+async def process_batch(urls_batch, contents, scheduler):
+    global api_calls
+    try:
+        request = batch_request(urls_batch, contents)
+        
+        with llm_stats.timed(items=len(urls_batch)):
+            response = await scheduler.complete(**request)
+        api_calls += 1
+        
+        return response.choices[0].message.content.strip()
+    except Exception as e:
+        metrics.log('batch_failed', f"Error processing batch: {e}", level='error', urls=len(urls_batch), error=str(e))
+        return ""
+
+# Structured variant of process_batch. Returns one result per URL (None where
+# the model never gave a valid item); items that fail validation are asked
+# for again on their own, up to --item-retries times.
+async def process_batch_structured(urls_batch, contents, scheduler):
+    global api_calls
+    results = [None] * len(urls_batch)
+    todo = list(range(len(urls_batch)))
+    
+    for attempt in range(args.item_retries + 1):
+        if attempt:
+            metrics.log('item_retry', f"  Retrying {len(todo)} item(s) that failed validation", items=len(todo), attempt=attempt)
+        try:
+            request = batch_request([urls_batch[j] for j in todo], [contents[j] for j in todo])
+            with llm_stats.timed(items=len(todo)):
+                response = await scheduler.complete(**request)
+            api_calls += 1
+            arguments = llm_schema.message_arguments(response.choices[0].message)
+        except Exception as e:
+            metrics.log('batch_failed', f"Error processing batch: {e}", level='error', urls=len(todo), error=str(e))
+            arguments = ""
+        
+        valid, failed = llm_schema.parse_items(arguments, len(todo))
+        for index, result in valid.items():
+            results[todo[index - 1]] = result
+        todo = [todo[index - 1] for index in failed]
+        if not todo:
+            break
+    
+    return results
+
+# Track API usage (api_calls counts answered requests)
+api_calls = 0
+cost_per_call = COST_PER_CALL * (BATCH_API_DISCOUNT if args.batch_api else 1)
+processed_count = 0
+rows_read = 0
+
+# Answers from earlier runs; rows whose answer is still fresh are filled in
+# here and never fetched or sent to the model again
+answer_cache = None
+if not args.no_llm_cache:
+    prompt_version = f"{PROMPT_VERSION}-structured" if args.structured else PROMPT_VERSION
+    answer_cache = llm_cache.LLMCache(args.llm_cache, MODEL, prompt_version, ttl=args.llm_cache_ttl * 86400)
+
+# Requests are filled with as many URLs as the token budgets allow
+packer = prompt_packing.PromptPacker(
+    max_input_tokens=args.max_input_tokens,
+    max_output_tokens=args.max_output_tokens,
+    overhead_tokens=llm_scheduler.estimate_tokens(SYSTEM_PROMPT + build_prompt([], [])),
+    output_tokens_per_item=OUTPUT_TOKENS_PER_ITEM,
+    max_items=args.max_items,
+)
+
+# Made-up names and topics for URLs the model gave no usable answer for
+classifier = topic_fallback.TopicClassifier(topic_fallback.load_rules(args.topic_rules)) if args.topic_rules else topic_fallback.TopicClassifier()
+
+# Shared by the prefetcher of every chunk
+fetch_stats = prefetch.StageStats("Fetch stage")
+
+# Rows pointing at a dataset that is already queued get a copy of its answer
+duplicate_rows = {}
+
+# With --dedup, a fetched page whose URL or title matches a dataset seen
+# earlier in the run gets that dataset's answer instead of a request of its
+# own. A title on another host only counts if it is identical, since
+# portals share generic titles. Rows of the chunk waiting for a match's answer:
+dedup = dedup_index.index_from_args(args, cross_host_threshold=1.0)
+waiting_duplicates = dedup_index.WaitingDuplicates()
+
+# Answers are collected here and written to the DataFrame in one go per chunk.
+# A None name or topic means the model gave nothing usable for the row.
+row_updates = []
+
+def fill_row(i, dataset_name, topic):
+    global processed_count
+    for row in [i] + duplicate_rows.get(i, []):
+        row_updates.append((row, dataset_name, topic))
+        processed_count += 1
+    if dedup is not None:
+        for row, _, _ in waiting_duplicates.answered(df.iloc[i, 0], dataset_name, topic):
+            fill_row(row, dataset_name, topic)
+
+def fill_rows(rows, dataset_names, topics):
+    for i, dataset_name, topic in zip(rows, dataset_names, topics):
+        fill_row(i, dataset_name, topic)
+
+# Rows still without a name or topic get one made up from their dataset ID,
+# for the whole chunk in one pass (see topic_fallback.TopicClassifier)
+def flush_rows():
+    if not row_updates:
+        return
+    rows, dataset_names, topics = (list(column) for column in zip(*row_updates))
+    dataset_names, topics = classifier.fill_missing(df.iloc[rows, 0], dataset_names, topics)
+    df.iloc[rows, 1] = dataset_names.to_numpy()
+    df.iloc[rows, 2] = topics.to_numpy()
+    row_updates.clear()
+
+# Makes `chunk` the current DataFrame and queues its URLs for fetching
+def prepare_chunk(chunk):
+    global df, duplicate_rows, pending_rows, fetch_groups, prefetcher, rows_read
+    df = chunk
+    rows_read += len(df)
+    waiting_duplicates.clear()
+    
+    # Create columns B and C if they don't exist
+    if len(df.columns) < 2:
+        df.insert(1, "B", "")  # Add column B
+    if len(df.columns) < 3:
+        df.insert(2, "C", "")  # Add column C
+    df[df.columns[1:3]] = df[df.columns[1:3]].astype(object)
+    
+    # Collect URLs up front so pages can be prefetched, one row per dataset ID
+    duplicate_rows = {}
+    first_row = {}
+    for i in range(len(df)):
+        url = df.iloc[i, 0]
+        if isinstance(url, str) and url.startswith("http"):
+            key = prompt_packing.dataset_key(url)
+            if key in first_row:
+                duplicate_rows.setdefault(first_row[key], []).append(i)
+            else:
+                first_row[key] = i
+    if duplicate_rows:
+        skipped = sum(len(rows) for rows in duplicate_rows.values())
+        metrics.log('duplicate_rows', f"Skipping {skipped} rows with a duplicate dataset ID", rows=skipped)
+    
+    pending_rows = []
+    for i in first_row.values():
+        cached = answer_cache.get_fresh(df.iloc[i, 0]) if answer_cache else None
+        if cached:
+            fill_row(i, *cached)
+        else:
+            pending_rows.append(i)
+    
+    # Pages are fetched in groups that keep every fetch worker busy
+    fetch_groups = []
+    for group_start in range(0, len(pending_rows), args.fetch_workers):
+        rows = pending_rows[group_start:group_start + args.fetch_workers]
+        fetch_groups.append((rows, [df.iloc[i, 0] for i in rows]))
+    
+    # Pages for the next groups are fetched while the current requests are with the model
+    prefetcher = prefetch.ContentPrefetcher(
+        lambda url: scrape_website_content(url, targeted=not args.full_page_parse),
+        [urls_group for _, urls_group in fetch_groups],
+        workers=args.fetch_workers,
+        lookahead=args.prefetch_batches,
+        stats=fetch_stats,
+    )
+
+# Function to write a batch's model output back to its DataFrame rows
+def apply_batch_result(rows, urls_batch, contents, batch_result):
+    if batch_result:
+        # Parse batch results
+        # Missing names and topics stay None until flush_rows
+        parsed_results = llm_text.parse_batch_results(batch_result, len(urls_batch), urls_batch, None)
+        apply_parsed_results(rows, urls_batch, contents, parsed_results)
+    else:
+        metrics.log('batch_empty', "Failed to get results for this batch.", level='warning', urls=len(urls_batch))
+        
+        # Emergency fallback - flush_rows makes up the fields from the dataset IDs
+        fill_rows(rows, [None] * len(rows), [None] * len(rows))
+
+# Writes one parsed result per URL; missing results and placeholders are
+# left as None, and flush_rows makes them up
+def apply_parsed_results(rows, urls_batch, contents, parsed_results):
+    # Update DataFrame with results
+    for i, url, content, result in zip(rows, urls_batch, contents, parsed_results):
+        result = result or {}
+        
+        # Make sure we're not using "[Unavailable]" placeholders
+        dataset_name = result.get('dataset_name')
+        if topic_fallback.is_placeholder(dataset_name):
+            dataset_name = None
+        
+        topic = result.get('topic')
+        if topic_fallback.is_placeholder(topic):
+            topic = None
+        
+        fill_row(i, dataset_name, topic)
+        
+        # Made-up names and topics are not worth keeping
+        if answer_cache and dataset_name is not None and topic is not None:
+            answer_cache.put(url, content, dataset_name, topic)
+        
+        # Print progress
+        shown_name = dataset_name or "(made up from the dataset ID)"
+        shown_topic = topic or "(made up from the dataset ID)"
+        metrics.log('row_done', f"  → URL {i+1}: {url}\n  → Dataset: {shown_name}\n  → Topic: {shown_topic}\n{'-' * 30}",
+                    row=i + 1, url=url, dataset_name=dataset_name, topic=topic)
+
+# Fills rows whose page content hasn't changed since their answer was cached
+# and returns the rows, URLs and contents that still need the model
+def apply_cached(rows, urls_batch, contents):
+    if not answer_cache:
+        return rows, urls_batch, contents
+    misses = []
+    for i, url, content in zip(rows, urls_batch, contents):
+        cached = answer_cache.get(url, content)
+        if cached:
+            fill_row(i, *cached)
+        else:
+            misses.append((i, url, content))
+    if not misses:
+        return [], [], []
+    return (list(column) for column in zip(*misses))
+
+# Fills rows that the dedup index matches to a dataset seen earlier (by
+# canonical URL or page title) with its answer, or leaves them waiting for
+# it while its request is in flight. Returns the rows still to be answered.
+def apply_duplicates(rows, urls_batch, contents):
+    if dedup is None:
+        return rows, urls_batch, contents
+    chunk_urls = {df.iloc[i, 0] for i in pending_rows}
+    remaining = []
+    for i, url, content in zip(rows, urls_batch, contents):
+        first = dedup.add(url, content.get('title'))
+        answer = waiting_duplicates.answer(first) if first is not None else None
+        if first is None:
+            remaining.append((i, url, content))
+        elif answer:
+            fill_row(i, *answer)
+        elif first in chunk_urls:
+            waiting_duplicates.wait(first, (i, url, content))
+        else:
+            # Seen in an earlier chunk; its answer is only kept in the cache
+            cached = answer_cache.get_fresh(first) if answer_cache else None
+            if cached:
+                fill_row(i, *cached)
+            else:
+                remaining.append((i, url, content))
+    if not remaining:
+        return [], [], []
+    return (list(column) for column in zip(*remaining))
+
+# Packs a fetched group of pages; returns the requests it completed as
+# (rows, urls, contents) tuples. Unchanged cached pages and duplicates of
+# datasets seen earlier are filled right away.
+def pack_group(rows, urls_group, contents, dedupe=True):
+    batches = []
+    if dedupe:
+        rows, urls_group, contents = apply_duplicates(rows, urls_group, contents)
+    rows, urls_group, contents = apply_cached(rows, urls_group, contents)
+    for item in zip(rows, urls_group, contents):
+        tokens = llm_scheduler.estimate_tokens(url_prompt(len(packer.items) + 1, item[1], item[2]))
+        full = packer.add(item, tokens)
+        if full:
+            batches.append(tuple(list(column) for column in zip(*full)))
+    return batches
+
+def flush_packer():
+    last = packer.flush()
+    return [tuple(list(column) for column in zip(*last))] if last else []
+
+# Once the chunk's requests are done, rows still waiting for a near-duplicate
+# (its request failed or its answer didn't validate) get requests of their
+# own; returns them packed
+def released_duplicates():
+    released = waiting_duplicates.release()
+    if not released or over_budget():
+        return []
+    metrics.log('duplicates_released', f"Sending {len(released)} rows whose duplicate got no answer to the model",
+                rows=len(released))
+    rows, urls, contents = (list(column) for column in zip(*released))
+    return pack_group(rows, urls, contents, dedupe=False) + flush_packer()
+
+# Real cost from the token usage of the responses so far; the per-call
+# estimate until the first response with usage comes back
+def spent():
+    if metrics.total('llm_tokens_total'):
+        return metrics.total('llm_cost_usd_total')
+    return api_calls * cost_per_call
+
+def over_budget():
+    return spent() > 0.95  # Set slightly below $1 to be safe
+
+# Batch API bodies carry their usage like direct responses; billed at the discount
+def record_batch_usage(results):
+    for body in results.values():
+        body = body or {}
+        usage = body.get('usage') or {}
+        metrics.record_llm_usage(body.get('model') or MODEL, usage.get('prompt_tokens') or 0,
+                                 usage.get('completion_tokens') or 0, discount=BATCH_API_DISCOUNT)
+
+# Batch API requests are counted when they are submitted, so the budget
+# check sees them while the job runs; the ones left unanswered are taken off
+def uncount_unanswered(request_ids, results):
+    global api_calls
+    api_calls -= sum(1 for request_id in request_ids if not results.get(request_id))
+
+async def run_batch(scheduler, batch_number, rows, urls_batch, contents):
+    # Budget limit (only real API calls count, cache hits are free)
+    if over_budget():
+        return
+    
+    metrics.log('batch_start', f"Processing batch {batch_number}: {len(urls_batch)} URLs", batch=batch_number, urls=len(urls_batch))
+    
+    # Process this batch
+    try:
+        if args.structured:
+            parsed_results = await process_batch_structured(urls_batch, contents, scheduler)
+            apply_parsed_results(rows, urls_batch, contents, parsed_results)
+        else:
+            batch_result = await process_batch(urls_batch, contents, scheduler)
+            apply_batch_result(rows, urls_batch, contents, batch_result)
+    except Exception as e:
+        metrics.log('batch_failed', f"Error processing batch: {e}", level='error', batch=batch_number, error=str(e))
+    
+    cost = spent()
+    metrics.log('batch_done', f"Processed: {processed_count}/{rows_read} URLs, API calls: {api_calls}, Cost: ${cost:.3f}",
+                batch=batch_number, urls=len(urls_batch), processed=processed_count, rows=rows_read,
+                api_calls=api_calls, cost=round(cost, 4))
+    
+    if over_budget():
+        metrics.log('budget_reached', "Budget limit reached. Stopping processing.", level='warning', cost=round(spent(), 4))
+
+# Fetched pages are packed into requests as they arrive; completions run
+# concurrently within the rate limits and each one is written back to its
+# own rows whenever it finishes
+async def run_all_batches(scheduler):
+    queue = asyncio.Queue(maxsize=args.concurrency)
+    batch_numbers = itertools.count(1)
+    
+    async def produce():
+        for group_index, (rows, urls_group) in enumerate(fetch_groups):
+            if over_budget():
+                break
+            contents = await asyncio.to_thread(prefetcher.get, group_index)
+            for batch in pack_group(rows, urls_group, contents):
+                await queue.put((scheduler, next(batch_numbers)) + batch)
+        for batch in flush_packer():
+            await queue.put((scheduler, next(batch_numbers)) + batch)
+        await queue.put(None)
+    
+    await asyncio.gather(produce(), scheduler.map_queue(lambda batch: run_batch(*batch), queue))
+    await asyncio.gather(*(run_batch(scheduler, next(batch_numbers), *batch) for batch in released_duplicates()))
+
+# Offline alternative: every request goes into one Batch API job and the
+# answers are merged back by custom_id once the job finishes. `batches`
+# replaces the chunk's fetched pages with requests packed already.
+def run_batch_api(batches=None):
+    pending = {}
+    
+    def add_request(rows, urls_batch, contents):
+        global api_calls
+        custom_id = f"batch-{len(pending)}"
+        pending[custom_id] = (rows, urls_batch, contents)
+        api_calls += 1
+        return custom_id, batch_request(urls_batch, contents)
+    
+    def requests():
+        if batches is not None:
+            for batch in batches:
+                yield add_request(*batch)
+            return
+        for group_index, (rows, urls_group) in enumerate(fetch_groups):
+            if over_budget():
+                metrics.log('budget_reached', "Budget limit reached. Remaining URLs are not submitted.", level='warning',
+                            cost=round(spent(), 4))
+                return
+            for batch in pack_group(rows, urls_group, prefetcher.get(group_index)):
+                yield add_request(*batch)
+        for batch in flush_packer():
+            yield add_request(*batch)
+    
+    with llm_stats.timed(items=len(pending_rows) if batches is None else sum(len(batch[0]) for batch in batches)):
+        results = llm_batch.run(client, requests(), args.batch_dir, poll_interval=args.batch_poll)
+    record_batch_usage(results)
+    uncount_unanswered(pending, results)
+    
+    metrics.log('batch_api_done', f"Batch API: {len(results)}/{len(pending)} requests answered",
+                answered=len(results), requests=len(pending))
+    
+    if not args.structured:
+        for custom_id, (rows, urls_batch, contents) in pending.items():
+            body = results.get(custom_id)
+            apply_batch_result(rows, urls_batch, contents, llm_batch.response_text(body) if body else "")
+        return
+    
+    # Items that fail validation go into a follow-up job of their own
+    answers = {custom_id: [None] * len(urls_batch) for custom_id, (_, urls_batch, _) in pending.items()}
+    todo = {custom_id: (custom_id, list(range(len(urls_batch)))) for custom_id, (_, urls_batch, _) in pending.items()}
+    for attempt in range(args.item_retries + 1):
+        failed = {}
+        for request_id, (custom_id, positions) in todo.items():
+            message = llm_batch.response_message(results.get(request_id))
+            valid, bad = llm_schema.parse_items(llm_schema.message_arguments(message), len(positions))
+            for index, result in valid.items():
+                answers[custom_id][positions[index - 1]] = result
+            if bad:
+                failed[custom_id] = [positions[index - 1] for index in bad]
+        if not failed or attempt == args.item_retries:
+            break
+        
+        resubmitted = sum(len(positions) for positions in failed.values())
+        metrics.log('item_retry', f"Resubmitting {resubmitted} item(s) that failed validation",
+                    items=resubmitted, attempt=attempt + 1)
+        todo = {f"{custom_id}-retry{attempt + 1}": (custom_id, positions) for custom_id, positions in failed.items()}
+        
+        def retry_requests():
+            global api_calls
+            for request_id, (custom_id, positions) in todo.items():
+                _, urls_batch, contents = pending[custom_id]
+                api_calls += 1
+                yield request_id, batch_request([urls_batch[j] for j in positions], [contents[j] for j in positions])
+        
+        results = llm_batch.run(client, retry_requests(), args.batch_dir, poll_interval=args.batch_poll,
+                                prefix=f"batch_retry{attempt + 1}")
+        record_batch_usage(results)
+        uncount_unanswered(todo, results)
+    
+    for custom_id, (rows, urls_batch, contents) in pending.items():
+        apply_parsed_results(rows, urls_batch, contents, answers[custom_id])
+
+# Input is processed a chunk at a time; every finished chunk is checkpointed
+# so a restarted run continues after the last one
+metrics.log('input_open', f"Attempting to open file: {args.input}", path=args.input)
+try:
+    # Before the writer, which drops a checkpoint made for another input
+    sheet_io.check_input(args.input)
+    writer = sheet_io.CheckpointWriter(args.output, args.input, resume=not args.restart)
+    chunks = sheet_io.read_chunks(args.input, args.chunk_rows, skip=writer.rows_done)
+except Exception as e:
+    metrics.log('input_failed', f"Error opening file: {e}", level='error', path=args.input, error=str(e))
+    exit(1)
+
+# Every chunk runs in one event loop with one scheduler, so the RPM/TPM
+# budgets and the adaptive concurrency carry over from chunk to chunk
+# instead of starting each chunk with a full burst.
+# Returns the rows left unprocessed when the budget runs out.
+async def run_chunks(chunks):
+    scheduler = None
+    if not args.batch_api:
+        async_client = openai.AsyncOpenAI(api_key=openai.api_key, max_retries=0)
+        scheduler = llm_scheduler.LLMScheduler(async_client, concurrency=args.concurrency, rpm=args.rpm, tpm=args.tpm)
+    unfinished = []
+    for chunk in chunks:
+        prepare_chunk(chunk)
+        if args.batch_api:
+            run_batch_api()
+            released = released_duplicates()
+            if released:
+                run_batch_api(released)
+        else:
+            await run_all_batches(scheduler)
+        prefetcher.close()
+        flush_rows()
+        
+        if over_budget():
+            # Rows of this chunk that missed the model are picked up on the next run
+            unfinished = [df]
+            break
+        writer.append(df)
+        metrics.log('checkpoint', f"Checkpoint: {writer.rows_done} rows written to {writer.partial_path}",
+                    rows=writer.rows_done, path=writer.partial_path)
+    if scheduler is not None:
+        metrics.log('stage_summary', scheduler.summary(), stage='llm_scheduler')
+    return unfinished
+
+unfinished = asyncio.run(run_chunks(chunks))
+
+# Header of the output when the input has no rows: the input's columns,
+# plus B and C if prepare_chunk would have added them
+def output_columns():
+    columns = sheet_io.read_columns(args.input)
+    return columns + ["B", "C"][max(0, len(columns) - 1):] if columns else []
+
+# Save the updated Excel file (rows left by the budget limit are copied as they are)
+complete = not unfinished
+writer.export(extra=itertools.chain(unfinished, chunks), complete=complete, columns=output_columns())
+metrics.log('saved', f'Excel file has been updated successfully! Saved to: {args.output}', path=args.output)
+if not complete:
+    metrics.log('budget_reached', f'Budget limit reached; run again to continue after row {writer.rows_done}',
+                level='warning', rows=writer.rows_done)
+metrics.log('run_done', f'Final stats: Processed {processed_count}/{rows_read} URLs, API calls: {api_calls}',
+            processed=processed_count, rows=rows_read, api_calls=api_calls)
+if metrics.total('llm_tokens_total'):
+    metrics.log('llm_cost', f"LLM cost: ${spent():.4f} for {metrics.total('llm_tokens_total'):.0f} tokens",
+                cost=round(spent(), 4), tokens=metrics.total('llm_tokens_total'))
+else:
+    metrics.log('llm_cost', f'Estimated total cost: ${spent():.3f}', cost=round(spent(), 4), estimated=True)
+metrics.log('packing', f'Requests: {packer.requests}, average items per request: {packer.average_items():.1f}',
+            requests=packer.requests, average_items=round(packer.average_items(), 2))
+if answer_cache:
+    # Without requests this run there is no packing average; assume the old 3 per call
+    metrics.log('stage_summary', answer_cache.summary(cost_per_url=cost_per_call / (packer.average_items() or 3)),
+                stage='llm_cache')
+if dedup is not None:
+    metrics.log('stage_summary', dedup.summary(), stage='dedup')
+    dedup.close()
+metrics.log('stage_summary', fetch_stats.summary(), stage='fetch')
+metrics.log('stage_summary', llm_stats.summary(), stage='llm')
+http_client.print_connection_stats()
\ No newline at end of file
@@ -0,0 +1,94 @@
+import argparse
+import os
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import bench_server
+import date_filter
+import html_backend
+import parse_pool
+import parser
+
+# Pages per second parsing data.gov.uk style result pages in the main
+# process and in parse pools of increasing size. The pages are generated.
+# "map" hands them straight to the pool, so it only measures parsing and
+# process overhead; "pipeline" fetches them from a stub server on localhost
+# through ParsePool.pipeline, the path the scrapers use.
+
+BASE_URL = "https://www.data.gov.uk"
+
+def results_page(page_num, results=20, total_pages=50):
+    items = []
+    for i in range(results):
+        items.append(f"""
+<div class="dgu-results__result">
+  <h2><a class="govuk-link" href="/dataset/{page_num}-{i}/dataset-{page_num}-{i}">Dataset {page_num}-{i}</a></h2>
+  <p class="dgu-results__summary">{'Summary text for the dataset. ' * 20}</p>
+  <dl class="dgu-metadata__box">
+    <dt>Published by:</dt><dd>Department {i}</dd>
+    <dt>Last updated:</dt><dd>{1 + i % 28} March 2024</dd>
+  </dl>
+</div>""")
+    pages = "".join(f'<li><a href="/search?q=x&amp;page={n}">{n}</a></li>' for n in range(1, total_pages + 1))
+    return f"""<html><head><title>Search</title></head><body>
+<main>{''.join(items)}</main>
+<nav><ul>{pages}</ul><a rel="next" href="/search?q=x&amp;page={page_num + 1}">Next</a></nav>
+</body></html>""".encode('utf-8')
+
+class PageHandler(bench_server.StubHandler):
+    def do_GET(self):
+        page = int(parse_qs(urlsplit(self.path).query).get('page', ['1'])[0])
+        self.send(200, self.server.pages[(page - 1) % len(self.server.pages)])
+
+def bench_serial(pages, dates):
+    started = time.perf_counter()
+    for content in pages:
+        parser.extract_page(parse_pool.decode(content, 'utf-8'), BASE_URL, dates)
+    return len(pages) / (time.perf_counter() - started)
+
+def bench_pool(pages, dates, workers):
+    with parse_pool.ParsePool(workers) as pool:
+        # Warm the workers up so process start-up isn't counted
+        list(pool.map(parser.extract_page, pages[:workers], BASE_URL, dates))
+        started = time.perf_counter()
+        for _ in pool.map(parser.extract_page, pages, BASE_URL, dates):
+            pass
+        return len(pages) / (time.perf_counter() - started)
+
+def bench_pipeline(base, count, dates, workers, max_per_host):
+    urls = [f"{base}/search?q=x&page={n}" for n in range(1, count + 1)]
+    with parse_pool.ParsePool(workers) as pool:
+        list(pool.map(parser.extract_page, [results_page(1)] * workers, BASE_URL, dates))
+        started = time.perf_counter()
+        for _ in pool.pipeline(urls, parser.extract_page, (BASE_URL, dates),
+                               {'max_per_host': max_per_host, 'rate': 1e6}):
+            pass
+        return count / (time.perf_counter() - started)
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmark result page parsing across worker processes")
+    arg_parser.add_argument('--pages', type=int, default=200)
+    arg_parser.add_argument('--results', type=int, default=20, help='results per page')
+    arg_parser.add_argument('--workers', type=int, nargs='*', help='pool sizes to try (default 1, 2, 4, ... up to the CPU count)')
+    arg_parser.add_argument('--max-per-host', type=int, default=8, help='concurrent requests to the stub server in pipeline runs')
+    html_backend.add_backend_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    html_backend.backend_from_args(args)
+
+    cpus = os.cpu_count() or 1
+    workers = args.workers or sorted({min(2 ** i, cpus) for i in range(cpus.bit_length() + 1)})
+    pages = [results_page(n, args.results) for n in range(1, args.pages + 1)]
+    dates = date_filter.DateFilter(2023, None)
+
+    print(f"{args.pages} pages, {args.results} results each, {html_backend.get_backend()} backend, {cpus} CPUs")
+    serial = bench_serial(pages, dates)
+    print(f"main process: {serial:8.1f} pages/s")
+    server, base = bench_server.start_server(PageHandler, pages)
+    try:
+        for count in workers:
+            rate = bench_pool(pages, dates, count)
+            piped = bench_pipeline(base, args.pages, dates, count, args.max_per_host)
+            print(f"{count:3d} workers:  map {rate:8.1f} pages/s ({rate / serial:.2f}x)  "
+                  f"pipeline {piped:8.1f} pages/s ({piped / serial:.2f}x)")
+    finally:
+        server.shutdown()
@@ -0,0 +1,27 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Stub HTTP server on localhost for the offline benchmarks (bench_parse and
+# bench_suite). Their handlers subclass StubHandler and answer with send();
+# the pages they serve are kept on the server as `server.pages`.
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def send(self, status, body, content_type='text/html; charset=utf-8'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+# Returns the running server and its base URL
+def start_server(handler, pages):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    server.pages = pages
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
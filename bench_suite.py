@@ -0,0 +1,359 @@
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+from string import Template
+from urllib.parse import parse_qs, urlsplit
+
+import openai
+
+import bench_server
+import date_filter
+import html_backend
+import http_client
+import llm_text
+import parser
+import parser_angular
+import parser_can
+import rda_api
+import topic_fallback
+
+# Offline benchmarks for every scraper and for the analyzer's answer parsing.
+# A stub HTTP server on localhost replays the fixture pages in
+# bench_fixtures/ (result pages in each portal's markup, researchdata.edu.au
+# API records and a model answer), numbered for any page count, so the real
+# fetch and parse code runs without the network or an API key. 'au' is the
+# API search the AU scraper uses; 'au_html' parses pages in the markup of
+# its Selenium fallback, which needs a browser to fetch. Every portal and size runs in its own process,
+# so its peak RSS is its own. Results are compared with a JSON baseline:
+#   python bench_suite.py                  compare with bench_baseline.json
+#   python bench_suite.py --save-baseline  record a new baseline
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_fixtures')
+DEFAULT_BASELINE = 'bench_baseline.json'
+PORTALS = ('uk', 'ca', 'au', 'au_html', 'analyzer')
+SIZES = (1, 100, 10000)
+RESULTS_PER_PAGE = 20
+URLS_PER_ANSWER = 20
+# Rates from runs shorter than this are mostly start-up noise
+MIN_COMPARE_SECONDS = 0.05
+
+_fixtures = {}
+
+def fixture(name):
+    if name not in _fixtures:
+        with open(os.path.join(FIXTURE_DIR, name), encoding='utf-8') as f:
+            _fixtures[name] = Template(f.read())
+    return _fixtures[name]
+
+def _results(name, page):
+    item = fixture(name)
+    return "".join(item.substitute(page=page, index=i, day=f"{1 + i % 28:02d}") for i in range(RESULTS_PER_PAGE))
+
+def uk_page(page, pages):
+    return fixture('uk_page.html').substitute(results=_results('uk_result.html', page), page=page, pages=pages, next=page + 1)
+
+def ca_page(page, pages):
+    return fixture('ca_page.html').substitute(results=_results('ca_result.html', page), page=page, pages=pages,
+                                              next=min(page + 1, pages))
+
+def au_page(page, pages):
+    next_item = f'    <li><a href="">{page + 1}</a></li>' if page < pages else ''
+    return fixture('au_page.html').substitute(results=_results('au_result.html', page), page=page, next=next_item)
+
+# registry_object/filter answer for page `page`; the pages after the last are empty
+def au_api(page, pages):
+    item = fixture('au_doc.json')
+    docs = [json.loads(item.substitute(page=page, index=i)) for i in range(RESULTS_PER_PAGE)] if page <= pages else []
+    return json.dumps({'result': {'docs': docs, 'numFound': pages * RESULTS_PER_PAGE}})
+
+# Every tenth answer is a placeholder, so the fallback names and topics run too
+def llm_answer(urls):
+    item = fixture('llm_item.txt')
+    answer = []
+    for index, url in enumerate(urls, 1):
+        if index % 10 == 0:
+            answer.append(item.substitute(index=index, url=url, name="[Unavailable]", topic="N/A"))
+        else:
+            answer.append(item.substitute(index=index, url=url, name=f"Greenhouse gas emissions by facility {index}",
+                                          topic="greenhouse gas emissions, industrial facilities, climate reporting"))
+    return "".join(answer)
+
+def bench_urls(batch):
+    keywords = ('env', 'stat', 'health', 'transport')
+    return [f"https://open.canada.ca/data/en/dataset/{keywords[i % len(keywords)]}-{batch}-{i}" for i in range(URLS_PER_ANSWER)]
+
+def bench_prompt(urls):
+    return "\n".join(f"URL {n}: {url}" for n, url in enumerate(urls, 1))
+
+PAGES = {'/uk/search': uk_page, '/ca/': ca_page, '/au/search': au_page}
+
+class FixtureHandler(bench_server.StubHandler):
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        render = PAGES.get(parts.path)
+        if render is None:
+            return self.send(404, b'not found', 'text/plain')
+        page = int(parse_qs(parts.query).get('page', ['1'])[0])
+        self.send(200, render(page, self.server.pages).encode('utf-8'), 'text/html; charset=utf-8')
+
+    # OpenAI chat completions (answers for the URLs listed in the prompt)
+    # and the researchdata.edu.au search API
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        if path not in ('/v1/chat/completions', '/au/registry_object/filter'):
+            return self.send(404, b'not found', 'text/plain')
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if path == '/au/registry_object/filter':
+            body = au_api(request['filters']['p'], self.server.pages)
+            return self.send(200, body.encode('utf-8'), 'application/json')
+        prompt = request['messages'][-1]['content']
+        answer = llm_answer(re.findall(r'^URL \d+: (\S+)', prompt, re.MULTILINE))
+        prompt_tokens, completion_tokens = len(prompt) // 4, len(answer) // 4
+        reply = {
+            'id': 'chatcmpl-bench',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'gpt-4o-mini'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': answer}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens},
+        }
+        self.send(200, json.dumps(reply).encode('utf-8'), 'application/json')
+
+# Per-stage CPU time. A stage's CPU is measured with the calling thread's
+# clock, so fetch threads and the main thread are counted separately, and
+# time spent in a nested stage counts for the inner stage only.
+class Stages:
+    def __init__(self):
+        self.cpu = {}
+        self.local = threading.local()
+
+    def run(self, stage, fn, *args, **kwargs):
+        stack = self.local.__dict__.setdefault('stack', [])
+        stack.append(0.0)
+        started = time.thread_time()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.thread_time() - started
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self.cpu[stage] = self.cpu.get(stage, 0.0) + elapsed - nested
+
+    def wrap(self, module, name, stage):
+        fn = getattr(module, name)
+        setattr(module, name, lambda *args, **kwargs: self.run(stage, fn, *args, **kwargs))
+
+# The scenarios: each fetches `pages` pages from the stub at `base` through
+# the scraper's own code and returns the number of records it got
+
+def bench_uk(base, pages, stages):
+    stages.wrap(parser, 'extract_page', 'parse')
+    parser.BASE_URL = base + '/uk'
+    # No rate limit against localhost
+    return len(parser.scrape_datasets('bench', None, max_per_host=8, rate=1e6))
+
+def bench_ca(base, pages, stages):
+    stages.wrap(parser_can, 'parse_page', 'parse')
+    dates = date_filter.DateFilter(None, None)
+    all_data = []
+    for page in range(1, pages + 1):
+        dataset_info, _ = parser_can.parse_page(f"{base}/ca/?search_text=bench&page={page}")
+        parser_can.collect_records(all_data, dataset_info, dates, None, 'bench')
+    return len(all_data)
+
+def bench_au(base, pages, stages):
+    stages.wrap(rda_api, '_response_docs', 'parse')
+    rda_api.FILTER_URL = base + '/au/registry_object/filter'
+    return len(parser_angular.scrape_research_datasets('bench', None, None, rows=RESULTS_PER_PAGE))
+
+def bench_au_html(base, pages, stages):
+    stages.wrap(parser_angular, 'parse_results', 'parse')
+    records = 0
+    page = 1
+    while True:
+        response = http_client.get(f"{base}/au/search?q=bench&page={page}")
+        page_results, next_page = parser_angular.parse_results(response.text, base)
+        records += len(page_results)
+        if not next_page:
+            return records
+        page = int(next_page)
+
+# One "page" is one model answer for a batch of URLS_PER_ANSWER URLs
+def bench_analyzer(base, pages, stages):
+    client = openai.OpenAI(api_key='bench', base_url=f"{base}/v1", max_retries=0)
+    classifier = topic_fallback.TopicClassifier()
+    records = 0
+    for batch in range(pages):
+        urls = bench_urls(batch)
+        response = stages.run('llm_request', client.chat.completions.create, model='gpt-4o-mini',
+                              messages=[{'role': 'user', 'content': bench_prompt(urls)}])
+        answer = response.choices[0].message.content
+        records += len(stages.run('parse', llm_text.parse_batch_results, answer, len(urls), urls, classifier))
+    return records
+
+SCENARIOS = {'uk': bench_uk, 'ca': bench_ca, 'au': bench_au, 'au_html': bench_au_html, 'analyzer': bench_analyzer}
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return _peak_rss_windows()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def _peak_rss_windows():
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return None
+    return counters.PeakWorkingSetSize / (1024 * 1024)
+
+# Runs one scenario in this process and returns its measurements
+def run_scenario(portal, pages):
+    server, base = bench_server.start_server(FixtureHandler, pages)
+    stages = Stages()
+    stages.wrap(http_client, 'get', 'fetch')
+    stages.wrap(http_client, 'post', 'fetch')
+    try:
+        # The scrapers print a line or more per page
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            cpu_started = time.process_time()
+            started = time.perf_counter()
+            records = SCENARIOS[portal](base, pages, stages)
+            seconds = time.perf_counter() - started
+            cpu = time.process_time() - cpu_started
+    finally:
+        server.shutdown()
+
+    cpu_seconds = {stage: round(value, 4) for stage, value in sorted(stages.cpu.items())}
+    # Event loop, threads, record filtering and printing
+    cpu_seconds['other'] = round(max(0.0, cpu - sum(stages.cpu.values())), 4)
+    cpu_seconds['total'] = round(cpu, 4)
+    rss = peak_rss_mb()
+    return {
+        'portal': portal,
+        'pages': pages,
+        'records': records,
+        'seconds': round(seconds, 4),
+        'pages_per_second': round(pages / seconds, 2),
+        'records_per_second': round(records / seconds, 2),
+        'peak_rss_mb': round(rss, 1) if rss is not None else None,
+        'cpu_seconds': cpu_seconds,
+    }
+
+def run_child(portal, pages, backend):
+    command = [sys.executable, os.path.abspath(__file__), '--child', portal, str(pages), '--parser-backend', backend]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{portal} x {pages} failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'html_backend': html_backend.get_backend(),
+        'cpus': os.cpu_count(),
+    }
+
+# (field, True if bigger is better) compared against the baseline
+COMPARED = (('pages_per_second', True), ('records_per_second', True), ('peak_rss_mb', False))
+
+def compare(result, baseline, tolerance):
+    regressions = []
+    for field, higher_is_better in COMPARED:
+        old, new = baseline.get(field), result.get(field)
+        if not old or new is None:
+            continue
+        if field != 'peak_rss_mb' and min(result['seconds'], baseline['seconds']) < MIN_COMPARE_SECONDS:
+            continue
+        change = (new - old) / old
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append(f"{field} {old} -> {new} ({change:+.0%})")
+    return regressions
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_baseline(path, results, previous):
+    baseline = previous if previous and previous.get('environment') == environment() else {'results': {}}
+    baseline['environment'] = environment()
+    baseline['saved_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    for result in results:
+        baseline['results'][f"{result['portal']}/{result['pages']}"] = result
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2)
+    os.replace(temp_path, path)
+    print(f"Baseline written to {path}")
+
+def print_result(result, regressions):
+    cpu = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in result['cpu_seconds'].items())
+    rss = f"{result['peak_rss_mb']:.0f} MB" if result['peak_rss_mb'] is not None else "n/a"
+    print(f"{result['portal']:>8} {result['pages']:>6} pages: {result['pages_per_second']:9.1f} pages/s "
+          f"{result['records_per_second']:10.1f} records/s  peak RSS {rss:>7}  CPU: {cpu}")
+    for regression in regressions:
+        print(f"{'':>8} REGRESSION {regression}")
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Offline benchmarks of the scrapers and the analyzer against recorded fixtures")
+    arg_parser.add_argument('--portals', nargs='*', choices=PORTALS, default=list(PORTALS))
+    arg_parser.add_argument('--sizes', type=int, nargs='*', default=list(SIZES), help='pages per run')
+    arg_parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='JSON file with the baseline results')
+    arg_parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    arg_parser.add_argument('--tolerance', type=float, default=0.2, help='relative slowdown or memory growth reported as a regression')
+    arg_parser.add_argument('--child', nargs=2, metavar=('PORTAL', 'PAGES'), help=argparse.SUPPRESS)
+    html_backend.add_backend_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    html_backend.backend_from_args(args)
+
+    if args.child:
+        print(json.dumps(run_scenario(args.child[0], int(args.child[1]))))
+        sys.exit(0)
+
+    previous = load_baseline(args.baseline)
+    if previous and previous.get('environment') != environment():
+        print(f"Note: {args.baseline} was recorded on {previous.get('environment')}")
+    print(f"{html_backend.get_backend()} backend, {os.cpu_count()} CPUs")
+
+    results = []
+    regressed = False
+    for portal in args.portals:
+        for pages in args.sizes:
+            result = run_child(portal, pages, html_backend.get_backend())
+            results.append(result)
+            baseline = (previous or {}).get('results', {}).get(f"{portal}/{pages}")
+            regressions = compare(result, baseline, args.tolerance) if baseline and not args.save_baseline else []
+            regressed = regressed or bool(regressions)
+            print_result(result, regressions)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results, previous)
+    elif previous is None:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+    elif regressed:
+        sys.exit(1)
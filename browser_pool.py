@@ -0,0 +1,152 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import metrics
+
+try:
+    from selenium import webdriver
+except ImportError:
+    webdriver = None
+
+# Pool of warm headless Chrome instances for the pages that still need a
+# real browser. Each job borrows one browser, works in its own tab and
+# closes the tab afterwards, so Chrome is started once per pool rather than
+# once per search term. Browsers start on first use, so a pool kept for a
+# fallback that is never needed costs nothing, and a browser that crashed is
+# replaced instead of being handed out again. Images, fonts and stylesheets
+# are blocked.
+
+BLOCKED_URL_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.css',
+]
+
+def chrome_options(headless=True, block_resources=True):
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--window-size=1920x1080")
+    if block_resources:
+        # Fonts and stylesheets are blocked per tab, see block_heavy_resources
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    return options
+
+def block_heavy_resources(driver):
+    # Applies to the current tab only, so it runs for every new tab
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+    except Exception as e:
+        metrics.log('browser_warning', f"Could not block resources: {e}", level='warning', error=str(e))
+
+def start_chrome(headless=True, block_resources=True):
+    return webdriver.Chrome(options=chrome_options(headless, block_resources))
+
+# driver_factory() starts one browser; headless Chrome unless given
+class BrowserPool:
+    def __init__(self, size=2, headless=True, block_resources=True, driver_factory=None):
+        if driver_factory is None:
+            if webdriver is None:
+                raise ImportError("The browser pool needs 'selenium' installed")
+            driver_factory = lambda: start_chrome(headless, block_resources)
+        self.size = size
+        self.headless = headless
+        self.block_resources = block_resources
+        self.driver_factory = driver_factory
+        self.drivers = []
+        self.started = 0
+        self.lock = threading.Lock()
+        # Idle browsers; None wakes a waiting job after a browser was dropped
+        self.idle = queue.Queue()
+
+    def _start(self):
+        try:
+            driver = self.driver_factory()
+        except Exception:
+            with self.lock:
+                self.started -= 1
+            self.idle.put(None)
+            raise
+        with self.lock:
+            self.drivers.append(driver)
+        metrics.log('browser_started', f"Started headless browser {self.started}/{self.size}",
+                    browsers=self.started, size=self.size)
+        return driver
+
+    def _borrow(self):
+        while True:
+            with self.lock:
+                start = self.idle.empty() and self.started < self.size
+                if start:
+                    self.started += 1
+            if start:
+                return self._start()
+            driver = self.idle.get()
+            if driver is not None:
+                return driver
+
+    def _discard(self, driver, error):
+        metrics.log('browser_failed', f"Browser stopped responding, replacing it: {error}", level='warning',
+                    error=str(error))
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        with self.lock:
+            if driver in self.drivers:
+                self.drivers.remove(driver)
+            self.started -= 1
+        self.idle.put(None)
+
+    def _give_back(self, driver, home):
+        try:
+            if driver.current_window_handle != home:
+                driver.close()
+            driver.switch_to.window(home)
+        except Exception as e:
+            self._discard(driver, e)
+            return
+        self.idle.put(driver)
+
+    # Borrow a browser and open a fresh tab in it
+    @contextmanager
+    def tab(self):
+        driver = self._borrow()
+        try:
+            home = driver.current_window_handle
+            driver.switch_to.new_window('tab')
+        except Exception as e:
+            self._discard(driver, e)
+            raise
+        try:
+            if self.block_resources:
+                block_heavy_resources(driver)
+            yield driver
+        finally:
+            self._give_back(driver, home)
+
+    # Run fn(item) for every item, one job per browser at a time.
+    # Results come back in the order of `items`.
+    def map(self, fn, items):
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(executor.map(fn, items))
+
+    def close(self):
+        with self.lock:
+            drivers, self.drivers = self.drivers, []
+            self.started = 0
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,122 @@
+import json
+from datetime import datetime
+from urllib.parse import urlencode
+
+import http_client
+import metrics
+from fetcher import fetch_pages
+
+# Source driver for portals that run CKAN. One package_search call returns
+# up to 1000 datasets as JSON, with the date filter applied by the server,
+# instead of a few dozen rendered HTML result pages.
+
+PORTALS = {
+    'data.gov.uk': {
+        'api': 'https://data.gov.uk/api/action/package_search',
+        'dataset_url': 'https://www.data.gov.uk/dataset/{id}/{name}',
+    },
+    'open.canada.ca': {
+        'api': 'https://open.canada.ca/data/api/action/package_search',
+        'dataset_url': 'https://open.canada.ca/data/en/dataset/{id}',
+    },
+    'data.gov.ie': {
+        'api': 'https://data.gov.ie/api/3/action/package_search',
+        'dataset_url': 'https://data.gov.ie/dataset/{name}',
+    },
+    'data.govt.nz': {
+        'api': 'https://catalogue.data.govt.nz/api/3/action/package_search',
+        'dataset_url': 'https://catalogue.data.govt.nz/dataset/{name}',
+    },
+}
+
+MAX_ROWS = 1000  # CKAN's default upper limit for rows
+
+class CKANError(Exception):
+    pass
+
+# Solr filter on metadata_modified for the given (inclusive) year range
+def date_filter(year_from=None, year_to=None):
+    if year_from is None and year_to is None:
+        return None
+    start = f"{int(year_from)}-01-01T00:00:00Z" if year_from is not None else "*"
+    end = f"{int(year_to)}-12-31T23:59:59Z" if year_to is not None else "*"
+    return f"metadata_modified:[{start} TO {end}]"
+
+def search_url(portal, q, year_from=None, year_to=None, rows=MAX_ROWS, start=0):
+    params = {
+        'q': q,
+        'rows': rows,
+        'start': start,
+        'sort': 'metadata_modified desc',
+    }
+    fq = date_filter(year_from, year_to)
+    if fq:
+        params['fq'] = fq
+    return f"{PORTALS[portal]['api']}?{urlencode(params)}"
+
+def _result(response):
+    if response.status_code != 200:
+        raise CKANError(f"package_search returned status {response.status_code}")
+    try:
+        data = json.loads(response.content)
+    except ValueError as e:
+        raise CKANError(f"package_search returned invalid JSON: {e}")
+    if not data.get('success'):
+        raise CKANError(f"package_search failed: {data.get('error')}")
+    return data['result']
+
+# Returns every matching package, newest first
+def package_search(portal, q, year_from=None, year_to=None, rows=MAX_ROWS, max_per_host=2, rate=2.0):
+    first_url = search_url(portal, q, year_from, year_to, rows, 0)
+    metrics.log('api_query', f"Querying {portal} API: {first_url}", portal=portal, url=first_url)
+    result = _result(http_client.get(first_url))
+    packages = list(result['results'])
+    count = result['count']
+    metrics.log('api_count', f"{portal} API reports {count} datasets", portal=portal, datasets=count)
+
+    # Remaining offsets are fetched in parallel
+    page_urls = [search_url(portal, q, year_from, year_to, rows, start) for start in range(rows, count, rows)]
+    for page_url, response in zip(page_urls, fetch_pages(page_urls, max_per_host=max_per_host, rate=rate)):
+        if isinstance(response, Exception):
+            raise CKANError(f"Error fetching {page_url}: {response}")
+        packages.extend(_result(response)['results'])
+    metrics.count('pages_total', len(page_urls) + 1, portal=portal)
+
+    return packages
+
+def dataset_url(portal, package):
+    return PORTALS[portal]['dataset_url'].format(id=package.get('id', ''), name=package.get('name', ''))
+
+def package_title(package):
+    # open.canada.ca keeps the English title in title_translated
+    translated = package.get('title_translated')
+    if isinstance(translated, dict) and translated.get('en'):
+        return translated['en']
+    return package.get('title', '')
+
+def _display_date(value):
+    # 'Jan 05, 2024', the format search.open.canada.ca shows
+    if not value:
+        return ''
+    try:
+        return datetime.fromisoformat(value[:19]).strftime('%b %d, %Y')
+    except ValueError:
+        return value
+
+# Record shapes produced by the HTML scrapers
+
+def to_titled_records(portal, packages):
+    return [{'URL': dataset_url(portal, package), 'Title': package_title(package)} for package in packages]
+
+def to_canada_records(packages):
+    return [{
+        "Title": package_title(package),
+        "Dataset URL": dataset_url('open.canada.ca', package),
+        "Record Modified": _display_date(package.get('metadata_modified')),
+        "Record Released": _display_date(package.get('date_published') or package.get('metadata_created')),
+    } for package in packages]
+
+# Command line option shared by the scrapers
+def add_source_arguments(arg_parser):
+    arg_parser.add_argument('--source', choices=('api', 'html'), default='api',
+                            help='query the CKAN API (falls back to HTML scraping on errors) or scrape HTML pages')
@@ -0,0 +1,218 @@
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import browser_pool
+import ckan_api
+import crawl_checkpoint
+import crawl_state
+import html_backend
+import http_cache
+import http_client
+import metrics
+import parse_pool
+import portals
+import result_sink
+
+# Runs search jobs for several portals at once. Jobs come from a job file
+# (portal, search_term, year range, output) and are spread over a pool of
+# worker threads; a job is only started when its portal is below its
+# concurrency cap, so one slow portal can't take every worker or get hit by
+# all of them at once.
+
+JOB_FIELDS = ('portal', 'search_term', 'year_from', 'year_to', 'output')
+
+def _year(value):
+    if value is None or str(value).strip() == '':
+        return None
+    return int(value)
+
+def _job(raw, number):
+    job = {field: raw.get(field) for field in JOB_FIELDS}
+    if not job['portal'] or not job['search_term']:
+        raise ValueError(f"Job {number} needs a portal and a search_term: {raw}")
+    portals.get_driver(job['portal'])
+    job['year_from'] = _year(job['year_from'])
+    job['year_to'] = _year(job['year_to'])
+    if not job['output']:
+        job['output'] = f"{job['portal']}_{job['search_term'].replace(' ', '_').lower()}"
+    return job
+
+# Job file: a JSON list of objects, or a CSV with a header row, using the
+# fields in JOB_FIELDS (year_from, year_to and output are optional)
+def load_jobs(path):
+    if os.path.splitext(path)[1].lower() == '.csv':
+        with open(path, newline='', encoding='utf-8') as f:
+            raw_jobs = list(csv.DictReader(f))
+    else:
+        with open(path, encoding='utf-8') as f:
+            raw_jobs = json.load(f)
+    return [_job(raw, number) for number, raw in enumerate(raw_jobs, 1)]
+
+def describe(job):
+    years = f"{job['year_from'] or '...'}-{job['year_to'] or '...'}" if job['year_from'] or job['year_to'] else "any year"
+    return f"{job['portal']} '{job['search_term']}' ({years})"
+
+class Progress:
+    def __init__(self, total):
+        self.total = total
+        self.started = time.time()
+        self.done = 0
+        self.failed = 0
+        self.records = 0
+        self.per_portal = Counter()
+        self.lock = threading.Lock()
+
+    def finish(self, job, records, elapsed, running, error=None):
+        with self.lock:
+            self.done += 1
+            if error is not None:
+                self.failed += 1
+                outcome = f"failed: {error}"
+            else:
+                self.records += len(records)
+                self.per_portal[job['portal']] += len(records)
+                outcome = f"{len(records)} datasets"
+            metrics.count('crawl_jobs_total', portal=job['portal'], status='failed' if error is not None else 'ok')
+            metrics.observe('crawl_job_seconds', elapsed, portal=job['portal'])
+            metrics.log('job_done',
+                        f"[crawl {self.done}/{self.total} done, {running} running, {self.failed} failed, "
+                        f"{self.records} datasets, {time.time() - self.started:.0f}s] "
+                        f"{describe(job)}: {outcome} in {elapsed:.1f}s",
+                        portal=job['portal'], search_term=job['search_term'], datasets=len(records),
+                        error=str(error) if error is not None else None, seconds=round(elapsed, 3),
+                        done=self.done, total=self.total, running=running)
+
+    def summary(self):
+        metrics.log('crawl_done', f"\nCrawl finished: {self.done - self.failed}/{self.total} jobs succeeded, "
+                    f"{self.records} datasets in {time.time() - self.started:.1f}s",
+                    succeeded=self.done - self.failed, jobs=self.total, datasets=self.records,
+                    seconds=round(time.time() - self.started, 1))
+        for portal, count in sorted(self.per_portal.items()):
+            metrics.log('portal_done', f"  {portal}: {count} datasets", portal=portal, datasets=count)
+
+def run_job(job, options, state_db):
+    # sqlite connections can't be shared between threads, so incremental
+    # jobs open their own connection to the state file
+    state = crawl_state.CrawlState(state_db) if state_db else None
+    started = time.time()
+    try:
+        records = portals.get_driver(job['portal']).run(job, state, options)
+        return records or [], time.time() - started
+    finally:
+        if state is not None:
+            state.close()
+
+def portal_limits(jobs, overrides):
+    limits = {name: portals.get_driver(name).max_concurrency for name in {job['portal'] for job in jobs}}
+    limits.update(overrides)
+    return limits
+
+def run_jobs(jobs, workers=4, limits=None, options=None, state_db=None):
+    limits = portal_limits(jobs, limits or {})
+    options = options or {}
+    pending = {}
+    for job in jobs:
+        pending.setdefault(job['portal'], deque()).append(job)
+    running = Counter()
+    futures = {}
+    progress = Progress(len(jobs))
+
+    metrics.log('crawl_start', f"Running {len(jobs)} jobs on {workers} workers, per portal limits: "
+                + ", ".join(f"{portal}={limit}" for portal, limit in sorted(limits.items())),
+                jobs=len(jobs), workers=workers, limits=limits)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or futures:
+            # Start jobs round robin over the portals that have spare capacity
+            started = True
+            while started and len(futures) < workers:
+                started = False
+                for portal in list(pending):
+                    if len(futures) >= workers:
+                        break
+                    if running[portal] >= limits[portal]:
+                        continue
+                    job = pending[portal].popleft()
+                    if not pending[portal]:
+                        del pending[portal]
+                    running[portal] += 1
+                    futures[executor.submit(run_job, job, options, state_db)] = (job, time.time())
+                    started = True
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                job, job_started = futures.pop(future)
+                running[job['portal']] -= 1
+                try:
+                    records, elapsed = future.result()
+                    progress.finish(job, records, elapsed, len(futures))
+                except Exception as e:
+                    progress.finish(job, [], time.time() - job_started, len(futures), error=e)
+
+    progress.summary()
+    return progress
+
+def parse_limits(values):
+    limits = {}
+    for value in values or []:
+        portal, _, limit = value.partition('=')
+        portals.get_driver(portal)
+        limits[portal] = max(1, int(limit))
+    return limits
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Run search jobs for several open data portals in parallel")
+    arg_parser.add_argument('jobs', help='job file (.json list or .csv with columns ' + ', '.join(JOB_FIELDS) + ')')
+    arg_parser.add_argument('--workers', type=int, default=4, help='jobs running at once over all portals')
+    arg_parser.add_argument('--portal-limit', action='append', metavar='PORTAL=N',
+                            help='jobs running at once for one portal (repeatable), e.g. uk=3')
+    arg_parser.add_argument('--browser-fallback', action='store_true', help='use Selenium for au jobs if its JSON API fails')
+    arg_parser.add_argument('--browsers', type=int, default=2, help='browsers kept for the Selenium fallback')
+    http_cache.add_cache_arguments(arg_parser)
+    http_client.add_connection_arguments(arg_parser)
+    crawl_state.add_state_arguments(arg_parser)
+    crawl_checkpoint.add_checkpoint_arguments(arg_parser)
+    html_backend.add_backend_arguments(arg_parser)
+    ckan_api.add_source_arguments(arg_parser)
+    parse_pool.add_parse_arguments(arg_parser)
+    result_sink.add_sink_arguments(arg_parser)
+    metrics.add_metrics_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    metrics.configure_from_args(args)
+    http_client.configure_from_args(args)
+    http_client.configure_cache_from_args(args)
+    html_backend.backend_from_args(args)
+
+    jobs = load_jobs(args.jobs)
+    if args.incremental:
+        metrics.log('incremental', f"Incremental mode: crawl state in {args.state_db}", path=args.state_db)
+    # One parse pool shared by every job's HTML pages
+    pool = parse_pool.pool_from_args(args)
+    # One sink shared by every job; its writes are serialised
+    output = result_sink.output_from_args(args)
+    # One checkpoint store shared by every job; a rerun of the same job file
+    # resumes the jobs that didn't finish
+    checkpoints = crawl_checkpoint.checkpoints_from_args(args)
+    # One browser pool shared by every au job that falls back to Selenium;
+    # its browsers only start when a job needs one
+    browsers = browser_pool.BrowserPool(args.browsers) if args.browser_fallback else None
+    try:
+        run_jobs(jobs, args.workers, parse_limits(args.portal_limit),
+                 {'source': args.source, 'browser_fallback': args.browser_fallback,
+                  'pool': pool, 'browser_pool': browsers, 'output': output, 'checkpoints': checkpoints},
+                 args.state_db if args.incremental else None)
+    finally:
+        if pool is not None:
+            pool.close()
+        if browsers is not None:
+            browsers.close()
+        if checkpoints is not None:
+            checkpoints.close()
+        output.close()
+    http_client.print_connection_stats()
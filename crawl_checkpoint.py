@@ -0,0 +1,204 @@
+import json
+import sqlite3
+import threading
+import time
+
+import metrics
+
+# Checkpoints for long paginated scrapes. For every (portal, search) the
+# records of each finished page are stored as the crawl goes, with the last
+# page reached and the page count, so a crawl that crashes or is stopped
+# continues after that page instead of starting again at page 1. Pages that
+# fail go into a retry queue instead of ending the crawl: they are retried
+# at the end of the run and, if they still fail, again on the next run. A
+# search's checkpoint is deleted once it finished with no failed pages left.
+
+DEFAULT_CHECKPOINT_DB = 'crawl_checkpoint.sqlite'
+DEFAULT_PAGE_RETRIES = 2
+RETRY_DELAY = 5  # seconds before the first retry round, doubled per round
+
+class CheckpointStore:
+    def __init__(self, path=DEFAULT_CHECKPOINT_DB, page_retries=DEFAULT_PAGE_RETRIES, restart=False):
+        self.path = path
+        self.page_retries = page_retries
+        self.restart = restart
+        # Shared by the crawl orchestrator's worker threads
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.db.execute("""CREATE TABLE IF NOT EXISTS searches (
+            portal TEXT NOT NULL,
+            search_key TEXT NOT NULL,
+            last_page INTEGER NOT NULL,
+            total_pages INTEGER,
+            done INTEGER NOT NULL DEFAULT 0,
+            updated REAL,
+            PRIMARY KEY (portal, search_key)
+        )""")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS pages (
+            portal TEXT NOT NULL,
+            search_key TEXT NOT NULL,
+            page INTEGER NOT NULL,
+            records TEXT NOT NULL,
+            PRIMARY KEY (portal, search_key, page)
+        )""")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS failed_pages (
+            portal TEXT NOT NULL,
+            search_key TEXT NOT NULL,
+            page INTEGER NOT NULL,
+            url TEXT NOT NULL,
+            error TEXT,
+            PRIMARY KEY (portal, search_key, page)
+        )""")
+        self.db.commit()
+
+    def search(self, portal, search_key):
+        if self.restart:
+            self.delete(portal, search_key)
+        return SearchCheckpoint(self, portal, search_key)
+
+    def execute(self, *statements):
+        with self.lock:
+            for sql, params in statements:
+                self.db.execute(sql, params)
+            self.db.commit()
+
+    def query(self, sql, params):
+        with self.lock:
+            return self.db.execute(sql, params).fetchall()
+
+    def delete(self, portal, search_key):
+        self.execute(*((f"DELETE FROM {table} WHERE portal = ? AND search_key = ?", (portal, search_key))
+                       for table in ('searches', 'pages', 'failed_pages')))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+# Progress of one search. Without a store it only keeps the retry queue in
+# memory, so failed pages are still retried but nothing survives the run.
+class SearchCheckpoint:
+    def __init__(self, store, portal, search_key):
+        self.store = store
+        self.portal = portal
+        self.search_key = search_key
+        self.page_retries = store.page_retries if store is not None else DEFAULT_PAGE_RETRIES
+        self.last_page = 0
+        self.total_pages = None
+        self.done = False
+        # page -> [url, failed attempts this run]
+        self.failed = {}
+
+        if store is not None:
+            key = (portal, search_key)
+            row = store.query("SELECT last_page, total_pages, done FROM searches WHERE portal = ? AND search_key = ?", key)
+            if row:
+                self.last_page, self.total_pages, done = row[0]
+                self.done = bool(done)
+            for page, url in store.query("SELECT page, url FROM failed_pages WHERE portal = ? AND search_key = ?", key):
+                self.failed[page] = [url, 0]
+
+    @property
+    def resumed(self):
+        return self.last_page > 0
+
+    # True once every page up to the page count has been reached
+    def paged_through(self):
+        return self.done or bool(self.total_pages and self.last_page >= self.total_pages)
+
+    # Records stored for the pages finished so far, in page order
+    def records(self):
+        if self.store is None:
+            return []
+        rows = self.store.query("SELECT records FROM pages WHERE portal = ? AND search_key = ? ORDER BY page",
+                                (self.portal, self.search_key))
+        return [record for (records,) in rows for record in json.loads(records)]
+
+    def page_done(self, page, records, total_pages=None):
+        self.last_page = max(self.last_page, page)
+        if total_pages is not None:
+            self.total_pages = total_pages
+        self.failed.pop(page, None)
+        if self.store is None:
+            return
+        key = (self.portal, self.search_key)
+        self.store.execute(
+            ("INSERT OR REPLACE INTO pages (portal, search_key, page, records) VALUES (?, ?, ?, ?)",
+             key + (page, json.dumps(records))),
+            ("DELETE FROM failed_pages WHERE portal = ? AND search_key = ? AND page = ?", key + (page,)),
+            ("INSERT OR REPLACE INTO searches (portal, search_key, last_page, total_pages, done, updated) VALUES (?, ?, ?, ?, ?, ?)",
+             key + (self.last_page, self.total_pages, int(self.done), time.time())),
+        )
+
+    def page_failed(self, page, url, error=None):
+        entry = self.failed.setdefault(page, [url, 0])
+        entry[1] += 1
+        metrics.count('failed_pages_total', portal=self.portal)
+        metrics.log('page_queued', f"Page {page} queued for retry ({error or 'request failed'})", level='warning',
+                    portal=self.portal, page=page, url=url, error=str(error or 'request failed'))
+        if self.store is not None:
+            self.store.execute(
+                ("INSERT OR REPLACE INTO failed_pages (portal, search_key, page, url, error) VALUES (?, ?, ?, ?, ?)",
+                 (self.portal, self.search_key, page, url, str(error) if error is not None else None)),
+            )
+
+    # (page, url) of the failed pages, in rounds until each page has worked
+    # or failed page_retries more times. Pages left from an earlier run get
+    # their first attempt without waiting.
+    def retry_queue(self):
+        retry_round = 0
+        while True:
+            pending = sorted((page, url) for page, (url, attempts) in self.failed.items() if attempts <= self.page_retries)
+            if not pending:
+                return
+            if any(self.failed[page][1] for page, _ in pending):
+                metrics.sleep(RETRY_DELAY * 2 ** retry_round, 'page_retry')
+                retry_round += 1
+            metrics.log('retry_round', f"Retrying {len(pending)} failed pages", portal=self.portal, pages=len(pending),
+                        round=retry_round)
+            for page, url in pending:
+                metrics.count('page_retries_total', portal=self.portal)
+                yield page, url
+
+    # Called when the search is over; keeps the checkpoint only while pages
+    # are still missing
+    def finish(self):
+        self.done = True
+        if self.store is None:
+            if self.failed:
+                metrics.log('pages_failed', f"{len(self.failed)} pages still failed after {self.page_retries} retries: "
+                            f"{sorted(self.failed)}", level='error', portal=self.portal, pages=sorted(self.failed))
+            return
+        if not self.failed:
+            self.store.delete(self.portal, self.search_key)
+            return
+        self.store.execute(
+            ("UPDATE searches SET done = 1, updated = ? WHERE portal = ? AND search_key = ?",
+             (time.time(), self.portal, self.search_key)),
+        )
+        metrics.log('pages_failed', f"{len(self.failed)} pages still failed after {self.page_retries} retries: "
+                    f"{sorted(self.failed)}; the next run retries them (checkpoint in {self.store.path})",
+                    level='error', portal=self.portal, pages=sorted(self.failed), checkpoint=self.store.path)
+
+def search_checkpoint(store, portal, search_key):
+    if store is None:
+        return SearchCheckpoint(None, portal, search_key)
+    progress = store.search(portal, search_key)
+    if progress.resumed:
+        retries = f", {len(progress.failed)} failed pages to retry" if progress.failed else ""
+        metrics.log('resume', f"Resuming {portal} '{search_key}' after page {progress.last_page}{retries}",
+                    portal=portal, search_key=search_key, page=progress.last_page, failed=len(progress.failed))
+    return progress
+
+# Command line options shared by the scrapers
+def add_checkpoint_arguments(arg_parser):
+    arg_parser.add_argument('--checkpoint-db', default=DEFAULT_CHECKPOINT_DB, help='SQLite file for crawl checkpoints')
+    arg_parser.add_argument('--no-checkpoint', action='store_true', help="don't store progress; an interrupted search starts again at page 1")
+    arg_parser.add_argument('--restart', action='store_true', help='ignore existing checkpoints and start every search at page 1')
+    arg_parser.add_argument('--page-retries', type=int, default=DEFAULT_PAGE_RETRIES,
+                            help='times a failed result page is retried before it is left for the next run')
+
+def checkpoints_from_args(args):
+    if args.no_checkpoint:
+        return None
+    metrics.log('checkpoints', f"Crawl checkpoints in {args.checkpoint_db}", path=args.checkpoint_db)
+    return CheckpointStore(args.checkpoint_db, args.page_retries, args.restart)
@@ -0,0 +1,79 @@
+import sqlite3
+import time
+
+import metrics
+
+# Persistent state for incremental crawls. For every (portal, search term)
+# it keeps the newest modification date seen and each dataset URL with the
+# modification date it had, so a run can emit only new or changed datasets
+# and stop paginating once it reaches records it already knows.
+
+DEFAULT_STATE_DB = 'crawl_state.sqlite'
+
+class CrawlState:
+    def __init__(self, path=DEFAULT_STATE_DB):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS searches (
+            portal TEXT NOT NULL,
+            search_term TEXT NOT NULL,
+            newest_modified TEXT,
+            last_run REAL,
+            PRIMARY KEY (portal, search_term)
+        )""")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS seen (
+            portal TEXT NOT NULL,
+            search_term TEXT NOT NULL,
+            url TEXT NOT NULL,
+            modified TEXT,
+            PRIMARY KEY (portal, search_term, url)
+        )""")
+        self.db.commit()
+
+    def newest_modified(self, portal, search_term):
+        row = self.db.execute(
+            "SELECT newest_modified FROM searches WHERE portal = ? AND search_term = ?",
+            (portal, search_term),
+        ).fetchone()
+        return row[0] if row else None
+
+    # entries: list of (url, modified). Returns the entries that are new or
+    # whose modification date changed, and whether the page held only known
+    # entries (an empty page doesn't count as known).
+    def filter_new(self, portal, search_term, entries):
+        new_entries = []
+        for url, modified in entries:
+            row = self.db.execute(
+                "SELECT modified FROM seen WHERE portal = ? AND search_term = ? AND url = ?",
+                (portal, search_term, url),
+            ).fetchone()
+            if row is None or row[0] != modified:
+                new_entries.append((url, modified))
+        return new_entries, bool(entries) and not new_entries
+
+    def mark_seen(self, portal, search_term, entries, newest_modified=None):
+        self.db.executemany(
+            "INSERT OR REPLACE INTO seen (portal, search_term, url, modified) VALUES (?, ?, ?, ?)",
+            [(portal, search_term, url, modified) for url, modified in entries],
+        )
+        if newest_modified is None:
+            newest_modified = self.newest_modified(portal, search_term)
+        self.db.execute(
+            "INSERT OR REPLACE INTO searches (portal, search_term, newest_modified, last_run) VALUES (?, ?, ?, ?)",
+            (portal, search_term, newest_modified, time.time()),
+        )
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+# Command line options shared by the scrapers
+def add_state_arguments(arg_parser):
+    arg_parser.add_argument('--incremental', action='store_true', help='only emit new or changed datasets and stop at known ones')
+    arg_parser.add_argument('--state-db', default=DEFAULT_STATE_DB, help='SQLite file for incremental crawl state')
+
+def state_from_args(args):
+    if not args.incremental:
+        return None
+    metrics.log('incremental', f"Incremental mode: crawl state in {args.state_db}", path=args.state_db)
+    return CrawlState(args.state_db)
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+# Year range filtering for the HTML scrapers. The dates of a whole results
+# page are parsed in one pandas call instead of strptime per row. Each portal
+# writes its dates one way, so the format that worked for a portal is tried
+# first on its next page and the other formats only see what it left over.
+
+DATE_FORMATS = ['%d %B %Y', '%b %d, %Y', '%B %Y', '%Y', '%Y-%m-%d']
+
+# portal -> format that parsed its dates last time
+_portal_formats = {}
+
+def parse_dates(portal, values):
+    values = pd.Series(values, dtype=object).fillna('').astype(str).str.strip()
+    parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    remaining = values.index
+
+    remembered = _portal_formats.get(portal)
+    formats = [remembered] + [fmt for fmt in DATE_FORMATS if fmt != remembered] if remembered else DATE_FORMATS
+    hits = {}
+    for fmt in formats:
+        if remaining.empty:
+            break
+        attempt = pd.to_datetime(values[remaining], format=fmt, errors='coerce')
+        ok = attempt.notna()
+        if ok.any():
+            parsed[remaining[ok]] = attempt[ok]
+            hits[fmt] = int(ok.sum())
+            remaining = remaining[~ok]
+
+    # Remember the format that parsed the most dates
+    if hits:
+        best = max(hits, key=hits.get)
+        if hits.get(remembered, 0) < hits[best]:
+            _portal_formats[portal] = best
+    return parsed
+
+class DateFilter:
+    # Inclusive year range; either end may be None for an open range.
+    # newest_first says the results come sorted newest first, which is what
+    # lets a crawl stop once it gets past the range.
+    def __init__(self, year_from=None, year_to=None, newest_first=True):
+        self.year_from = int(year_from) if year_from is not None else None
+        self.year_to = int(year_to) if year_to is not None else None
+        self.newest_first = newest_first
+
+    def active(self):
+        return self.year_from is not None or self.year_to is not None
+
+    # Checks a page of dates. Returns a boolean array of the dates inside the
+    # range (dates that don't parse are outside it) and, for results sorted
+    # newest first, whether the page already reached dates older than the
+    # range, in which case later pages can't hold anything inside it. In any
+    # other order the second value is always False.
+    def check(self, portal, values):
+        years = parse_dates(portal, values).dt.year.to_numpy(dtype=float)
+        parsed = ~np.isnan(years)
+        keep = parsed.copy()
+        if self.year_from is not None:
+            keep &= years >= self.year_from
+        if self.year_to is not None:
+            keep &= years <= self.year_to
+        passed = (self.newest_first and self.year_from is not None and parsed.any()
+                  and years[parsed][-1] < self.year_from)
+        return keep, bool(passed)
+
+    def describe(self):
+        if not self.active():
+            return "any year"
+        if self.year_from == self.year_to:
+            return f"{self.year_from}"
+        return f"{self.year_from or '...'}-{self.year_to or '...'}"
+
+# Command line options shared by the scrapers
+def add_date_arguments(arg_parser):
+    arg_parser.add_argument('--year-from', type=int, help='only keep datasets modified in or after this year')
+    arg_parser.add_argument('--year-to', type=int, help='only keep datasets modified in or before this year')
@@ -0,0 +1,223 @@
+import hashlib
+import re
+import sqlite3
+import threading
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import numpy as np
+
+import metrics
+
+# Index of the datasets already written in this run, shared by every portal
+# and search term, so the same dataset found by overlapping searches (or
+# mirrored on another portal) is stored and enriched once.
+# - URLs are compared in canonical form: no tracking parameters, fragment,
+#   trailing slash, language segment, www. or http/https difference.
+# - Titles are compared with MinHash signatures over word shingles; LSH
+#   bands find candidate titles and the signatures confirm the similarity.
+#   Titles on different hosts can be held to a stricter threshold, for
+#   callers where two portals' similar titles aren't proof of one dataset.
+# Keys live in a SQLite file, so memory use doesn't grow with the index.
+# The file is emptied when a run opens it: a re-run writes and exports every
+# dataset again instead of finding them all indexed by the run before. So
+# scrapers started separately at the same time need their own --dedup-db
+# (crawl.py runs every portal with one index).
+
+DEFAULT_DEDUP_DB = 'dedup_index.sqlite'
+
+TRACKING_PARAMS = {'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'mc_cid', 'mc_eid', '_ga', '_gl', 'igshid', 'ref', 'ref_src'}
+TRACKING_PREFIXES = ('utm_',)
+# Language path segments the portals put in front of the same dataset
+LANGUAGE = re.compile(r'^(?:en|fr|ga|mi|cy|de|es)(?:[-_][a-z]{2})?$', re.IGNORECASE)
+LANGUAGE_SEGMENTS = 2  # only the first path segments are checked
+
+def canonical_url(url):
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+
+    segments = [segment for segment in parts.path.split('/') if segment]
+    segments = [segment for index, segment in enumerate(segments)
+                if index >= LANGUAGE_SEGMENTS or not LANGUAGE.match(segment)]
+    path = '/' + '/'.join(segments)
+
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES))
+    return urlunsplit(('https', host, path, urlencode(query), ''))
+
+# MinHash over word 3-shingles. Hashes are 32 bit and the permutations are
+# (a * x + b) mod p with p just above 2**32, so everything fits in uint64.
+PRIME = np.uint64(4294967311)
+MIN_TITLE_WORDS = 4  # shorter titles are too generic to compare
+
+def title_shingles(title, size=3):
+    words = re.findall(r'\w+', (title or '').lower())
+    if len(words) < MIN_TITLE_WORDS:
+        return None
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def _hash32(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=4).digest(), 'little')
+
+class MinHasher:
+    def __init__(self, num_perm=64, bands=8, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 2 ** 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 2 ** 32, size=num_perm, dtype=np.uint64)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+    def signature(self, shingles):
+        x = np.fromiter((_hash32(s) for s in shingles), dtype=np.uint64, count=len(shingles))
+        return ((np.outer(x, self.a) + self.b) % PRIME).min(axis=0)
+
+    # One bucket key per band
+    def band_keys(self, signature):
+        return [int.from_bytes(hashlib.blake2b(signature[band * self.rows:(band + 1) * self.rows].tobytes(),
+                                               digest_size=8).digest(), 'little', signed=True)
+                for band in range(self.bands)]
+
+    @staticmethod
+    def similarity(first, second):
+        return float(np.mean(first == second))
+
+class DedupIndex:
+    def __init__(self, path=DEFAULT_DEDUP_DB, title_threshold=0.9, num_perm=64, bands=8, cache_mb=64,
+                 cross_host_threshold=None):
+        self.path = path
+        self.title_threshold = title_threshold
+        self.cross_host_threshold = title_threshold if cross_host_threshold is None else cross_host_threshold
+        self.hasher = MinHasher(num_perm, bands)
+        # Shared by the crawl orchestrator's worker threads
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        # Bound the page cache; the index itself stays on disk
+        self.db.execute(f"PRAGMA cache_size = -{int(cache_mb * 1024)}")
+        self.db.execute("CREATE TABLE IF NOT EXISTS urls (key TEXT PRIMARY KEY, url TEXT) WITHOUT ROWID")
+        self.db.execute("CREATE TABLE IF NOT EXISTS titles (id INTEGER PRIMARY KEY, url TEXT, signature BLOB)")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS title_bands (
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            title_id INTEGER NOT NULL
+        )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS title_bands_bucket ON title_bands (band, bucket)")
+        for table in ('urls', 'titles', 'title_bands'):
+            self.db.execute(f"DELETE FROM {table}")
+        self.db.commit()
+
+        self.url_duplicates = 0
+        self.title_duplicates = 0
+
+    def _similar_title(self, signature, keys, host):
+        candidates = set()
+        for band, bucket in enumerate(keys):
+            candidates.update(row[0] for row in self.db.execute(
+                "SELECT title_id FROM title_bands WHERE band = ? AND bucket = ?", (band, bucket)))
+        for title_id in sorted(candidates):
+            url, blob = self.db.execute("SELECT url, signature FROM titles WHERE id = ?", (title_id,)).fetchone()
+            same_host = urlsplit(canonical_url(url)).netloc == host
+            threshold = self.title_threshold if same_host else self.cross_host_threshold
+            if self.hasher.similarity(signature, np.frombuffer(blob, dtype=np.uint64)) >= threshold:
+                return url
+        return None
+
+    def _add_title(self, url, signature, keys):
+        title_id = self.db.execute("INSERT INTO titles (url, signature) VALUES (?, ?)", (url, signature.tobytes())).lastrowid
+        self.db.executemany("INSERT INTO title_bands (band, bucket, title_id) VALUES (?, ?, ?)",
+                            [(band, bucket, title_id) for band, bucket in enumerate(keys)])
+
+    # Records the dataset unless it is already indexed. Returns None for a
+    # new dataset, otherwise the URL of the copy indexed first.
+    def add(self, url, title=None):
+        key = canonical_url(url)
+        shingles = title_shingles(title) if self.title_threshold else None
+        signature = self.hasher.signature(shingles) if shingles else None
+        keys = self.hasher.band_keys(signature) if signature is not None else None
+
+        with self.lock:
+            row = self.db.execute("SELECT url FROM urls WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.url_duplicates += 1
+                return row[0]
+            if signature is not None:
+                similar = self._similar_title(signature, keys, urlsplit(key).netloc)
+                if similar is not None:
+                    self.title_duplicates += 1
+                    return similar
+            self.db.execute("INSERT INTO urls (key, url) VALUES (?, ?)", (key, url))
+            if signature is not None:
+                self._add_title(url, signature, keys)
+            return None
+
+    # The records (scraper dicts with 'URL' or 'Dataset URL' and maybe
+    # 'Title') not indexed yet, in order; they are indexed as a side effect
+    def filter_records(self, records):
+        new_records = []
+        for record in records:
+            if self.add(record.get('URL') or record.get('Dataset URL'), record.get('Title')) is None:
+                new_records.append(record)
+        with self.lock:
+            self.db.commit()
+        return new_records
+
+    def summary(self):
+        return f"Dedup index: {self.url_duplicates} duplicate URLs, {self.title_duplicates} near-duplicate titles skipped"
+
+    def close(self):
+        with self.lock:
+            self.db.commit()
+            self.db.close()
+
+# Command line options shared by the scrapers (see result_sink.output_from_args)
+# and analizeAi, which keeps its index in a file of its own
+def add_dedup_arguments(arg_parser, default_db=DEFAULT_DEDUP_DB):
+    arg_parser.add_argument('--dedup', action='store_true', help='skip datasets already seen this run (from any portal, search or URL variant)')
+    arg_parser.add_argument('--dedup-db', default=default_db, help='SQLite file for the dedup index')
+    arg_parser.add_argument('--title-threshold', type=float, default=0.9,
+                            help='title similarity (0-1) that counts as the same dataset; 0 compares URLs only')
+
+def index_from_args(args, cross_host_threshold=None):
+    if not args.dedup:
+        return None
+    metrics.log('dedup_index', f"Dedup index in {args.dedup_db}", path=args.dedup_db)
+    return DedupIndex(args.dedup_db, args.title_threshold, cross_host_threshold=cross_host_threshold)
+
+# Rows of analizeAi's current chunk that the index matched to another row of
+# the chunk wait here for that row's answer. Only a validated answer (both a
+# name and a topic) is passed on: rows whose first copy got nothing usable,
+# or no answer at all, are released to be sent to the model themselves.
+class WaitingDuplicates:
+    def __init__(self):
+        self.answers = {}
+        self.waiting = {}
+
+    def clear(self):
+        self.answers.clear()
+        self.waiting.clear()
+
+    # The validated answer of `url`, if it has one yet
+    def answer(self, url):
+        return self.answers.get(url)
+
+    def wait(self, url, item):
+        self.waiting.setdefault(url, []).append(item)
+
+    # Records the answer of `url`; returns the items that waited for it, or
+    # nothing if the answer isn't usable (they stay waiting until released)
+    def answered(self, url, dataset_name, topic):
+        if dataset_name is None or topic is None:
+            return []
+        self.answers[url] = (dataset_name, topic)
+        return self.waiting.pop(url, [])
+
+    # Every item still waiting, which is taken off the list
+    def release(self):
+        items = [item for items in self.waiting.values() for item in items]
+        self.waiting.clear()
+        return items
@@ -0,0 +1,78 @@
+import asyncio
+import time
+from urllib.parse import urlparse
+
+import http_client
+import metrics
+
+# Simple token bucket: `rate` requests per second with bursts of up to `capacity`
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Waits until `amount` tokens are available (at most the bucket capacity)
+    async def acquire(self, amount=1):
+        amount = min(float(amount), self.capacity)
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+                await asyncio.sleep(wait)
+                metrics.count('sleep_seconds_total', wait, reason='rate_limit')
+
+# Async fetch engine with a per-host concurrency limit and a per-host rate limit.
+# The actual HTTP call goes through the shared pooled session in a worker thread.
+class AsyncFetcher:
+    def __init__(self, max_per_host=4, rate=2.0, burst=None, timeout=None, headers=None):
+        self.max_per_host = max_per_host
+        self.rate = rate
+        self.burst = burst
+        self.timeout = timeout
+        self.headers = headers or {}
+        self._semaphores = {}
+        self._buckets = {}
+
+    def _limits(self, url):
+        host = urlparse(url).netloc
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.max_per_host)
+            self._buckets[host] = TokenBucket(self.rate, self.burst)
+        return self._semaphores[host], self._buckets[host]
+
+    def _get(self, url):
+        if self.timeout is None:
+            return http_client.get(url, headers=self.headers)
+        return http_client.get(url, headers=self.headers, timeout=self.timeout)
+
+    # With `stop` (a threading.Event) the request is skipped and None is
+    # returned if stop was set while waiting for a slot or a token
+    async def fetch(self, url, stop=None):
+        semaphore, bucket = self._limits(url)
+        async with semaphore:
+            await bucket.acquire()
+            if stop is not None and stop.is_set():
+                return None
+            return await asyncio.to_thread(self._get, url)
+
+    # Returns one item per URL, in the same order as `urls`.
+    # Failed requests are returned as the exception instead of a response.
+    async def fetch_all(self, urls):
+        tasks = [self.fetch(url) for url in urls]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+# Synchronous helper for the scripts
+def fetch_pages(urls, **kwargs):
+    fetcher = AsyncFetcher(**kwargs)
+    return asyncio.run(fetcher.fetch_all(list(urls)))
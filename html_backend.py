@@ -0,0 +1,81 @@
+from bs4 import BeautifulSoup
+
+# Pluggable HTML parsing backend for the scrapers.
+# 'bs4'  - BeautifulSoup with html.parser (default, pure Python)
+# 'lxml' - lxml.html tree queried with XPath (compiled, much faster)
+# Each scraper keeps its BeautifulSoup extraction code and has an lxml
+# variant of it; both must produce the same records.
+
+BACKENDS = ('bs4', 'lxml')
+_backend = 'bs4'
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:
+    lxml = None
+
+def set_backend(name):
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown parser backend: {name}")
+    if name == 'lxml' and lxml is None:
+        raise ImportError("The lxml parser backend needs 'lxml' installed")
+    _backend = name
+
+def get_backend():
+    return _backend
+
+def parse(html):
+    if _backend == 'lxml':
+        return parse_lxml(html)
+    return BeautifulSoup(html, 'html.parser')
+
+def parse_lxml(html):
+    try:
+        return lxml.html.fromstring(html)
+    except ValueError:
+        # Unicode strings with an XML encoding declaration need to be bytes
+        return lxml.html.fromstring(html.encode('utf-8'))
+    except etree.ParserError:
+        # Empty document
+        return lxml.html.fromstring('<html></html>')
+
+def is_lxml(doc):
+    return lxml is not None and isinstance(doc, etree._Element)
+
+# XPath for an element with the given class, matching BeautifulSoup's class_=
+# semantics: one class name matches any of the element's classes, a string
+# with spaces must match the whole class attribute.
+def class_xpath(tag, class_name):
+    if ' ' in class_name:
+        return f"{tag}[normalize-space(@class)='{class_name}']"
+    return f"{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]"
+
+def first(elements):
+    return elements[0] if elements else None
+
+# Same strings as BeautifulSoup's .text / get_text(): element text without
+# comments, scripts and styles
+def _strings(element):
+    if element.tag in ('script', 'style'):
+        return
+    if isinstance(element.tag, str) and element.text:
+        yield element.text
+    for child in element:
+        if isinstance(child.tag, str):
+            yield from _strings(child)
+        if child.tail:
+            yield child.tail
+
+def text(element, strip=False):
+    if strip:
+        return ''.join(s.strip() for s in _strings(element))
+    return ''.join(_strings(element))
+
+# Command line option shared by the scrapers
+def add_backend_arguments(arg_parser):
+    arg_parser.add_argument('--parser-backend', choices=BACKENDS, default='bs4', help='HTML parsing backend')
+
+def backend_from_args(args):
+    set_backend(args.parser_backend)
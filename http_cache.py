@@ -0,0 +1,267 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# On-disk HTTP response cache used by http_client.
+# Bodies are stored zlib-compressed under the sha256 of their content, so
+# identical pages fetched from different URLs share one file. A small SQLite
+# index maps each URL to its body plus ETag / Last-Modified for revalidation.
+# A streamed response is stored when it is closed, with only the bytes its
+# reader actually read; such a partial entry is only served to streamed
+# requests, which stop reading at the same point.
+
+DEFAULT_CACHE_DIR = '.http_cache'
+DEFAULT_TTL = 12 * 60 * 60  # seconds a cached page is used without revalidating
+DEFAULT_MAX_SIZE = 500 * 1024 * 1024  # bytes of compressed bodies kept on disk
+
+# Headers worth keeping with a cached body
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Cache-Control', 'Date')
+
+class HTTPCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE, offline=False):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_size = max_size
+        self.offline = offline
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.join(cache_dir, 'bodies'), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite'), check_same_thread=False)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS entries (
+            url TEXT PRIMARY KEY,
+            body_hash TEXT NOT NULL,
+            status INTEGER NOT NULL,
+            headers TEXT NOT NULL,
+            encoding TEXT,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at REAL NOT NULL,
+            accessed_at REAL NOT NULL,
+            complete INTEGER NOT NULL DEFAULT 1
+        )""")
+        # Caches made before partial entries existed
+        if 'complete' not in [row[1] for row in self.db.execute("PRAGMA table_info(entries)")]:
+            self.db.execute("ALTER TABLE entries ADD COLUMN complete INTEGER NOT NULL DEFAULT 1")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS bodies (
+            body_hash TEXT PRIMARY KEY,
+            size INTEGER NOT NULL
+        )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        self.db.commit()
+
+    def _body_path(self, body_hash):
+        return os.path.join(self.cache_dir, 'bodies', body_hash[:2], body_hash + '.z')
+
+    def _lookup(self, url):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT body_hash, status, headers, encoding, etag, last_modified, fetched_at, complete FROM entries WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row:
+                self.db.execute("UPDATE entries SET accessed_at = ? WHERE url = ?", (time.time(), url))
+                self.db.commit()
+        if not row:
+            return None
+        body_hash, status, headers, encoding, etag, last_modified, fetched_at, complete = row
+        try:
+            with open(self._body_path(body_hash), 'rb') as f:
+                body = zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            return None
+        return {
+            'body': body,
+            'status': status,
+            'headers': json.loads(headers),
+            'encoding': encoding,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': fetched_at,
+            'complete': bool(complete),
+        }
+
+    def _store(self, url, response, body=None, complete=True):
+        if body is None:
+            body = response.content
+        body_hash = hashlib.sha256(body).hexdigest()
+        path = self._body_path(body_hash)
+        size = None
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = zlib.compress(body, 6)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            size = len(data)
+
+        headers = {k: response.headers[k] for k in STORED_HEADERS if k in response.headers}
+        now = time.time()
+        with self.lock:
+            old = self.db.execute("SELECT body_hash FROM entries WHERE url = ?", (url,)).fetchone()
+            if size is not None:
+                self.db.execute("INSERT OR REPLACE INTO bodies (body_hash, size) VALUES (?, ?)", (body_hash, size))
+            self.db.execute(
+                """INSERT OR REPLACE INTO entries (url, body_hash, status, headers, encoding, etag, last_modified,
+                   fetched_at, accessed_at, complete) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (url, body_hash, response.status_code, json.dumps(headers), response.encoding,
+                 response.headers.get('ETag'), response.headers.get('Last-Modified'), now, now, int(complete)),
+            )
+            # The page changed: its previous body may not be used any more
+            if old and old[0] != body_hash:
+                self._drop_body(old[0])
+            self.db.commit()
+            self._evict()
+
+    def _touch(self, url):
+        now = time.time()
+        with self.lock:
+            self.db.execute("UPDATE entries SET fetched_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+            self.db.commit()
+
+    # Deletes a body no entry points to any more; returns the bytes freed.
+    # Called with self.lock held.
+    def _drop_body(self, body_hash):
+        if self.db.execute("SELECT 1 FROM entries WHERE body_hash = ? LIMIT 1", (body_hash,)).fetchone():
+            return 0
+        size = self.db.execute("SELECT size FROM bodies WHERE body_hash = ?", (body_hash,)).fetchone()
+        self.db.execute("DELETE FROM bodies WHERE body_hash = ?", (body_hash,))
+        try:
+            os.remove(self._body_path(body_hash))
+        except OSError:
+            pass
+        return size[0] if size else 0
+
+    # Drop least recently used entries until the bodies fit in max_size.
+    # Called with self.lock held.
+    def _evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM bodies").fetchone()[0]
+        if total <= self.max_size:
+            return
+        # Bodies left behind by older versions of the cache go first
+        orphans = self.db.execute("""SELECT bodies.body_hash FROM bodies
+            LEFT JOIN entries ON entries.body_hash = bodies.body_hash
+            WHERE entries.url IS NULL""").fetchall()
+        for (body_hash,) in orphans:
+            total -= self._drop_body(body_hash)
+        for url, body_hash in self.db.execute("SELECT url, body_hash FROM entries ORDER BY accessed_at").fetchall():
+            if total <= self.max_size:
+                break
+            self.db.execute("DELETE FROM entries WHERE url = ?", (url,))
+            total -= self._drop_body(body_hash)
+        self.db.commit()
+
+    def _to_response(self, url, entry):
+        response = requests.Response()
+        response.url = url
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response._content = entry['body']
+        response._content_consumed = True
+        response.encoding = entry['encoding']
+        response.reason = 'OK'
+        response.from_cache = True
+        return response
+
+    def _offline_miss(self, url):
+        # Same as an HTTP "only-if-cached" miss
+        response = requests.Response()
+        response.url = url
+        response.status_code = 504
+        response.reason = 'Not in cache (offline)'
+        response._content = b''
+        response._content_consumed = True
+        response.from_cache = True
+        return response
+
+    # Stores the bytes read from a streamed response once it is closed
+    # (reading response.content here would download the whole body and
+    # defeat a reader that stops early). Read to the end, it is a complete
+    # entry; otherwise a partial one.
+    def _store_when_closed(self, url, response):
+        read = []
+        finished = [False]
+        iter_content, close = response.iter_content, response.close
+
+        def recording_iter_content(chunk_size=1, decode_unicode=False):
+            for chunk in iter_content(chunk_size, decode_unicode):
+                if isinstance(chunk, bytes):
+                    read.append(chunk)
+                yield chunk
+            finished[0] = True
+
+        def store_and_close():
+            response.close = close
+            close()
+            if read:
+                self._store(url, response, b''.join(read), complete=finished[0])
+
+        response.iter_content = recording_iter_content
+        response.close = store_and_close
+
+    # `fetch` does the real request and takes extra headers for revalidation.
+    # A streamed request's body is stored when the response is closed, see
+    # _store_when_closed.
+    def get(self, url, fetch, streamed=False):
+        entry = self._lookup(url)
+        if entry and not entry['complete'] and not streamed:
+            entry = None
+
+        if self.offline:
+            if entry:
+                self.hits += 1
+                return self._to_response(url, entry)
+            self.misses += 1
+            return self._offline_miss(url)
+
+        if entry and time.time() - entry['fetched_at'] < self.ttl:
+            self.hits += 1
+            return self._to_response(url, entry)
+
+        conditional = {}
+        if entry:
+            if entry['etag']:
+                conditional['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                conditional['If-Modified-Since'] = entry['last_modified']
+
+        response = fetch(conditional)
+
+        if entry and response.status_code == 304:
+            self.revalidated += 1
+            self._touch(url)
+            return self._to_response(url, entry)
+
+        self.misses += 1
+        if response.status_code == 200:
+            if streamed:
+                self._store_when_closed(url, response)
+            else:
+                self._store(url, response)
+        response.from_cache = False
+        return response
+
+    def stats(self):
+        return {'hits': self.hits, 'revalidated': self.revalidated, 'misses': self.misses}
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+# Command line options shared by the scripts
+def add_cache_arguments(arg_parser):
+    arg_parser.add_argument('--offline', action='store_true', help='replay pages from the HTTP cache only')
+    arg_parser.add_argument('--no-cache', action='store_true', help='disable the on-disk HTTP cache')
+    arg_parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='HTTP cache directory')
+    arg_parser.add_argument('--cache-ttl', type=float, default=DEFAULT_TTL, help='seconds before cached pages are revalidated')
+    arg_parser.add_argument('--cache-max-mb', type=float, default=DEFAULT_MAX_SIZE / (1024 * 1024), help='cache size cap in MB')
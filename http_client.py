@@ -0,0 +1,254 @@
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.util.retry import Retry
+
+import http_cache
+import metrics
+
+# Shared HTTP layer for all scrapers: one pooled keep-alive session,
+# compression, default timeouts and retries on 429/5xx.
+
+# (connect, read) timeout in seconds used when a call doesn't pass its own
+DEFAULT_TIMEOUT = (5, 20)
+
+# Keep-alive connections kept per host; hosts not listed use DEFAULT_POOL_SIZE
+DEFAULT_POOL_SIZE = 10
+HOST_POOL_SIZES = {
+    'www.data.gov.uk': 8,
+    'search.open.canada.ca': 4,
+    'open.canada.ca': 4,
+    'data.govt.nz': 4,
+    'data.gov.ie': 4,
+    'researchdata.edu.au': 4,
+}
+
+MAX_RETRIES = 4
+BACKOFF_FACTOR = 0.5
+BACKOFF_MAX = 30
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+# Connection counters, updated by the pool classes below
+_stats_lock = threading.Lock()
+_stats = {'requests': 0, 'new_connections': 0, 'retries': 0}
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+# Exponential backoff with full jitter. A Retry-After header from the server
+# takes precedence over the computed backoff.
+class JitteredRetry(Retry):
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        if backoff <= 0:
+            return 0
+        return random.uniform(0, backoff)
+
+    def increment(self, *args, **kwargs):
+        _count('retries')
+        metrics.count('http_retries_total')
+        return super().increment(*args, **kwargs)
+
+    def sleep(self, response=None):
+        start = time.monotonic()
+        super().sleep(response)
+        metrics.count('sleep_seconds_total', time.monotonic() - start, reason='http_retry')
+
+# A new socket is opened in connect(); every request that doesn't call it
+# reused a keep-alive connection.
+class CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        _count('new_connections')
+        return super().connect()
+
+class CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        _count('new_connections')
+        return super().connect()
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = CountingHTTPConnection
+
+    def _make_request(self, *args, **kwargs):
+        _count('requests')
+        return super()._make_request(*args, **kwargs)
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = CountingHTTPSConnection
+
+    def _make_request(self, *args, **kwargs):
+        _count('requests')
+        return super()._make_request(*args, **kwargs)
+
+class CountingAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': CountingHTTPConnectionPool,
+            'https': CountingHTTPSConnectionPool,
+        }
+
+def _make_adapter(pool_size, pool_hosts=1):
+    retry = JitteredRetry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        status=MAX_RETRIES,
+        status_forcelist=RETRY_STATUSES,
+        # The only POSTs sent are read-only search queries (rda_api), so they
+        # are as safe to repeat as a GET
+        allowed_methods=frozenset(['GET', 'HEAD', 'POST']),
+        backoff_factor=BACKOFF_FACTOR,
+        respect_retry_after_header=True,
+        backoff_max=BACKOFF_MAX,
+        raise_on_status=False,
+    )
+    return CountingAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size, max_retries=retry)
+
+def create_session():
+    session = requests.Session()
+    session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+    session.mount('http://', _make_adapter(DEFAULT_POOL_SIZE, pool_hosts=10))
+    session.mount('https://', _make_adapter(DEFAULT_POOL_SIZE, pool_hosts=10))
+    for host, pool_size in HOST_POOL_SIZES.items():
+        adapter = _make_adapter(pool_size)
+        session.mount(f'https://{host}', adapter)
+        session.mount(f'http://{host}', adapter)
+    return session
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+# Change timeouts / pool sizes / retries; the session is rebuilt on next use.
+# pool_size applies to every host, pool_sizes to the hosts it names.
+def configure(timeout=None, pool_sizes=None, max_retries=None, backoff_factor=None, pool_size=None):
+    global DEFAULT_TIMEOUT, DEFAULT_POOL_SIZE, MAX_RETRIES, BACKOFF_FACTOR, _session
+    if timeout is not None:
+        DEFAULT_TIMEOUT = timeout
+    if pool_size is not None:
+        DEFAULT_POOL_SIZE = pool_size
+        HOST_POOL_SIZES.update(dict.fromkeys(HOST_POOL_SIZES, pool_size))
+    if pool_sizes:
+        HOST_POOL_SIZES.update(pool_sizes)
+    if max_retries is not None:
+        MAX_RETRIES = max_retries
+    if backoff_factor is not None:
+        BACKOFF_FACTOR = backoff_factor
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+# Command line options shared by the scrapers
+def add_connection_arguments(arg_parser):
+    arg_parser.add_argument('--timeout', type=float, metavar='SECONDS',
+                            help=f'seconds to wait for a server to answer (default: {DEFAULT_TIMEOUT[1]}; '
+                                 f'connecting gives up after {DEFAULT_TIMEOUT[0]})')
+    arg_parser.add_argument('--pool-size', type=int, help='keep-alive connections per host (default: 4-8 for the '
+                            f'portals, {DEFAULT_POOL_SIZE} for other hosts)')
+    arg_parser.add_argument('--max-retries', type=int, help=f'retries after connection errors, 429 and 5xx (default: {MAX_RETRIES})')
+
+def configure_from_args(args):
+    timeout = (min(DEFAULT_TIMEOUT[0], args.timeout), args.timeout) if args.timeout is not None else None
+    configure(timeout=timeout, pool_size=args.pool_size, max_retries=args.max_retries)
+
+# Optional on-disk response cache (see http_cache.py)
+_cache = None
+
+def enable_cache(cache_dir=http_cache.DEFAULT_CACHE_DIR, ttl=http_cache.DEFAULT_TTL,
+                 max_size=http_cache.DEFAULT_MAX_SIZE, offline=False):
+    global _cache
+    if _cache is not None:
+        _cache.close()
+    _cache = http_cache.HTTPCache(cache_dir, ttl=ttl, max_size=max_size, offline=offline)
+    return _cache
+
+def disable_cache():
+    global _cache
+    if _cache is not None:
+        _cache.close()
+    _cache = None
+
+def configure_cache_from_args(args):
+    if args.no_cache and not args.offline:
+        disable_cache()
+        return
+    enable_cache(args.cache_dir, ttl=args.cache_ttl, max_size=int(args.cache_max_mb * 1024 * 1024), offline=args.offline)
+    if args.offline:
+        metrics.log('offline', f"Offline mode: replaying pages from {args.cache_dir}", path=args.cache_dir)
+
+# Latency, status and body size of a request that went to the network.
+# Streamed bodies aren't read here, so their size comes from Content-Length.
+def _record(method, url, started, response, streamed=False):
+    host = urlsplit(url).netloc
+    metrics.observe('http_request_seconds', time.monotonic() - started, host=host, method=method)
+    metrics.count('http_requests_total', host=host, status=response.status_code)
+    if streamed:
+        size = int(response.headers.get('Content-Length') or 0)
+    else:
+        size = len(response.content)
+    metrics.count('http_bytes_total', size, host=host)
+
+def _fetch(url, kwargs):
+    kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+    started = time.monotonic()
+    response = get_session().get(url, **kwargs)
+    _record('GET', url, started, response, kwargs.get('stream', False))
+    return response
+
+def get(url, **kwargs):
+    if _cache is None:
+        return _fetch(url, kwargs)
+
+    def fetch(conditional):
+        headers = dict(kwargs.get('headers') or {})
+        headers.update(conditional)
+        return _fetch(url, dict(kwargs, headers=headers))
+
+    # Streamed bodies are cached as far as the caller reads them
+    return _cache.get(url, fetch, streamed=kwargs.get('stream', False))
+
+# POST requests are retried like GETs but never cached: the cache is keyed
+# by URL alone, and a POST's query is in its body
+def post(url, **kwargs):
+    kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+    started = time.monotonic()
+    response = get_session().post(url, **kwargs)
+    _record('POST', url, started, response)
+    return response
+
+def connection_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['reused_connections'] = max(0, stats['requests'] - stats['new_connections'])
+    return stats
+
+def print_connection_stats():
+    stats = connection_stats()
+    metrics.log('connection_stats', f"HTTP requests: {stats['requests']}, new connections: {stats['new_connections']}, "
+                f"reused: {stats['reused_connections']}, retries: {stats['retries']}", **stats)
+    if _cache is not None:
+        cache_stats = _cache.stats()
+        metrics.log('cache_stats', f"HTTP cache hits: {cache_stats['hits']}, revalidated (304): {cache_stats['revalidated']}, "
+                    f"misses: {cache_stats['misses']}", **cache_stats)
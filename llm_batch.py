@@ -0,0 +1,118 @@
+import json
+import os
+
+import metrics
+
+# Offline mode for analizeAi using the OpenAI Batch API. Every chat
+# completion request is written to JSONL files (one line per request,
+# tagged with a custom_id), the files are uploaded and submitted as batch
+# jobs, and the jobs are polled until they finish. Results come back in
+# arbitrary order and are matched to their requests by custom_id. Batch
+# requests cost half as much as synchronous ones and don't count against
+# the per-minute rate limits.
+
+ENDPOINT = "/v1/chat/completions"
+MAX_REQUESTS_PER_FILE = 50000  # Batch API limit per input file
+MAX_BYTES_PER_FILE = 190 * 1024 * 1024  # Limit is 200 MB, keep some headroom
+FINAL_STATES = ('completed', 'failed', 'expired', 'cancelled')
+
+def request_line(custom_id, body):
+    return json.dumps({'custom_id': custom_id, 'method': 'POST', 'url': ENDPOINT, 'body': body}, ensure_ascii=False) + "\n"
+
+# requests: iterable of (custom_id, body). Written as it is consumed, so the
+# requests never have to be held in memory at once. Returns the file paths.
+def write_batch_files(requests, directory, prefix='batch_input'):
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    handle = None
+    count = size = 0
+    for custom_id, body in requests:
+        line = request_line(custom_id, body).encode('utf-8')
+        if handle is None or count >= MAX_REQUESTS_PER_FILE or size + len(line) > MAX_BYTES_PER_FILE:
+            if handle is not None:
+                handle.close()
+            path = os.path.join(directory, f"{prefix}_{len(paths) + 1}.jsonl")
+            handle = open(path, 'wb')
+            paths.append(path)
+            count = size = 0
+        handle.write(line)
+        count += 1
+        size += len(line)
+    if handle is not None:
+        handle.close()
+    return paths
+
+def submit(client, path, completion_window='24h'):
+    with open(path, 'rb') as f:
+        input_file = client.files.create(file=f, purpose='batch')
+    batch = client.batches.create(input_file_id=input_file.id, endpoint=ENDPOINT, completion_window=completion_window)
+    metrics.log('batch_submitted', f"Submitted {path} as batch {batch.id}", path=path, batch_id=batch.id)
+    return batch.id
+
+# Polls every job until all of them reach a final state
+def wait(client, batch_ids, poll_interval=30):
+    batches = {}
+    pending = list(batch_ids)
+    while pending:
+        still_pending = []
+        for batch_id in pending:
+            batch = client.batches.retrieve(batch_id)
+            if batch.status in FINAL_STATES:
+                batches[batch_id] = batch
+                metrics.log('batch_status', f"Batch {batch_id} {batch.status}", batch_id=batch_id, status=batch.status)
+            else:
+                still_pending.append(batch_id)
+                counts = batch.request_counts
+                if counts is not None:
+                    metrics.log('batch_status', f"Batch {batch_id} {batch.status}: {counts.completed}/{counts.total} done, "
+                                f"{counts.failed} failed", batch_id=batch_id, status=batch.status,
+                                completed=counts.completed, total=counts.total, failed=counts.failed)
+        pending = still_pending
+        if pending:
+            metrics.sleep(poll_interval, 'batch_poll')
+    return [batches[batch_id] for batch_id in batch_ids]
+
+def _file_lines(client, file_id):
+    if not file_id:
+        return []
+    text = client.files.content(file_id).text
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+# Returns {custom_id: response body} for the requests that succeeded
+def read_results(client, batch):
+    results = {}
+    for line in _file_lines(client, batch.output_file_id):
+        response = line.get('response') or {}
+        if response.get('status_code') == 200:
+            results[line['custom_id']] = response['body']
+        else:
+            error = line.get('error') or response.get('status_code')
+            metrics.log('request_failed', f"Request {line.get('custom_id')} failed: {error}", level='error',
+                        custom_id=line.get('custom_id'), error=error)
+    for line in _file_lines(client, getattr(batch, 'error_file_id', None)):
+        metrics.log('request_failed', f"Request {line.get('custom_id')} failed: {line.get('error')}", level='error',
+                    custom_id=line.get('custom_id'), error=line.get('error'))
+    return results
+
+# Writes, submits and waits for every request; returns {custom_id: response body}
+def run(client, requests, directory, poll_interval=30, prefix='batch_input'):
+    paths = write_batch_files(requests, directory, prefix)
+    if not paths:
+        return {}
+    batch_ids = [submit(client, path) for path in paths]
+    results = {}
+    for batch in wait(client, batch_ids, poll_interval):
+        if batch.status != 'completed':
+            metrics.log('batch_failed', f"Batch {batch.id} ended as {batch.status}; its requests get fallback answers",
+                        level='error', batch_id=batch.id, status=batch.status)
+        results.update(read_results(client, batch))
+    return results
+
+def response_message(body):
+    try:
+        return body['choices'][0]['message'] or {}
+    except (KeyError, IndexError, TypeError):
+        return {}
+
+def response_text(body):
+    return (response_message(body).get('content') or "").strip()
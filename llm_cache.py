@@ -0,0 +1,100 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+import dedup_index
+
+# Persistent cache of model answers for analizeAi. An answer is stored under
+# the dataset URL, a hash of the page content the prompt was built from, the
+# model and the prompt version, so it is reused only while all four match.
+# Answers checked within `ttl` seconds are trusted without fetching the page
+# again; older ones are reused only if the page content hashes the same.
+# URLs are stored in canonical form (dedup_index.canonical_url), so copies
+# of a dataset under another URL variant reuse its answer.
+
+DEFAULT_CACHE_DB = 'llm_cache.sqlite'
+
+def content_hash(content):
+    if not isinstance(content, str):
+        content = json.dumps(content, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+class LLMCache:
+    def __init__(self, path=DEFAULT_CACHE_DB, model='', prompt_version='', ttl=7 * 86400):
+        self.path = path
+        self.model = model
+        self.prompt_version = str(prompt_version)
+        self.ttl = ttl
+        self.db = sqlite3.connect(path)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS answers (
+            url TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            model TEXT NOT NULL,
+            prompt_version TEXT NOT NULL,
+            dataset_name TEXT,
+            topic TEXT,
+            created REAL,
+            checked REAL,
+            PRIMARY KEY (url, content_hash, model, prompt_version)
+        )""")
+        self.db.commit()
+
+        self.fresh_hits = 0
+        self.content_hits = 0
+        self.misses = 0
+
+    # Answer checked recently enough to skip fetching the page, or None
+    def get_fresh(self, url):
+        if self.ttl <= 0:
+            return None
+        url = dedup_index.canonical_url(url)
+        row = self.db.execute(
+            "SELECT dataset_name, topic FROM answers WHERE url = ? AND model = ? AND prompt_version = ? AND checked >= ? "
+            "ORDER BY checked DESC LIMIT 1",
+            (url, self.model, self.prompt_version, time.time() - self.ttl),
+        ).fetchone()
+        if row is None:
+            return None
+        self.fresh_hits += 1
+        return row
+
+    # Answer for this exact page content, or None
+    def get(self, url, content):
+        key = (dedup_index.canonical_url(url), content_hash(content), self.model, self.prompt_version)
+        row = self.db.execute(
+            "SELECT dataset_name, topic FROM answers WHERE url = ? AND content_hash = ? AND model = ? AND prompt_version = ?",
+            key,
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.db.execute(
+            "UPDATE answers SET checked = ? WHERE url = ? AND content_hash = ? AND model = ? AND prompt_version = ?",
+            (time.time(),) + key,
+        )
+        self.db.commit()
+        self.content_hits += 1
+        return row
+
+    def put(self, url, content, dataset_name, topic):
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO answers (url, content_hash, model, prompt_version, dataset_name, topic, created, checked) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (dedup_index.canonical_url(url), content_hash(content), self.model, self.prompt_version, dataset_name, topic, now, now),
+        )
+        self.db.commit()
+
+    def hits(self):
+        return self.fresh_hits + self.content_hits
+
+    def summary(self, cost_per_url=0.0):
+        lookups = self.hits() + self.misses
+        rate = self.hits() / lookups * 100 if lookups else 0.0
+        return (f"LLM cache: {self.hits()}/{lookups} hits ({rate:.1f}%), "
+                f"{self.fresh_hits} without refetching the page, {self.content_hits} with unchanged content, "
+                f"saved ${self.hits() * cost_per_url:.3f}")
+
+    def close(self):
+        self.db.close()
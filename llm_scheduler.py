@@ -0,0 +1,174 @@
+import asyncio
+import random
+import time
+
+import openai
+
+import metrics
+from fetcher import TokenBucket
+
+# Runs many chat completions concurrently while staying inside the account's
+# requests-per-minute and tokens-per-minute limits. Token cost of a request
+# is estimated from the prompt size plus max_tokens (which OpenAI counts
+# against the TPM limit). On rate-limit errors every worker pauses, the
+# number of requests allowed in flight is halved, and it grows back slowly
+# as requests succeed. Connection errors, timeouts and 5xx answers are
+# retried after the same jittered backoff (the client is made with
+# max_retries=0, so nothing else retries them).
+
+TRANSIENT_ERRORS = (openai.APIConnectionError, openai.InternalServerError)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding('cl100k_base')
+except Exception:
+    _encoding = None
+
+def estimate_tokens(text):
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    # Roughly 4 characters per token for English text
+    return len(text) // 4 + 1
+
+def estimate_request_tokens(messages, max_tokens):
+    return sum(estimate_tokens(m['content']) + 4 for m in messages) + max_tokens
+
+class LLMScheduler:
+    def __init__(self, client, concurrency=8, rpm=500, tpm=200000, max_retries=6, max_backoff=60):
+        self.client = client
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.requests = TokenBucket(rpm / 60.0, rpm)
+        self.tokens = TokenBucket(tpm / 60.0, tpm)
+
+        # Adaptive in-flight limit and shared pause after a rate-limit error
+        self.limit = concurrency
+        self.in_flight = 0
+        self.successes = 0
+        self.pause_until = 0.0
+        self.backoff = 1.0
+        self.condition = None
+
+        self.calls = 0
+        self.rate_limited = 0
+        self.transient_errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+
+    async def _enter(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def _leave(self):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    async def _on_success(self):
+        self.backoff = 1.0
+        self.successes += 1
+        if self.limit < self.concurrency and self.successes % 10 == 0:
+            async with self.condition:
+                self.limit += 1
+                self.condition.notify_all()
+
+    def _backoff_delay(self):
+        delay = random.uniform(0, self.backoff)
+        self.backoff = min(self.backoff * 2, self.max_backoff)
+        return delay
+
+    def _on_rate_limit(self, error):
+        self.rate_limited += 1
+        metrics.count('llm_rate_limited_total')
+        self.limit = max(1, self.limit // 2)
+        self.successes = 0
+
+        delay = None
+        response = getattr(error, 'response', None)
+        if response is not None:
+            try:
+                delay = float(response.headers.get('retry-after'))
+            except (TypeError, ValueError):
+                delay = None
+        if delay is None:
+            delay = self._backoff_delay()
+        self.pause_until = max(self.pause_until, time.monotonic() + delay)
+        metrics.log('rate_limited', f"Rate limited, pausing {delay:.1f}s (in-flight limit {self.limit})", level='warning',
+                    delay=round(delay, 2), limit=self.limit)
+
+    # The in-flight limit stays as it is: the server is struggling, not
+    # telling us to send less
+    def _on_transient_error(self, error):
+        self.transient_errors += 1
+        metrics.count('llm_transient_errors_total', kind=type(error).__name__)
+        delay = self._backoff_delay()
+        self.pause_until = max(self.pause_until, time.monotonic() + delay)
+        metrics.log('llm_retry', f"{type(error).__name__}: {error}, retrying in {delay:.1f}s", level='warning',
+                    delay=round(delay, 2), error=str(error))
+
+    async def complete(self, **request):
+        if self.condition is None:
+            self.condition = asyncio.Condition()
+        cost = estimate_request_tokens(request['messages'], request.get('max_tokens', 0))
+
+        for attempt in range(self.max_retries + 1):
+            await self.requests.acquire()
+            await self.tokens.acquire(cost)
+
+            await self._enter()
+            try:
+                # Checked after getting a slot, so requests that were already
+                # waiting for one also honour a pause set while they waited
+                pause = self.pause_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                    metrics.count('sleep_seconds_total', pause, reason='llm_rate_limit')
+                self.calls += 1
+                with metrics.timed('llm_request_seconds', model=request.get('model')):
+                    response = await self.client.chat.completions.create(**request)
+            except openai.RateLimitError as e:
+                self._on_rate_limit(e)
+                if attempt == self.max_retries:
+                    raise
+                continue
+            except TRANSIENT_ERRORS as e:
+                self._on_transient_error(e)
+                if attempt == self.max_retries:
+                    raise
+                continue
+            finally:
+                await self._leave()
+
+            usage = getattr(response, 'usage', None)
+            if usage is not None:
+                self.prompt_tokens += usage.prompt_tokens or 0
+                self.completion_tokens += usage.completion_tokens or 0
+                self.cost += metrics.record_llm_usage(request.get('model'), usage.prompt_tokens or 0,
+                                                      usage.completion_tokens or 0)
+            await self._on_success()
+            return response
+
+    # Runs worker(item) for every item taken off an asyncio.Queue, with
+    # `concurrency` workers. A None item marks the end of the stream.
+    async def map_queue(self, worker, queue):
+        async def run_worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    # Put it back for the other workers
+                    await queue.put(None)
+                    return
+                try:
+                    await worker(item)
+                except Exception as e:
+                    metrics.log('worker_failed', f"Worker error: {e}", level='error', error=str(e))
+
+        await asyncio.gather(*(run_worker() for _ in range(self.concurrency)))
+
+    def summary(self):
+        return (f"LLM requests: {self.calls}, rate limited: {self.rate_limited}, "
+                f"tokens used: {self.prompt_tokens} prompt / {self.completion_tokens} completion, "
+                f"cost: ${self.cost:.4f}")
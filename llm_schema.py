@@ -0,0 +1,111 @@
+import json
+
+# Structured output for analizeAi. Instead of free text that has to be split
+# on "URL " and "Dataset Name:", the model is made to call a function whose
+# arguments follow a JSON schema: one item per URL, keyed by the URL's
+# number in the prompt. Each item is validated on its own, so a bad item can
+# be asked for again without repeating the rest of the batch.
+
+FUNCTION_NAME = "record_datasets"
+
+ITEMS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "index": {"type": "integer", "description": "The URL number from the prompt"},
+                    "dataset_name": {"type": "string", "description": "Clear, descriptive dataset name"},
+                    "topics": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "3 specific topic keywords or phrases",
+                    },
+                },
+                "required": ["index", "dataset_name", "topics"],
+            },
+        },
+    },
+    "required": ["items"],
+}
+
+PLACEHOLDERS = ("[unavailable]", "n/a", "unknown", "")
+
+# Extra request fields forcing the model to answer through the function
+def request_options():
+    return {
+        "tools": [{
+            "type": "function",
+            "function": {
+                "name": FUNCTION_NAME,
+                "description": "Record a name and topics for every dataset URL",
+                "parameters": ITEMS_SCHEMA,
+            },
+        }],
+        "tool_choice": {"type": "function", "function": {"name": FUNCTION_NAME}},
+    }
+
+FORMAT_INSTRUCTIONS = (
+    f"Answer by calling {FUNCTION_NAME} with exactly one item per URL. "
+    "Set index to the URL number, dataset_name to the dataset name and topics to the 3 topics."
+)
+
+def _get(obj, name):
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+# Function arguments (or plain JSON content) of a chat completion message.
+# Works for SDK objects and for the dicts found in Batch API output.
+def message_arguments(message):
+    tool_calls = _get(message, 'tool_calls') or []
+    for call in tool_calls:
+        function = _get(call, 'function')
+        if function is not None and _get(function, 'name') == FUNCTION_NAME:
+            return _get(function, 'arguments') or ""
+    return _get(message, 'content') or ""
+
+def _valid_text(value):
+    return isinstance(value, str) and value.strip().lower() not in PLACEHOLDERS and "[unavailable]" not in value.lower()
+
+# Returns ({index: {'dataset_name', 'topic'}}, [indexes that failed]) for
+# URL numbers 1..count. Items that are missing, malformed, duplicated or
+# use placeholder text count as failed.
+def parse_items(arguments, count):
+    valid = {}
+    try:
+        data = json.loads(arguments) if isinstance(arguments, str) else arguments
+        items = data.get('items') if isinstance(data, dict) else None
+    except ValueError:
+        items = None
+    if not isinstance(items, list):
+        items = []
+
+    seen = set()
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        index = item.get('index')
+        if not isinstance(index, int) or not 1 <= index <= count:
+            continue
+        if index in seen:
+            # Two answers for one URL, trust neither
+            valid.pop(index, None)
+            continue
+        seen.add(index)
+
+        name = item.get('dataset_name')
+        topics = item.get('topics')
+        if isinstance(topics, str):
+            topics = [t.strip() for t in topics.split(',')]
+        if not _valid_text(name) or not isinstance(topics, list):
+            continue
+        topics = [t.strip() for t in topics if _valid_text(t)]
+        if not topics:
+            continue
+        valid[index] = {'dataset_name': name.strip(), 'topic': ", ".join(topics[:3])}
+
+    failed = [index for index in range(1, count + 1) if index not in valid]
+    return valid, failed
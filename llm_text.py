@@ -0,0 +1,96 @@
+import re
+
+import topic_fallback
+
+# "URL 3:" at the start of a line (maybe in markdown bold or a heading)
+# begins the model's answer for the third URL of the batch
+ANSWER_START = re.compile(r'^[ \t*#]*URL\s*', re.MULTILINE)
+
+# Position in the batch of the URL an answer is for: the number the model
+# gave it or, failing that, the URL repeated in its first line
+def answer_index(label, urls_batch):
+    number = label.split(':')[0].strip(' *#.')
+    if number.isdigit() and 1 <= int(number) <= len(urls_batch):
+        return int(number) - 1
+    words = {word.strip('*:,()<>') for word in label.split()}
+    for index, url in enumerate(urls_batch):
+        if url in words:
+            return index
+    return None
+
+# Splits a free-text answer (the default, non --structured mode) into one
+# {'url_num', 'dataset_name', 'topic'} dict per URL of the batch, in URL
+# order. Answers are matched to URLs by their number, not by their position,
+# so a skipped or reordered answer doesn't shift the rest onto the wrong
+# rows. Missing or placeholder names and topics are made up by `classifier`
+# (see topic_fallback.TopicClassifier) from the dataset ID; with classifier
+# None they are left as None for the caller to make up (analizeAi does a
+# whole chunk at once).
+def parse_batch_results(batch_result, num_urls, urls_batch, classifier):
+    results = [None] * num_urls
+    urls = urls_batch[:num_urls]
+    
+    def made_up_name(dataset_id):
+        return topic_fallback.NAME_TEMPLATE.format(dataset_id=dataset_id) if classifier is not None else None
+    
+    def made_up_topic(dataset_id):
+        return classifier.topic(dataset_id) if classifier is not None else None
+    
+    for part in ANSWER_START.split(batch_result)[1:]:
+        part = part.strip()
+        index = answer_index(part.split("\n")[0], urls)
+        # Unknown numbers and repeated answers are ignored
+        if index is None or results[index] is not None:
+            continue
+        dataset_id = urls[index].split('/')[-1]
+        current_data = {'url_num': str(index + 1)}
+        
+        # Extract dataset name
+        if "Dataset Name:" in part:
+            dataset_name = part.split("Dataset Name:")[1].split("\n")[0].strip()
+            
+            # Check for undesired placeholders
+            if topic_fallback.is_placeholder(dataset_name):
+                # Use the dataset ID from the URL to create a better name
+                dataset_name = made_up_name(dataset_id)
+            
+            current_data['dataset_name'] = dataset_name
+        else:
+            # If no dataset name found, use the dataset ID
+            current_data['dataset_name'] = made_up_name(dataset_id)
+        
+        # Extract topic
+        if "Topic:" in part:
+            topic = part.split("Topic:")[1].split("\n")[0].strip()
+            
+            # Check for undesired placeholders
+            if topic_fallback.is_placeholder(topic):
+                # Try to extract some meaning from the dataset ID
+                topic = made_up_topic(dataset_id)
+            
+            current_data['topic'] = topic
+        else:
+            # Try to extract some meaning from the dataset ID
+            current_data['topic'] = made_up_topic(dataset_id)
+        
+        results[index] = current_data
+    
+    # URLs the model gave no answer for get a made-up one
+    for idx in range(num_urls):
+        if results[idx] is not None:
+            continue
+        if idx < len(urls_batch):
+            dataset_id = urls_batch[idx].split('/')[-1]
+            results[idx] = {
+                'url_num': str(idx + 1),
+                'dataset_name': made_up_name(dataset_id),
+                'topic': made_up_topic(dataset_id)
+            }
+        else:
+            results[idx] = {
+                'url_num': str(idx + 1),
+                'dataset_name': topic_fallback.NAME_TEMPLATE.format(dataset_id='').strip(),
+                'topic': classifier.default_topic if classifier is not None else None
+            }
+    
+    return results
@@ -0,0 +1,180 @@
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Process-wide counters and latency histograms for the scrape -> enrich
+# pipeline: HTTP latency, bytes and retries, pages parsed, time spent in
+# deliberate sleeps, LLM latency, token usage and cost. At the end of a run
+# they are written as a Prometheus text file (.prom) or a JSON summary
+# (.json). log() prints the scripts' messages either as plain text or as
+# JSON lines.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# USD per million (prompt, completion) tokens
+MODEL_PRICES = {
+    'gpt-3.5-turbo': (0.50, 1.50),
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_started = time.time()
+_log_format = 'text'
+_metrics_file = None
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def count(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                histogram['buckets'][i] += 1
+                break
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+# Seconds spent in the block go to the `name` histogram. Also works as a
+# function decorator.
+@contextmanager
+def timed(name, **labels):
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        observe(name, time.monotonic() - start, **labels)
+
+# time.sleep that is counted as deliberate waiting
+def sleep(seconds, reason):
+    time.sleep(seconds)
+    count('sleep_seconds_total', seconds, reason=reason)
+
+# Token usage from an API response; returns its cost in USD
+def record_llm_usage(model, prompt_tokens, completion_tokens, discount=1.0):
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    cost = (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6 * discount
+    count('llm_tokens_total', prompt_tokens, model=model, kind='prompt')
+    count('llm_tokens_total', completion_tokens, model=model, kind='completion')
+    count('llm_cost_usd_total', cost, model=model)
+    return cost
+
+# Sum of a counter over all its label values
+def total(name):
+    with _lock:
+        return sum(value for (counter, _), value in _counters.items() if counter == name)
+
+# One progress, error or status message. Text mode prints the message (or
+# the event and its fields when there is none); JSON mode prints one object
+# per line with the event, level, message and fields, so stdout stays
+# machine readable.
+def log(event, message=None, level='info', **fields):
+    if _log_format == 'json':
+        record = {'ts': round(time.time(), 3), 'event': event, 'level': level}
+        if message is not None:
+            record['message'] = message.strip()
+        record.update(fields)
+        print(json.dumps(record, default=str), flush=True)
+    else:
+        print(message if message is not None else f"{event}: " + ", ".join(f"{k}={v}" for k, v in fields.items()))
+
+def _labels_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+def prometheus_text():
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(_histograms.items())
+    typed = set()
+    for (name, labels), value in counters:
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_labels_text(labels)} {value}")
+    for (name, labels), histogram in histograms:
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        cumulative = 0
+        for bound, bucket in zip(LATENCY_BUCKETS, histogram['buckets']):
+            cumulative += bucket
+            lines.append(f"{name}_bucket{_labels_text(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_bucket{_labels_text(labels, [('le', '+Inf')])} {histogram['count']}")
+        lines.append(f"{name}_sum{_labels_text(labels)} {histogram['sum']}")
+        lines.append(f"{name}_count{_labels_text(labels)} {histogram['count']}")
+    lines.append("# TYPE run_duration_seconds gauge")
+    lines.append(f"run_duration_seconds {time.time() - _started}")
+    return "\n".join(lines) + "\n"
+
+# Upper bound of the bucket holding quantile q
+def _quantile(histogram, q):
+    rank = q * histogram['count']
+    seen = 0
+    for bound, bucket in zip(LATENCY_BUCKETS, histogram['buckets']):
+        seen += bucket
+        if seen >= rank:
+            return bound
+    return float('inf')
+
+def _name(name, labels):
+    return name + _labels_text(labels)
+
+def summary():
+    elapsed = time.time() - _started
+    with _lock:
+        counters = {_name(name, labels): value for (name, labels), value in sorted(_counters.items())}
+        histograms = {_name(name, labels): {
+            'count': h['count'],
+            'sum': round(h['sum'], 3),
+            'mean': round(h['sum'] / h['count'], 4) if h['count'] else 0.0,
+            'p50': _quantile(h, 0.5),
+            'p95': _quantile(h, 0.95),
+        } for (name, labels), h in sorted(_histograms.items())}
+    pages = sum(value for (name, _), value in _counters.items() if name == 'pages_total')
+    return {
+        'run_seconds': round(elapsed, 3),
+        'pages_per_second': round(pages / elapsed, 3) if elapsed > 0 else 0.0,
+        'counters': counters,
+        'histograms': histograms,
+    }
+
+def write(path):
+    if os.path.splitext(path)[1].lower() == '.json':
+        text = json.dumps(summary(), indent=2, default=str)
+    else:
+        text = prometheus_text()
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_path, path)
+    log('metrics_written', f"Metrics written to {path}", path=path)
+
+# Command line options shared by the scripts
+def add_metrics_arguments(arg_parser):
+    arg_parser.add_argument('--metrics-file', help='write run metrics here at exit (.prom for Prometheus text, .json for a summary)')
+    arg_parser.add_argument('--log-format', choices=('text', 'json'), default='text', help='progress log lines as plain text or JSON')
+
+def configure_from_args(args):
+    global _log_format, _metrics_file
+    _log_format = args.log_format
+    if args.metrics_file and _metrics_file is None:
+        atexit.register(lambda: write(_metrics_file))
+    _metrics_file = args.metrics_file
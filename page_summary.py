@@ -0,0 +1,186 @@
+import re
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+import html_backend
+import http_client
+
+# Extracts the few things analizeAi sends to the model from a dataset page:
+# <title>, the first <h1>, the meta description and up to 500 characters of
+# description text. Priority containers (CKAN description fields) are used
+# when the page has them, otherwise the first paragraphs / subheadings.
+#
+# summarize_stream() reads the page in chunks with lxml's pull parser and
+# stops reading as soon as the summary can't change any more, so large pages
+# are neither fully downloaded nor fully parsed.
+
+PRIORITY_CLASSES = ('field-name-field-description', 'field-item', 'dataset-description')
+PRIORITY_SELECTOR = ', '.join(f'div.{c}' for c in PRIORITY_CLASSES)
+FALLBACK_TAGS = ('p', 'h2', 'h3')
+MAX_PRIORITY = 3
+MAX_FALLBACK = 5
+MAX_CONTENT = 500
+
+CHUNK_SIZE = 16 * 1024
+MAX_PAGE_BYTES = 2 * 1024 * 1024  # never read more than this from one page
+
+# Tags the BeautifulSoup targeted parse keeps
+SUMMARY_TAGS = ['title', 'meta', 'h1', 'div'] + list(FALLBACK_TAGS)
+
+EMPTY_SUMMARY = {"title": "", "h1": "", "meta_desc": "", "content": ""}
+
+def _content(paragraphs):
+    content = " ".join(paragraphs)
+    if len(content) > MAX_CONTENT:
+        content = content[:MAX_CONTENT] + "..."
+    return content
+
+def summarize_soup(soup):
+    # Try to get the title
+    title = soup.title.string if soup.title else ""
+
+    # Try to get main heading
+    h1_tag = soup.find('h1')
+    h1 = h1_tag.text.strip() if h1_tag else ""
+
+    # Try to get metadata descriptions
+    meta_tag = soup.find('meta', attrs={'name': 'description'})
+    meta_desc = meta_tag.get('content', '') if meta_tag else ""
+
+    # Try to get paragraph content
+    paragraphs = []
+    priority_elements = soup.select(PRIORITY_SELECTOR)
+    if priority_elements:
+        for elem in priority_elements[:MAX_PRIORITY]:
+            if elem.text.strip():
+                paragraphs.append(elem.text.strip())
+    else:
+        for p in soup.find_all(list(FALLBACK_TAGS))[:MAX_FALLBACK]:
+            if p.text.strip():
+                paragraphs.append(p.text.strip())
+
+    return {
+        "title": title,
+        "h1": h1,
+        "meta_desc": meta_desc,
+        "content": _content(paragraphs)
+    }
+
+# Texts of the elements collected so far, in document order, up to the
+# first element that hasn't been closed yet
+def _finished_texts(elements):
+    texts = []
+    for elem in elements:
+        if elem[1] is None:
+            return texts, False
+        if elem[1]:
+            texts.append(elem[1])
+    return texts, True
+
+def _is_priority(element):
+    if element.tag != 'div':
+        return False
+    classes = (element.get('class') or '').split()
+    return any(c in classes for c in PRIORITY_CLASSES)
+
+def summarize_stream(chunks, encoding=None):
+    if html_backend.lxml is None:
+        return _summarize_strained(chunks, encoding)
+
+    parser = html_backend.etree.HTMLPullParser(events=('start', 'end'), encoding=encoding)
+    title = meta_desc = h1 = None
+    head_done = False
+    priority = []  # [element, text], text is None until the element is closed
+    fallback = []
+    read = 0
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        read += len(chunk)
+
+        for event, elem in parser.read_events():
+            tag = elem.tag
+            if not isinstance(tag, str):
+                continue
+            if event == 'start':
+                if tag == 'body':
+                    head_done = True
+                elif _is_priority(elem):
+                    if len(priority) < MAX_PRIORITY:
+                        priority.append([elem, None])
+                elif tag in FALLBACK_TAGS and not priority and len(fallback) < MAX_FALLBACK:
+                    fallback.append([elem, None])
+                elif tag == 'meta' and meta_desc is None and elem.get('name') == 'description':
+                    meta_desc = elem.get('content', '')
+                continue
+
+            if tag == 'head':
+                head_done = True
+            elif tag == 'title' and title is None:
+                title = elem.text
+            elif tag == 'h1' and h1 is None:
+                h1 = html_backend.text(elem).strip()
+            for collected in (priority, fallback):
+                for item in collected:
+                    if item[0] is elem:
+                        item[1] = html_backend.text(elem).strip()
+
+        # Stop reading once nothing later in the page can change the summary
+        if head_done and h1 is not None and priority:
+            texts, complete = _finished_texts(priority)
+            if (complete and len(priority) >= MAX_PRIORITY) or len(" ".join(texts)) > MAX_CONTENT:
+                break
+        if read >= MAX_PAGE_BYTES:
+            break
+
+    try:
+        parser.close()
+    except html_backend.etree.XMLSyntaxError:
+        pass
+
+    # Elements still open when reading stopped use the text read so far
+    collected = priority or fallback
+    texts = [t if t is not None else html_backend.text(e).strip() for e, t in collected]
+    texts = [t for t in texts if t]
+
+    return {
+        "title": title if title is not None else "",
+        "h1": h1 or "",
+        "meta_desc": meta_desc or "",
+        "content": _content(texts)
+    }
+
+# Without lxml: read the page (up to MAX_PAGE_BYTES) and let BeautifulSoup
+# build only the tags the summary looks at
+def _summarize_strained(chunks, encoding=None):
+    data = bytearray()
+    for chunk in chunks:
+        data.extend(chunk)
+        if len(data) >= MAX_PAGE_BYTES:
+            break
+    soup = BeautifulSoup(bytes(data), 'html.parser', from_encoding=encoding,
+                         parse_only=SoupStrainer(SUMMARY_TAGS))
+    return summarize_soup(soup)
+
+# Charset from the Content-Type header, only if the server sent one
+def response_charset(response):
+    match = re.search(r'charset=([\w.:-]+)', response.headers.get('Content-Type', ''), re.I)
+    return match.group(1).strip('"\'') if match else None
+
+def summarize_response(response):
+    try:
+        return summarize_stream(response.iter_content(CHUNK_SIZE), response_charset(response))
+    finally:
+        response.close()
+
+# Fetches a dataset page and summarizes it. Targeted summaries stream the page
+# and stop reading once the summary is complete; the cache keeps what was read,
+# so a re-run or an --offline replay gets the same summary.
+def fetch_summary(url, targeted=True, headers=None):
+    response = http_client.get(url, headers=headers, stream=targeted)
+    if response.status_code != 200:
+        response.close()
+        return dict(EMPTY_SUMMARY)
+    if targeted:
+        return summarize_response(response)
+    return summarize_soup(BeautifulSoup(response.text, 'html.parser'))
@@ -0,0 +1,187 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import html_backend
+import metrics
+from fetcher import AsyncFetcher
+
+# Parses result pages in worker processes so HTML parsing isn't limited to
+# one core by the GIL. Fetching stays in the main process: a fetcher thread
+# puts raw page bytes on a bounded queue, the main thread hands each page to
+# the process pool and gets back the small record tuples the scrapers keep.
+# When parsing falls behind, the full queue makes the fetcher wait.
+
+def _init_worker(backend):
+    # Spawned workers (Windows) don't inherit the parent's backend choice
+    html_backend.set_backend(backend)
+
+def decode(content, encoding):
+    return content.decode(encoding or 'utf-8', errors='replace')
+
+# How often pipeline checks whether the head page has finished parsing
+# while it waits for the next fetched page
+_POLL_SECONDS = 0.01
+
+# Runs in the worker: fn(html, *args) on the decoded page. The parse time
+# goes back with the result since worker metrics stay in the worker.
+def _parse(fn, content, encoding, args):
+    started = time.monotonic()
+    result = fn(decode(content, encoding), *args)
+    return time.monotonic() - started, result
+
+def _result(future):
+    elapsed, result = future.result()
+    metrics.observe('parse_pool_task_seconds', elapsed)
+    return result
+
+# A page's parsed result, or the exception its parser raised
+def _page_result(future):
+    if future is None:
+        return None
+    try:
+        return _result(future)
+    except Exception as e:
+        return e
+
+class ParsePool:
+    def __init__(self, workers=None, queue_size=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size or 2 * self.workers
+        self.executor = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                            initargs=(html_backend.get_backend(),))
+        # Pages handed to the pool and not parsed yet
+        self.slots = threading.BoundedSemaphore(self.queue_size)
+
+    # Parses one page in a worker; blocks while queue_size pages are pending.
+    # The future holds (parse seconds, result), see _result.
+    def submit(self, fn, content, encoding=None, *args):
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(_parse, fn, content, encoding, args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    # fn(html, *args) for each page in `pages` (bytes), in order
+    def map(self, fn, pages, *args):
+        pending = []
+        for content in pages:
+            pending.append(self.submit(fn, content, None, *args))
+            while pending and pending[0].done():
+                yield _result(pending.pop(0))
+        for future in pending:
+            yield _result(future)
+
+    # Fetches `urls` and parses each successful page with fn(html, *args).
+    # Yields (url, response or exception, parsed result or None) in URL
+    # order; a page that fails to parse gets the exception as its result.
+    # Closing the generator early stops fetching pages not started yet.
+    def pipeline(self, urls, fn, args=(), fetch_kwargs=None):
+        urls = list(urls)
+        pages = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        fetch_thread = threading.Thread(target=_fetch_into, args=(urls, pages, stop, fetch_kwargs or {}), daemon=True)
+        fetch_thread.start()
+
+        ready = {}
+        next_index = 0
+        fetching = True
+        try:
+            while next_index < len(urls):
+                head = ready.get(next_index)
+                if head is not None and (head[1] is None or head[1].done() or not fetching):
+                    response, future = ready.pop(next_index)
+                    yield urls[next_index], response, _page_result(future)
+                    next_index += 1
+                    continue
+                if not fetching:
+                    break
+                # Keep handing fetched pages to the pool while the head page
+                # parses, so every worker stays busy; block on the queue only
+                # when the head page hasn't arrived yet
+                try:
+                    item = pages.get(timeout=_POLL_SECONDS if head is not None else None)
+                except queue.Empty:
+                    continue
+                if item is None:
+                    fetching = False
+                    continue
+                index, response = item
+                future = None
+                if not isinstance(response, Exception) and response.status_code == 200:
+                    future = self.submit(fn, response.content, response.encoding, *args)
+                ready[index] = (response, future)
+        finally:
+            stop.set()
+            # Pending fetches are cancelled; only requests already sent finish
+            fetch_thread.join()
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Puts `item` on the queue, waiting while it is full; False if the consumer
+# stopped first
+def _put(pages, item, stop):
+    while not stop.is_set():
+        try:
+            pages.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+# Fetches urls into `pages` as (index, response or exception). Only as many
+# URLs as the fetcher runs at once per host are taken from the list at a
+# time, so when `stop` is set the rest are never requested and the fetches
+# waiting for a slot are cancelled.
+def _fetch_into(urls, pages, stop, fetch_kwargs):
+    async def fetch_some(fetcher, todo):
+        for index, url in todo:
+            try:
+                response = await fetcher.fetch(url, stop)
+            except Exception as e:
+                response = e
+            if response is None or not await asyncio.to_thread(_put, pages, (index, response), stop):
+                return
+
+    async def fetch_all():
+        fetcher = AsyncFetcher(**fetch_kwargs)
+        todo = iter(enumerate(urls))
+        tasks = [asyncio.create_task(fetch_some(fetcher, todo)) for _ in range(fetcher.max_per_host)]
+        while not all(task.done() for task in tasks):
+            if stop.is_set():
+                for task in tasks:
+                    task.cancel()
+                break
+            await asyncio.wait(tasks, timeout=0.05)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    try:
+        asyncio.run(fetch_all())
+    finally:
+        _put(pages, None, stop)
+
+# Command line options shared by the scrapers
+def add_parse_arguments(arg_parser):
+    arg_parser.add_argument('--parse-workers', type=int, default=0,
+                            help='parse result pages in this many worker processes (0 parses in the main process)')
+    arg_parser.add_argument('--parse-queue', type=int, default=None,
+                            help='pages waiting to be parsed before fetching pauses (default 2 per worker)')
+
+def pool_from_args(args):
+    if not args.parse_workers:
+        return None
+    metrics.log('parse_pool', f"Parsing pages in {args.parse_workers} worker processes", workers=args.parse_workers)
+    return ParsePool(args.parse_workers, args.parse_queue)
@@ -1,159 +1,511 @@
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
-import re
-from datetime import datetime
-import os
-import time
-
-def parse_date(date_str):
-    try:
-        for fmt in ['%d %B %Y', '%B %Y', '%Y']:
-            try:
-                return datetime.strptime(date_str.strip(), fmt)
-            except ValueError:
-                continue
-        return None
-    except Exception:
-        return None
-
-def is_recent_enough(date_str, year_threshold):
-    date_obj = parse_date(date_str)
-    if date_obj and date_obj.year >= year_threshold:
-        return True
-    return False
-
-def scrape_datasets(search_term, year_filter):
-    base_url = "https://www.data.gov.uk"
-    search_url = f"{base_url}/search?q={search_term}+{year_filter}"
-    
-    results = []
-    current_page = search_url
-    page_num = 1
-    
-    print(f"Starting scraping from {search_url}")
-    
-    while current_page:
-        print(f"Scraping page {page_num}: {current_page}")
-        
-        try:
-            response = requests.get(current_page)
-            if response.status_code != 200:
-                print(f"Failed to fetch page {page_num}. Status code: {response.status_code}")
-                break
-                
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Find all result items
-            result_items = soup.find_all('div', class_='dgu-results__result')
-            print(f"Found {len(result_items)} results on page {page_num}")
-            
-            for item in result_items:
-                # Extract link
-                link_tag = item.find('a', class_='govuk-link')
-                if not link_tag:
-                    continue
-                    
-                link_url = base_url + link_tag['href'] if link_tag['href'].startswith('/') else link_tag['href']
-                
-                # Extract metadata
-                metadata = item.find('dl', class_='dgu-metadata__box')
-                if not metadata:
-                    continue
-                    
-                # Extract last updated date
-                date_tag = None
-                for dt in metadata.find_all('dt'):
-                    if "Last updated" in dt.text:
-                        date_tag = dt.find_next('dd')
-                        break
-                        
-                last_updated = date_tag.text.strip() if date_tag else "Unknown"
-                
-                # Check if the date is recent enough
-                if last_updated != "Unknown" and not is_recent_enough(last_updated, year_filter):
-                    continue
-                
-                # Add only URL to results
-                results.append({
-                    'URL': link_url
-                })
-            
-            # Check if there are more pages
-            next_page = None
-            pagination = soup.find('a', rel='next')
-            if pagination:
-                next_href = pagination['href']
-                next_page = base_url + next_href if next_href.startswith('/') else next_href
-                
-            if not next_page:
-                break
-                
-            current_page = next_page
-            page_num += 1
-            
-            # Add a small delay to avoid overwhelming the server
-            time.sleep(0.5)
-            
-        except Exception as e:
-            print(f"Error on page {page_num}: {e}")
-            break
-    
-    print(f"Finished scraping. Found {len(results)} datasets from {year_filter}")
-    return results
-
-def save_results(data, filename_prefix):
-    if not data:
-        print(f"No data to save for {filename_prefix}")
-        return
-        
-    # Create 'results' directory if it doesn't exist
-    if not os.path.exists('results'):
-        os.makedirs('results')
-    
-    # Save as text file
-    txt_path = f"results/{filename_prefix}.txt"
-    with open(txt_path, "w") as f:
-        for item in data:
-            f.write(f"{item['URL']}\n")
-    print(f"URLs saved to {txt_path}")
-    
-    # Save as CSV
-    csv_path = f"results/{filename_prefix}.csv"
-    pd.DataFrame(data).to_csv(csv_path, index=False)
-    print(f"Data saved as CSV: {csv_path}")
-    
-    # Try to save as Excel
-    try:
-        excel_path = f"results/{filename_prefix}.xlsx"
-        pd.DataFrame(data).to_excel(excel_path, index=False)
-        print(f"Data saved to Excel: {excel_path}")
-    except ModuleNotFoundError as e:
-        if "openpyxl" in str(e):
-            print("Excel export skipped - openpyxl module missing")
-        else:
-            raise
-# ("type here what do you want", 'year','type of save document'),
-def run_all_searches():
-    # Define all search combinations
-    search_combinations = [
-        # Format: (search_term, year_filter, filename_prefix)
-        ("type here what do you want", 'year','type of save document'),
-        ("type here what do you want", 'year','type of save document')
-    ]
-    
-    for search_term, year_filter, filename_prefix in search_combinations:
-        print(f"\n{'='*50}")
-        print(f"Processing search: {search_term} - {year_filter}")
-        print(f"{'='*50}")
-        
-        datasets = scrape_datasets(search_term, year_filter)
-        save_results(datasets, filename_prefix)
-
-if __name__ == "__main__":
-    print("Starting comprehensive scraper for UK Data Gov datasets")
-    try:
-        run_all_searches()
-        print("\nAll searches completed successfully!")
-    except Exception as e:
-        print(f"\nAn error occurred during execution: {e}")
+import pandas as pd
+import numpy as np
+import re
+import os
+import asyncio
+import argparse
+
+import ckan_api
+import crawl_checkpoint
+import crawl_state
+import date_filter
+import html_backend
+import http_cache
+import http_client
+import metrics
+import parse_pool
+import result_sink
+from fetcher import AsyncFetcher, fetch_pages
+
+PORTAL = 'data.gov.uk'
+BASE_URL = "https://www.data.gov.uk"
+
+# Returns every result's (url, last_updated); dates are filtered per page in filter_by_date
+def parse_results_page(soup, base_url):
+    results = []
+    
+    # Find all result items
+    result_items = soup.find_all('div', class_='dgu-results__result')
+    
+    for item in result_items:
+        # Extract link
+        link_tag = item.find('a', class_='govuk-link')
+        if not link_tag:
+            continue
+            
+        link_url = base_url + link_tag['href'] if link_tag['href'].startswith('/') else link_tag['href']
+        
+        # Extract metadata
+        metadata = item.find('dl', class_='dgu-metadata__box')
+        if not metadata:
+            continue
+            
+        # Extract last updated date
+        date_tag = None
+        for dt in metadata.find_all('dt'):
+            if "Last updated" in dt.text:
+                date_tag = dt.find_next('dd')
+                break
+                
+        last_updated = date_tag.text.strip() if date_tag else "Unknown"
+        
+        # Keep the date with the URL for incremental crawls
+        results.append((link_url, last_updated))
+    
+    return results, len(result_items)
+
+def get_total_pages(soup):
+    # Page count is the highest ?page=N linked from the pagination
+    page_numbers = []
+    for link in soup.find_all('a', href=True):
+        match = re.search(r'[?&]page=(\d+)', link['href'])
+        if match:
+            page_numbers.append(int(match.group(1)))
+    
+    if page_numbers:
+        return max(page_numbers)
+    
+    # A "next" link without numbered pages means the count is unknown
+    if soup.find('a', rel='next'):
+        return None
+    
+    return 1
+
+def next_page_href(soup):
+    pagination = soup.find('a', rel='next')
+    return pagination['href'] if pagination else None
+
+# lxml versions of the functions above, see html_backend.py
+def parse_results_page_lxml(doc, base_url):
+    results = []
+    
+    result_items = doc.xpath('//' + html_backend.class_xpath('div', 'dgu-results__result'))
+    
+    for item in result_items:
+        link_tag = html_backend.first(item.xpath('.//' + html_backend.class_xpath('a', 'govuk-link')))
+        if link_tag is None:
+            continue
+        
+        href = link_tag.get('href')
+        link_url = base_url + href if href.startswith('/') else href
+        
+        metadata = html_backend.first(item.xpath('.//' + html_backend.class_xpath('dl', 'dgu-metadata__box')))
+        if metadata is None:
+            continue
+        
+        date_tag = None
+        for dt in metadata.xpath('.//dt'):
+            if "Last updated" in html_backend.text(dt):
+                date_tag = html_backend.first(dt.xpath('(descendant::dd | following::dd)[1]'))
+                break
+        
+        last_updated = html_backend.text(date_tag).strip() if date_tag is not None else "Unknown"
+        
+        results.append((link_url, last_updated))
+    
+    return results, len(result_items)
+
+def get_total_pages_lxml(doc):
+    page_numbers = []
+    for href in doc.xpath('//a/@href'):
+        match = re.search(r'[?&]page=(\d+)', href)
+        if match:
+            page_numbers.append(int(match.group(1)))
+    
+    if page_numbers:
+        return max(page_numbers)
+    
+    if next_page_href_lxml(doc) is not None:
+        return None
+    
+    return 1
+
+def next_page_href_lxml(doc):
+    return html_backend.first(doc.xpath("//a[contains(concat(' ', normalize-space(@rel), ' '), ' next ')]/@href"))
+
+# Keeps the entries dated inside the year range (undated ones are kept too).
+# Also returns whether the page already reached dates before the range,
+# which ends a crawl sorted newest first.
+def filter_by_date(entries, dates):
+    if not dates.active() or not entries:
+        return entries, False
+    
+    modified = np.array([last_updated for _, last_updated in entries], dtype=object)
+    keep, passed = dates.check(PORTAL, modified)
+    keep |= modified == "Unknown"
+    return [entry for entry, kept in zip(entries, keep) if kept], passed
+
+# Parses one search results page with the active backend.
+# Returns (entries, results found, total pages, next page href, past the year range).
+@metrics.timed('parse_seconds', portal=PORTAL)
+def extract_page(html, base_url, dates):
+    doc = html_backend.parse(html)
+    if html_backend.is_lxml(doc):
+        entries, found = parse_results_page_lxml(doc, base_url)
+        total_pages, next_href = get_total_pages_lxml(doc), next_page_href_lxml(doc)
+    else:
+        entries, found = parse_results_page(doc, base_url)
+        total_pages, next_href = get_total_pages(doc), next_page_href(doc)
+    
+    entries, passed = filter_by_date(entries, dates)
+    return entries, found, total_pages, next_href, passed
+
+# Adds a page's (url, last_updated) entries to `entries`. In incremental mode
+# only new or changed datasets are kept and True is returned once a page
+# holds nothing new, which means the crawl can stop. It can also stop once
+# the newest-first results are older than the year range. With `progress`
+# (a crawl_checkpoint.SearchCheckpoint) the page's entries are checkpointed;
+# with `stream` (a result_sink.SearchOutput) they are stored right away.
+def collect_page(entries, page_entries, state, state_key, passed=False, progress=None, page_num=None, total_pages=None,
+                 stream=None):
+    metrics.count('pages_total', portal=PORTAL)
+    if passed:
+        metrics.log('year_range_passed', "Reached datasets older than the year range, stopping", portal=PORTAL)
+    if state is None:
+        new_entries, all_known = page_entries, False
+    else:
+        new_entries, all_known = state.filter_new(PORTAL, state_key, page_entries)
+        if all_known:
+            metrics.log('known_datasets_reached', "Reached already seen datasets, stopping", portal=PORTAL)
+    entries.extend(new_entries)
+    # Stored before the checkpoint: a crash in between repeats the page
+    # rather than losing it
+    if stream is not None:
+        stream.add([{'URL': url} for url, _ in new_entries])
+    if progress is not None:
+        progress.page_done(page_num, new_entries, total_pages)
+    return all_known or passed
+
+# CKAN API version of scrape_datasets, see ckan_api.py
+def scrape_datasets_api(search_term, year_filter, state=None, year_to=None, output=None):
+    year_from = int(year_filter) if year_filter is not None else None
+    packages = ckan_api.package_search(PORTAL, search_term, year_from=year_from, year_to=year_to)
+    entries = [(ckan_api.dataset_url(PORTAL, package), package.get('metadata_modified')) for package in packages]
+    
+    if state is not None:
+        state_key = f"{search_term} {year_filter}"
+        entries, _ = state.filter_new(PORTAL, state_key, entries)
+        state.mark_seen(PORTAL, state_key, entries, newest_modified=entries[0][1] if entries else None)
+    
+    metrics.log('scrape_done', f"Finished querying the API. Found {len(entries)} datasets from {year_filter}",
+                portal=PORTAL, search_term=search_term, years=year_filter, datasets=len(entries), source='api')
+    stream = result_sink.SearchOutput(output, PORTAL, search_term)
+    stream.add([{'URL': url} for url, _ in entries])
+    return stream.finish()
+
+# year_filter is the first year wanted (it is also added to the search
+# query); year_to optionally closes the range. Records are stored in
+# `output`'s sink page by page; returns the ones stored (duplicates of
+# datasets written earlier in the run are left out).
+@metrics.timed('scrape_seconds', portal=PORTAL)
+def scrape_datasets(search_term, year_filter, max_per_host=4, rate=2.0, state=None, source='html', year_to=None,
+                    pool=None, checkpoints=None, output=None):
+    if source == 'api':
+        try:
+            return scrape_datasets_api(search_term, year_filter, state, year_to, output)
+        except Exception as e:
+            metrics.log('api_failed', f"API search failed ({e}), falling back to HTML scraping", level='warning',
+                        portal=PORTAL, search_term=search_term, error=str(e))
+    
+    base_url = BASE_URL
+    search_url = f"{base_url}/search?q={search_term}"
+    if year_filter is not None:
+        search_url += f"+{year_filter}"
+    # Incremental crawls sort newest first: already seen datasets only show
+    # up after the new ones, and the crawl can also stop at the first page
+    # older than the year range. Otherwise the portal's own ranking is kept
+    # (and with it the order of the results), so every page is read.
+    newest_first = state is not None
+    dates = date_filter.DateFilter(year_filter, year_to, newest_first)
+    if newest_first:
+        search_url += "&sort=recent"
+    state_key = f"{search_term} {year_filter}"
+    
+    # Entries of the pages finished by an earlier, interrupted run
+    progress = crawl_checkpoint.search_checkpoint(checkpoints, PORTAL, f"{search_term} {dates.describe()}")
+    entries = [tuple(entry) for entry in progress.records()]
+    stream = result_sink.SearchOutput(output, PORTAL, search_term)
+    stream.resume([{'URL': url} for url, _ in entries])
+    total_pages = progress.total_pages
+    stop = progress.paged_through()
+    complete = True
+    next_href = f"{search_url}&page={progress.last_page + 1}"
+    
+    metrics.log('scrape_start', f"Starting scraping from {search_url}", portal=PORTAL, search_term=search_term, url=search_url)
+    if not progress.resumed:
+        first_page = scrape_first_page(search_url, base_url, dates, progress)
+        if first_page is None:
+            # Page 1 stays in the retry queue and the search isn't finished,
+            # so the next run starts it again
+            metrics.log('first_page_failed', "Page 1 failed, the search is left for the next run", level='error',
+                        portal=PORTAL, search_term=search_term)
+            return []
+        
+        page_entries, found, total_pages, next_href, passed = first_page
+        metrics.log('page_done', f"Found {found} results on page 1", portal=PORTAL, page=1, results=found)
+        stop = collect_page(entries, page_entries, state, state_key, passed, progress, 1, total_pages, stream)
+    
+    if not stop and total_pages is None:
+        # Pagination without page numbers - follow "next" links one by one
+        complete = asyncio.run(follow_next_pages(next_href, base_url, dates, entries, state, state_key,
+                                                 AsyncFetcher(max_per_host=max_per_host, rate=rate), progress, search_url,
+                                                 stream))
+    elif not stop:
+        metrics.log('total_pages', f"Total pages: {total_pages}", portal=PORTAL, search_term=search_term, pages=total_pages)
+        fetch_remaining_pages(search_url, base_url, dates, total_pages, entries, state, state_key,
+                              max_per_host, rate, pool, progress, stream)
+    
+    retry_failed_pages(progress, base_url, dates, entries, state, state_key, stream)
+    if complete:
+        progress.finish()
+    
+    if state is not None:
+        state.mark_seen(PORTAL, state_key, entries, newest_modified=entries[0][1] if entries else None)
+    
+    metrics.count('datasets_total', len(entries), portal=PORTAL)
+    metrics.log('scrape_done', f"Finished scraping. Found {len(entries)} datasets from {dates.describe()}",
+                portal=PORTAL, search_term=search_term, years=dates.describe(), datasets=len(entries))
+    return stream.finish()
+
+# Fetches and parses one results page; raises if the request or parsing fails
+def fetch_page(page_url, base_url, dates):
+    response = http_client.get(page_url)
+    if response.status_code != 200:
+        raise ValueError(f"status code {response.status_code}")
+    return extract_page(response.text, base_url, dates)
+
+# Page 1 gives the page count the rest of the crawl needs, so when it fails
+# it goes through the retry queue right away (nothing else has been reached
+# yet, so the queue only holds page 1). Returns extract_page's result, or
+# None if it still failed after the retries.
+def scrape_first_page(search_url, base_url, dates, progress):
+    metrics.log('page_start', f"Scraping page 1: {search_url}", portal=PORTAL, page=1, url=search_url)
+    try:
+        return fetch_page(search_url, base_url, dates)
+    except Exception as e:
+        progress.page_failed(1, search_url, e)
+    for page_num, page_url in progress.retry_queue():
+        metrics.log('page_retry', f"Retrying page {page_num}: {page_url}", portal=PORTAL, page=page_num, url=page_url)
+        try:
+            return fetch_page(page_url, base_url, dates)
+        except Exception as e:
+            progress.page_failed(page_num, page_url, e)
+    return None
+
+# Pages after the last checkpointed one (page 1 on a fresh crawl) up to
+# total_pages. Pages that fail are queued in `progress` for a retry.
+def fetch_remaining_pages(search_url, base_url, dates, total_pages, entries, state, state_key,
+                          max_per_host, rate, pool=None, progress=None, stream=None):
+    progress = progress or crawl_checkpoint.SearchCheckpoint(None, PORTAL, state_key)
+    if pool is not None:
+        return pipeline_remaining_pages(search_url, base_url, dates, total_pages, entries, state, state_key,
+                                        max_per_host, rate, pool, progress, stream)
+    
+    # Fetch the remaining pages in parallel, rate limited per host. Incremental
+    # crawls, which sort newest first, fetch a few pages at a time so they can
+    # stop at known datasets or once past the year range; relevance-sorted
+    # crawls can't stop early and fetch everything at once.
+    first_page = max(progress.last_page + 1, 2)
+    wave_size = total_pages if not dates.newest_first else max_per_host
+    
+    for wave_start in range(first_page, total_pages + 1, wave_size):
+        page_nums = list(range(wave_start, min(wave_start + wave_size, total_pages + 1)))
+        page_urls = [f"{search_url}&page={page_num}" for page_num in page_nums]
+        responses = fetch_pages(page_urls, max_per_host=max_per_host, rate=rate)
+        
+        # Process pages in order so results keep the same order as before
+        for page_num, page_url, response in zip(page_nums, page_urls, responses):
+            metrics.log('page_start', f"Scraping page {page_num}: {page_url}", portal=PORTAL, page=page_num, url=page_url)
+            
+            try:
+                if isinstance(response, Exception):
+                    raise response
+                if response.status_code != 200:
+                    progress.page_failed(page_num, page_url, f"status code {response.status_code}")
+                    continue
+                
+                page_entries, found, _, _, passed = extract_page(response.text, base_url, dates)
+            except Exception as e:
+                progress.page_failed(page_num, page_url, e)
+                continue
+            
+            metrics.log('page_done', f"Found {found} results on page {page_num}", portal=PORTAL, page=page_num, results=found)
+            if collect_page(entries, page_entries, state, state_key, passed, progress, page_num, stream=stream):
+                return
+
+# fetch_remaining_pages with parsing in worker processes (see parse_pool.py).
+# Pages stream through the pool in order, so there is no need for waves:
+# stopping early just stops fetching the pages not started yet.
+def pipeline_remaining_pages(search_url, base_url, dates, total_pages, entries, state, state_key,
+                             max_per_host, rate, pool, progress, stream=None):
+    first_page = max(progress.last_page + 1, 2)
+    page_urls = [f"{search_url}&page={page_num}" for page_num in range(first_page, total_pages + 1)]
+    pages = pool.pipeline(page_urls, extract_page, (base_url, dates),
+                                {'max_per_host': max_per_host, 'rate': rate})
+    try:
+        for page_num, (page_url, response, parsed) in enumerate(pages, first_page):
+            metrics.log('page_start', f"Scraping page {page_num}: {page_url}", portal=PORTAL, page=page_num, url=page_url)
+            if isinstance(response, Exception):
+                progress.page_failed(page_num, page_url, response)
+                continue
+            if response.status_code != 200:
+                progress.page_failed(page_num, page_url, f"status code {response.status_code}")
+                continue
+            if isinstance(parsed, Exception):
+                progress.page_failed(page_num, page_url, parsed)
+                continue
+            
+            page_entries, found, _, _, passed = parsed
+            metrics.log('page_done', f"Found {found} results on page {page_num}", portal=PORTAL, page=page_num, results=found)
+            if collect_page(entries, page_entries, state, state_key, passed, progress, page_num, stream=stream):
+                return
+    finally:
+        pages.close()
+
+# Following "next" links gives up after this many failed pages in a row
+MAX_FAILED_IN_A_ROW = 3
+
+# When a page fails its "next" link is unknown, so the crawl goes on with the
+# page=N URL of the page after it (also used to resume from a checkpoint).
+# Returns False if it gave up, leaving the search to resume next run.
+async def follow_next_pages(next_href, base_url, dates, entries, state, state_key, fetcher, progress, search_url,
+                            stream=None):
+    page_num = progress.last_page
+    failed_in_a_row = 0
+    
+    # Check if there are more pages
+    while next_href:
+        next_page = base_url + next_href if next_href.startswith('/') else next_href
+        page_num += 1
+        metrics.log('page_start', f"Scraping page {page_num}: {next_page}", portal=PORTAL, page=page_num, url=next_page)
+        
+        try:
+            response = await fetcher.fetch(next_page)
+            if response.status_code != 200:
+                raise ValueError(f"status code {response.status_code}")
+            page_entries, found, _, next_href, passed = extract_page(response.text, base_url, dates)
+        except Exception as e:
+            progress.page_failed(page_num, next_page, e)
+            failed_in_a_row += 1
+            if failed_in_a_row >= MAX_FAILED_IN_A_ROW:
+                metrics.log('pages_failed', f"{failed_in_a_row} pages in a row failed, stopping", level='error',
+                             portal=PORTAL, failed=failed_in_a_row)
+                return False
+            next_href = f"{search_url}&page={page_num + 1}"
+            continue
+        
+        failed_in_a_row = 0
+        metrics.log('page_done', f"Found {found} results on page {page_num}", portal=PORTAL, page=page_num, results=found)
+        if collect_page(entries, page_entries, state, state_key, passed, progress, page_num, stream=stream):
+            break
+    return True
+
+# Failed pages from the retry queue, fetched one at a time after the crawl
+def retry_failed_pages(progress, base_url, dates, entries, state, state_key, stream=None):
+    for page_num, page_url in progress.retry_queue():
+        metrics.log('page_retry', f"Retrying page {page_num}: {page_url}", portal=PORTAL, page=page_num, url=page_url)
+        try:
+            page_entries, found, _, _, _ = fetch_page(page_url, base_url, dates)
+        except Exception as e:
+            progress.page_failed(page_num, page_url, e)
+            continue
+        metrics.log('page_done', f"Found {found} results on page {page_num}", portal=PORTAL, page=page_num, results=found)
+        collect_page(entries, page_entries, state, state_key, False, progress, page_num, stream=stream)
+
+# Writes the file exports the output asks for (by default, without a sink,
+# all of TXT, CSV and Excel). The records are already in the sink: the
+# scrapers store them page by page.
+def save_results(data, filename_prefix, output=None):
+    if not data:
+        metrics.log('no_data', f"No data to save for {filename_prefix}", prefix=filename_prefix)
+        return
+    
+    output = output or result_sink.FILES_ONLY
+    if not output.formats:
+        return
+        
+    # Create 'results' directory if it doesn't exist
+    if not os.path.exists('results'):
+        os.makedirs('results')
+    
+    # Save as text file
+    if output.wants('txt'):
+        txt_path = f"results/{filename_prefix}.txt"
+        with open(txt_path, "w") as f:
+            for item in data:
+                f.write(f"{item['URL']}\n")
+        metrics.log('saved', f"URLs saved to {txt_path}", path=txt_path, records=len(data))
+    
+    # Save as CSV
+    if output.wants('csv'):
+        csv_path = f"results/{filename_prefix}.csv"
+        pd.DataFrame(data).to_csv(csv_path, index=False)
+        metrics.log('saved', f"Data saved as CSV: {csv_path}", path=csv_path, records=len(data))
+    
+    # Try to save as Excel
+    if not output.wants('xlsx'):
+        return
+    if len(data) > result_sink.EXCEL_MAX_ROWS:
+        metrics.log('excel_skipped', f"Excel export skipped - {len(data)} rows don't fit in a sheet", level='warning',
+                    records=len(data))
+        return
+    try:
+        excel_path = f"results/{filename_prefix}.xlsx"
+        pd.DataFrame(data).to_excel(excel_path, index=False)
+        metrics.log('saved', f"Data saved to Excel: {excel_path}", path=excel_path, records=len(data))
+    except ModuleNotFoundError as e:
+        if "openpyxl" in str(e):
+            metrics.log('excel_skipped', "Excel export skipped - openpyxl module missing", level='warning')
+        else:
+            raise
+# ("type here what do you want", 'year','type of save document'),
+def run_all_searches(state=None, source='html', pool=None, output=None, checkpoints=None):
+    # Define all search combinations
+    search_combinations = [
+        # Format: (search_term, year_filter, filename_prefix)
+        ("type here what do you want", 'year','type of save document'),
+        ("type here what do you want", 'year','type of save document')
+    ]
+    
+    for search_term, year_filter, filename_prefix in search_combinations:
+        metrics.log('search_start', f"\n{'='*50}\nProcessing search: {search_term} - {year_filter}\n{'='*50}",
+                    portal=PORTAL, search_term=search_term, years=year_filter)
+        
+        datasets = scrape_datasets(search_term, year_filter, state=state, source=source, pool=pool,
+                                   checkpoints=checkpoints, output=output)
+        save_results(datasets, filename_prefix, output)
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Scrape data.gov.uk search results")
+    http_cache.add_cache_arguments(arg_parser)
+    http_client.add_connection_arguments(arg_parser)
+    crawl_state.add_state_arguments(arg_parser)
+    crawl_checkpoint.add_checkpoint_arguments(arg_parser)
+    html_backend.add_backend_arguments(arg_parser)
+    ckan_api.add_source_arguments(arg_parser)
+    parse_pool.add_parse_arguments(arg_parser)
+    result_sink.add_sink_arguments(arg_parser)
+    metrics.add_metrics_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    metrics.configure_from_args(args)
+    http_client.configure_from_args(args)
+    http_client.configure_cache_from_args(args)
+    html_backend.backend_from_args(args)
+    state = crawl_state.state_from_args(args)
+    checkpoints = crawl_checkpoint.checkpoints_from_args(args)
+    pool = parse_pool.pool_from_args(args)
+    output = result_sink.output_from_args(args)
+    
+    metrics.log('run_start', "Starting comprehensive scraper for UK Data Gov datasets", portal=PORTAL)
+    try:
+        run_all_searches(state, args.source, pool, output, checkpoints)
+        metrics.log('run_done', "\nAll searches completed successfully!", portal=PORTAL)
+        http_client.print_connection_stats()
+    except Exception as e:
+        metrics.log('run_failed', f"\nAn error occurred during execution: {e}", level='error', portal=PORTAL, error=str(e))
+    finally:
+        if pool is not None:
+            pool.close()
+        if checkpoints is not None:
+            checkpoints.close()
+        output.close()
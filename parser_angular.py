@@ -1,112 +1,268 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from bs4 import BeautifulSoup
-import pandas as pd
-import time
-import os
-
-def scrape_research_datasets(search_term, year_from, year_to, rows=100):
-    formatted_search = search_term.replace(' ', '%20')
-    base_url = "https://researchdata.edu.au"
-    
-    search_url = f"{base_url}/search/#!/rows={rows}/sort=score%20desc/class=collection/p=1/q={formatted_search}/year_from={year_from}/year_to={year_to}/"
-    
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless")  # Фоновый режим
-    options.add_argument("--disable-gpu")
-    options.add_argument("--window-size=1920x1080")
-
-    driver = webdriver.Chrome(options=options)
-    driver.get(search_url)
-    
-    results = []
-    try:
-        wait = WebDriverWait(driver, 10)
-
-        while True:
-            time.sleep(2)  # Ждем загрузку страницы
-            
-            # Парсим HTML после рендеринга Angular
-            soup = BeautifulSoup(driver.page_source, "html.parser")
-
-            result_items = soup.find_all('div', class_='sresult')
-            for item in result_items:
-                title_tag = item.find('h2', class_='post-title')
-                if not title_tag or not title_tag.find('a'):
-                    continue
-                link_tag = title_tag.find('a')
-                title = link_tag.text.strip()
-                link_url = link_tag['href']
-                if link_url.startswith('/'):
-                    link_url = base_url + link_url
-
-                results.append({'URL': link_url, 'Title': title})
-
-            # Проверяем пагинацию
-            pagination = soup.find('ul', class_='pagi')
-            if not pagination:
-                break  # Если нет пагинации, завершаем
-            
-            active_page = pagination.find('li', class_='active')
-            next_page = active_page.find_next_sibling('li') if active_page else None
-
-            if next_page and next_page.find('a'):
-                print(f"Переход на следующую страницу...")
-                next_page_button = driver.find_element(By.LINK_TEXT, next_page.text.strip())
-                driver.execute_script("arguments[0].click();", next_page_button)
-                time.sleep(2)  # Ждем загрузку новой страницы
-            else:
-                break  # Если страниц больше нет — выходим
-
-    except Exception as e:
-        print(f"Ошибка: {e}")
-    finally:
-        driver.quit()
-
-    print(f"Найдено {len(results)} записей для '{search_term}'")
-    return results
-
-def save_results(data, filename_prefix):
-    if not data:
-        print(f"Нет данных для сохранения: {filename_prefix}")
-        return
-        
-    if not os.path.exists('results2'):
-        os.makedirs('results2')
-    
-    txt_path = f"results2/{filename_prefix}.txt"
-    with open(txt_path, "w", encoding='utf-8') as f:
-        for item in data:
-            f.write(f"{item['URL']}\n")
-    print(f"Сохранено в TXT: {txt_path}")
-
-    csv_path = f"results2/{filename_prefix}.csv"
-    df = pd.DataFrame(data)
-    df.to_csv(csv_path, index=False, encoding='utf-8')
-    print(f"Сохранено в CSV: {csv_path}")
-
-    excel_path = f"results2/{filename_prefix}.xlsx"
-    try:
-        df.to_excel(excel_path, index=False)
-        print(f"Сохранено в Excel: {excel_path}")
-    except ModuleNotFoundError as e:
-        if "openpyxl" in str(e):
-            print("Excel экспорт пропущен – установите 'openpyxl'")
-
-if __name__ == "__main__":
-    print("Запуск парсинга...")
-# here type what do you want to search
-    search_terms = [
-        "here",
-        "here"
-    ]
-# years change
-    for term in search_terms:
-        filename_prefix = term.replace(" ", "_").lower()
-        print(f"\n==== Парсим '{term}' ====")
-        datasets = scrape_research_datasets(term, years, years)
-        save_results(datasets, filename_prefix)
-
-    print("\nПарсинг завершен для всех запросов!")
+try:
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
+except ImportError:
+    # Selenium нужен только для --browser / --browser-fallback
+    webdriver = None
+import pandas as pd
+import os
+import argparse
+
+import browser_pool
+import date_filter
+import html_backend
+import http_client
+import metrics
+import rda_api
+import result_sink
+
+PORTAL = 'researchdata.edu.au'
+
+# Извлекаем записи и текст ссылки на следующую страницу (None если её нет)
+def parse_results(page_source, base_url):
+    soup = html_backend.parse(page_source)
+    if html_backend.is_lxml(soup):
+        return parse_results_lxml(soup, base_url)
+
+    results = []
+    result_items = soup.find_all('div', class_='sresult')
+    for item in result_items:
+        title_tag = item.find('h2', class_='post-title')
+        if not title_tag or not title_tag.find('a'):
+            continue
+        link_tag = title_tag.find('a')
+        title = link_tag.text.strip()
+        link_url = link_tag['href']
+        if link_url.startswith('/'):
+            link_url = base_url + link_url
+
+        results.append({'URL': link_url, 'Title': title})
+
+    # Проверяем пагинацию
+    pagination = soup.find('ul', class_='pagi')
+    if not pagination:
+        return results, None  # Если нет пагинации, завершаем
+
+    active_page = pagination.find('li', class_='active')
+    next_page = active_page.find_next_sibling('li') if active_page else None
+
+    if next_page and next_page.find('a'):
+        return results, next_page.text.strip()
+    return results, None
+
+# lxml версия parse_results, см. html_backend.py
+def parse_results_lxml(doc, base_url):
+    results = []
+    for item in doc.xpath('//' + html_backend.class_xpath('div', 'sresult')):
+        title_tag = html_backend.first(item.xpath('.//' + html_backend.class_xpath('h2', 'post-title')))
+        if title_tag is None:
+            continue
+        link_tag = html_backend.first(title_tag.xpath('.//a'))
+        if link_tag is None:
+            continue
+        title = html_backend.text(link_tag).strip()
+        link_url = link_tag.get('href')
+        if link_url.startswith('/'):
+            link_url = base_url + link_url
+
+        results.append({'URL': link_url, 'Title': title})
+
+    pagination = html_backend.first(doc.xpath('//' + html_backend.class_xpath('ul', 'pagi')))
+    if pagination is None:
+        return results, None
+
+    active_page = html_backend.first(pagination.xpath('.//' + html_backend.class_xpath('li', 'active')))
+    next_page = html_backend.first(active_page.xpath('following-sibling::li[1]')) if active_page is not None else None
+
+    if next_page is not None and next_page.xpath('.//a'):
+        return results, html_backend.text(next_page).strip()
+    return results, None
+
+# По умолчанию запрашиваем JSON API поиска напрямую (rda_api.py);
+# Selenium используется только если это явно включено.
+# Записи сохраняются в хранилище output (в браузере постранично);
+# возвращаются сохраненные записи без дублей уже записанных за этот запуск
+@metrics.timed('scrape_seconds', portal=PORTAL)
+def scrape_research_datasets(search_term, year_from, year_to, rows=100, browser=False, browser_fallback=False, pool=None,
+                             output=None):
+    if not browser:
+        try:
+            results = rda_api.search(search_term, year_from, year_to, rows)
+            metrics.count('datasets_total', len(results), portal=PORTAL)
+            metrics.log('scrape_done', f"Найдено {len(results)} записей для '{search_term}'",
+                        portal=PORTAL, search_term=search_term, datasets=len(results))
+            stream = result_sink.SearchOutput(output, PORTAL, search_term)
+            stream.add(results)
+            return stream.finish()
+        except Exception as e:
+            metrics.log('api_failed', f"Ошибка API: {e}", level='error', portal=PORTAL, search_term=search_term, error=str(e))
+            if not browser_fallback:
+                return []
+            metrics.log('browser_fallback', "Переходим на Selenium...", portal=PORTAL, search_term=search_term)
+
+    if pool is None:
+        with browser_pool.BrowserPool(1) as own_pool:
+            return scrape_research_datasets_browser(search_term, year_from, year_to, rows, own_pool, output)
+    return scrape_research_datasets_browser(search_term, year_from, year_to, rows, pool, output)
+
+# Состояние страницы результатов: активная страница и первая ссылка
+def results_state(driver):
+    active = driver.find_elements(By.CSS_SELECTOR, 'ul.pagi li.active')
+    links = driver.find_elements(By.CSS_SELECTOR, 'div.sresult h2.post-title a')
+    return (
+        active[0].text.strip() if active else None,
+        len(links),
+        links[0].get_attribute('href') if links else None,
+    )
+
+# Адрес поиска в браузере; границы годов добавляются только если заданы
+def browser_search_url(base_url, search_term, year_from, year_to, rows):
+    formatted_search = search_term.replace(' ', '%20')
+    search_url = f"{base_url}/search/#!/rows={rows}/sort=score%20desc/class=collection/p=1/q={formatted_search}/"
+    if year_from is not None:
+        search_url += f"year_from={year_from}/"
+    if year_to is not None:
+        search_url += f"year_to={year_to}/"
+    return search_url
+
+def scrape_research_datasets_browser(search_term, year_from, year_to, rows, pool, output=None):
+    base_url = "https://researchdata.edu.au"
+    
+    search_url = browser_search_url(base_url, search_term, year_from, year_to, rows)
+    
+    results = []
+    stream = result_sink.SearchOutput(output, PORTAL, search_term)
+    with pool.tab() as driver:
+        try:
+            driver.get(search_url)
+            wait = WebDriverWait(driver, 10, ignored_exceptions=(StaleElementReferenceException,))
+
+            # Ждем, пока Angular отрисует результаты
+            try:
+                wait.until(lambda d: results_state(d)[1] > 0)
+            except TimeoutException:
+                metrics.log('no_results', f"Нет результатов для '{search_term}'", portal=PORTAL, search_term=search_term)
+
+            while True:
+                # Парсим HTML после рендеринга Angular
+                with metrics.timed('parse_seconds', portal=PORTAL):
+                    page_results, next_page_text = parse_results(driver.page_source, base_url)
+                metrics.count('pages_total', portal=PORTAL)
+                results.extend(page_results)
+                stream.add(page_results)
+
+                if next_page_text:
+                    metrics.log('next_page', "Переход на следующую страницу...", portal=PORTAL, search_term=search_term,
+                                page=next_page_text)
+                    previous_state = results_state(driver)
+                    next_page_button = driver.find_element(By.LINK_TEXT, next_page_text)
+                    driver.execute_script("arguments[0].click();", next_page_button)
+                    # Ждем смены активной страницы / списка результатов
+                    wait.until(lambda d: results_state(d) != previous_state and results_state(d)[1] > 0)
+                else:
+                    break  # Если страниц больше нет — выходим
+
+        except Exception as e:
+            metrics.log('browser_failed', f"Ошибка: {e}", level='error', portal=PORTAL, search_term=search_term,
+                        error=str(e))
+
+    metrics.count('datasets_total', len(results), portal=PORTAL)
+    metrics.log('scrape_done', f"Найдено {len(results)} записей для '{search_term}'",
+                portal=PORTAL, search_term=search_term, datasets=len(results), source='browser')
+    return stream.finish()
+
+# Несколько запросов параллельно во вкладках общего пула браузеров
+def scrape_all_browser(search_terms, year_from, year_to, rows=100, browsers=2, output=None):
+    with browser_pool.BrowserPool(browsers) as pool:
+        return pool.map(lambda term: scrape_research_datasets_browser(term, year_from, year_to, rows, pool, output),
+                        search_terms)
+
+# Сохраняем в файлы, которые запрошены в output (без хранилища по
+# умолчанию TXT, CSV и Excel). В хранилище (result_sink.py) записи уже
+# сохранены во время поиска
+def save_results(data, filename_prefix, output=None):
+    if not data:
+        metrics.log('no_data', f"Нет данных для сохранения: {filename_prefix}", portal=PORTAL, prefix=filename_prefix)
+        return
+
+    output = output or result_sink.FILES_ONLY
+    if not output.formats:
+        return
+        
+    if not os.path.exists('results2'):
+        os.makedirs('results2')
+    
+    if output.wants('txt'):
+        txt_path = f"results2/{filename_prefix}.txt"
+        with open(txt_path, "w", encoding='utf-8') as f:
+            for item in data:
+                f.write(f"{item['URL']}\n")
+        metrics.log('saved', f"Сохранено в TXT: {txt_path}", path=txt_path, records=len(data))
+
+    df = pd.DataFrame(data)
+    if output.wants('csv'):
+        csv_path = f"results2/{filename_prefix}.csv"
+        df.to_csv(csv_path, index=False, encoding='utf-8')
+        metrics.log('saved', f"Сохранено в CSV: {csv_path}", path=csv_path, records=len(data))
+
+    if not output.wants('xlsx'):
+        return
+    if len(data) > result_sink.EXCEL_MAX_ROWS:
+        metrics.log('excel_skipped', f"Excel экспорт пропущен – {len(data)} строк не помещаются на лист",
+                    level='warning', records=len(data))
+        return
+    excel_path = f"results2/{filename_prefix}.xlsx"
+    try:
+        df.to_excel(excel_path, index=False)
+        metrics.log('saved', f"Сохранено в Excel: {excel_path}", path=excel_path, records=len(data))
+    except ModuleNotFoundError as e:
+        if "openpyxl" in str(e):
+            metrics.log('excel_skipped', "Excel экспорт пропущен – установите 'openpyxl'", level='warning')
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Парсинг researchdata.edu.au")
+    html_backend.add_backend_arguments(arg_parser)
+    date_filter.add_date_arguments(arg_parser)
+    result_sink.add_sink_arguments(arg_parser)
+    http_client.add_connection_arguments(arg_parser)
+    metrics.add_metrics_arguments(arg_parser)
+    arg_parser.add_argument('--browser', action='store_true', help='рендерить поиск в Selenium вместо JSON API')
+    arg_parser.add_argument('--browser-fallback', action='store_true', help='использовать Selenium, если JSON API недоступен')
+    arg_parser.add_argument('--browsers', type=int, default=2, help='сколько браузеров держать в пуле')
+    args = arg_parser.parse_args()
+    metrics.configure_from_args(args)
+    http_client.configure_from_args(args)
+    html_backend.backend_from_args(args)
+    output = result_sink.output_from_args(args)
+
+    metrics.log('run_start', "Запуск парсинга...", portal=PORTAL)
+# here type what do you want to search
+    search_terms = [
+        "here",
+        "here"
+    ]
+    # Годы можно задать через --year-from / --year-to
+    year_from, year_to = args.year_from, args.year_to
+    # Общий пул для запасного пути через Selenium; браузеры запускаются при первой необходимости
+    pool = browser_pool.BrowserPool(args.browsers) if args.browser_fallback and not args.browser else None
+    try:
+        if args.browser:
+            # Все запросы параллельно в пуле браузеров
+            all_datasets = scrape_all_browser(search_terms, year_from, year_to, browsers=args.browsers, output=output)
+            for term, datasets in zip(search_terms, all_datasets):
+                save_results(datasets, term.replace(" ", "_").lower(), output)
+        else:
+            for term in search_terms:
+                filename_prefix = term.replace(" ", "_").lower()
+                metrics.log('search_start', f"\n==== Парсим '{term}' ====", portal=PORTAL, search_term=term)
+                datasets = scrape_research_datasets(term, year_from, year_to, browser_fallback=args.browser_fallback,
+                                                    pool=pool, output=output)
+                save_results(datasets, filename_prefix, output)
+    finally:
+        if pool is not None:
+            pool.close()
+        output.close()
+    metrics.log('run_done', "\nПарсинг завершен для всех запросов!", portal=PORTAL)
+    http_client.print_connection_stats()
@@ -1,149 +1,441 @@
-import requests
-from bs4 import BeautifulSoup
-from datetime import datetime
-import os
-import pandas as pd
-import time
-# years change from to 
-def is_valid_year(date_string):
-    try:
-        date = datetime.strptime(date_string, '%b %d, %Y')
-        return date.year in [years, years]
-    except ValueError:
-        return False
-
-def parse_page(page_url):
-    print(f"Scraping page: {page_url}")
-    try:
-        response = requests.get(page_url, timeout=10)
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        print(f"Error accessing {page_url}: {e}")
-        return [], None
-
-    soup = BeautifulSoup(response.text, 'html.parser')
-    dataset_info = []
-    rows = soup.find_all('div', class_='row mrgn-bttm-xl mrgn-lft-md')
-    
-    for row in rows:
-        link = row.find('a', href=True)
-        if link:
-            dataset_url = link['href']
-            title = link.get_text(strip=True)
-            
-            record_modified_row = row.find_next('div', class_='row mrgn-tp-md')
-            if record_modified_row:
-                cols = record_modified_row.find_all('div', class_='col-sm-6')
-                if len(cols) >= 2:
-                    record_modified_text = cols[0].get_text(strip=True)
-                    record_released_text = cols[1].get_text(strip=True)
-                    
-                    record_modified_date = record_modified_text.replace("Record Modified:", "").strip()
-                    
-                    if is_valid_year(record_modified_date):
-                        dataset_info.append({
-                            "Title": title,
-                            "Dataset URL": dataset_url,
-                            "Record Modified": record_modified_date,
-                            "Record Released": record_released_text.replace("Record Released:", "").strip()
-                        })
-
-    return dataset_info, soup
-
-def get_total_pages(soup):
-    pagination = soup.find('ul', class_='pagination')
-    if not pagination:
-        return 1
-    
-    page_numbers = []
-    for li in pagination.find_all('li'):
-        a_tag = li.find('a')
-        if a_tag and a_tag.get('onclick'):
-            onclick = a_tag['onclick']
-            if 'gotoPage' in onclick:
-                try:
-                    page_num = int(onclick.split("'")[1])
-                    page_numbers.append(page_num)
-                except (IndexError, ValueError):
-                    continue
-    
-    if page_numbers:
-        return max(page_numbers)
-    
-    next_button = pagination.find('li', class_='next')
-    if next_button and 'disabled' not in next_button.get('class', []):
-        return None
-    
-    return 1
-
-def save_to_txt(data, filename):
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write("Title|Dataset URL|Record Modified|Record Released\n")
-        for item in data:
-            f.write(f"{item['Title']}|{item['Dataset URL']}|{item['Record Modified']}|{item['Record Released']}\n")
-
-def scrape_search_term(search_term, filename_prefix):
-    base_url = f'https://search.open.canada.ca/opendata/?portal_type=dataset&portal_type=info&sort=metadata_modified+desc&search_text={search_term.replace(" ", "+")}&page='
-    
-    results_dir = "search_results"
-    if not os.path.exists(results_dir):
-        os.makedirs(results_dir)
-    
-    all_data = []
-    page = 1
-    total_pages = None
-    
-    while True:
-        page_url = f'{base_url}{page}'
-        print(f"Scraping page {page} for '{search_term}'...")
-        
-        dataset_info, soup = parse_page(page_url)
-        if dataset_info:
-            all_data.extend(dataset_info)
-        
-        if page == 1 and total_pages is None:
-            total_pages = get_total_pages(soup)
-            print(f"Total pages for '{search_term}': {total_pages if total_pages else 'unknown'}")
-        
-        if total_pages:
-            if page >= total_pages:
-                break
-            page += 1
-        else:
-            next_button = soup.find('li', class_='next') if soup else None
-            if not next_button or 'disabled' in next_button.get('class', []):
-                break
-            page += 1
-        
-        time.sleep(1)
-    
-    if all_data:
-        # Сохраняем в Excel
-        excel_file = os.path.join(results_dir, f"{filename_prefix}.xlsx")
-        df = pd.DataFrame(all_data)
-        df.to_excel(excel_file, index=False)
-        print(f"Saved {len(all_data)} records to {excel_file}")
-        
-        # Сохраняем в TXT
-        txt_file = os.path.join(results_dir, f"{filename_prefix}.txt")
-        save_to_txt(all_data, txt_file)
-        print(f"Saved {len(all_data)} records to {txt_file}\n")
-    else:
-        print(f"No valid datasets found for '{search_term}'\n")
-# what do you want to find
-def main():
-    search_terms = [
-        ("something","something"),
-        ("something", "something")
-    ]
-    
-    print("Starting scraping process...\n")
-    
-    for term, filename in search_terms:
-        print(f"=== Processing: '{term}' ===")
-        scrape_search_term(term, filename)
-    
-    print("All searches completed successfully!")
-
-if __name__ == "__main__":
-    main()
+import csv
+import requests
+import os
+import pandas as pd
+import argparse
+
+import ckan_api
+import crawl_checkpoint
+import crawl_state
+import date_filter
+import html_backend
+import http_cache
+import http_client
+import metrics
+import parse_pool
+import result_sink
+
+PORTAL = 'open.canada.ca'
+
+# Keeps the records whose Record Modified date is inside the year range and
+# tells whether the page (sorted newest first) already went past the range
+def filter_by_date(dataset_info, dates):
+    if not dates.active() or not dataset_info:
+        return dataset_info, False
+    keep, passed = dates.check(PORTAL, [item["Record Modified"] for item in dataset_info])
+    return [item for item, kept in zip(dataset_info, keep) if kept], passed
+
+def parse_page(page_url):
+    metrics.log('page_start', f"Scraping page: {page_url}", portal=PORTAL, url=page_url)
+    try:
+        response = http_client.get(page_url)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        metrics.log('page_failed', f"Error accessing {page_url}: {e}", level='error',
+                    portal=PORTAL, url=page_url, error=str(e))
+        return [], None
+
+    with metrics.timed('parse_seconds', portal=PORTAL):
+        soup = html_backend.parse(response.text)
+        if html_backend.is_lxml(soup):
+            return extract_datasets_lxml(soup), soup
+        return extract_datasets(soup), soup
+
+# Parses a results page into (records, total pages, has next page). Also
+# runs in parse pool workers (see parse_pool.py), so it returns plain data.
+@metrics.timed('parse_seconds', portal=PORTAL)
+def extract_page(html):
+    soup = html_backend.parse(html)
+    if html_backend.is_lxml(soup):
+        return extract_datasets_lxml(soup), get_total_pages(soup), has_next_page(soup)
+    return extract_datasets(soup), get_total_pages(soup), has_next_page(soup)
+
+def extract_datasets(soup):
+    dataset_info = []
+    rows = soup.find_all('div', class_='row mrgn-bttm-xl mrgn-lft-md')
+    
+    for row in rows:
+        link = row.find('a', href=True)
+        if link:
+            dataset_url = link['href']
+            title = link.get_text(strip=True)
+            
+            record_modified_row = row.find_next('div', class_='row mrgn-tp-md')
+            if record_modified_row:
+                cols = record_modified_row.find_all('div', class_='col-sm-6')
+                if len(cols) >= 2:
+                    record_modified_text = cols[0].get_text(strip=True)
+                    record_released_text = cols[1].get_text(strip=True)
+                    
+                    record_modified_date = record_modified_text.replace("Record Modified:", "").strip()
+                    
+                    dataset_info.append({
+                        "Title": title,
+                        "Dataset URL": dataset_url,
+                        "Record Modified": record_modified_date,
+                        "Record Released": record_released_text.replace("Record Released:", "").strip()
+                    })
+
+    return dataset_info
+
+# lxml version of extract_datasets, see html_backend.py
+def extract_datasets_lxml(doc):
+    dataset_info = []
+    rows = doc.xpath('//' + html_backend.class_xpath('div', 'row mrgn-bttm-xl mrgn-lft-md'))
+    record_row_xpath = html_backend.class_xpath('div', 'row mrgn-tp-md')
+    
+    for row in rows:
+        link = html_backend.first(row.xpath('.//a[@href]'))
+        if link is not None:
+            dataset_url = link.get('href')
+            title = html_backend.text(link, strip=True)
+            
+            record_modified_row = html_backend.first(row.xpath(f'(descendant::{record_row_xpath} | following::{record_row_xpath})[1]'))
+            if record_modified_row is not None:
+                cols = record_modified_row.xpath('.//' + html_backend.class_xpath('div', 'col-sm-6'))
+                if len(cols) >= 2:
+                    record_modified_text = html_backend.text(cols[0], strip=True)
+                    record_released_text = html_backend.text(cols[1], strip=True)
+                    
+                    record_modified_date = record_modified_text.replace("Record Modified:", "").strip()
+                    
+                    dataset_info.append({
+                        "Title": title,
+                        "Dataset URL": dataset_url,
+                        "Record Modified": record_modified_date,
+                        "Record Released": record_released_text.replace("Record Released:", "").strip()
+                    })
+
+    return dataset_info
+
+def get_total_pages(soup):
+    if html_backend.is_lxml(soup):
+        return get_total_pages_lxml(soup)
+    
+    pagination = soup.find('ul', class_='pagination')
+    if not pagination:
+        return 1
+    
+    page_numbers = []
+    for li in pagination.find_all('li'):
+        a_tag = li.find('a')
+        if a_tag and a_tag.get('onclick'):
+            onclick = a_tag['onclick']
+            if 'gotoPage' in onclick:
+                try:
+                    page_num = int(onclick.split("'")[1])
+                    page_numbers.append(page_num)
+                except (IndexError, ValueError):
+                    continue
+    
+    if page_numbers:
+        return max(page_numbers)
+    
+    next_button = pagination.find('li', class_='next')
+    if next_button and 'disabled' not in next_button.get('class', []):
+        return None
+    
+    return 1
+
+def get_total_pages_lxml(doc):
+    pagination = html_backend.first(doc.xpath('//' + html_backend.class_xpath('ul', 'pagination')))
+    if pagination is None:
+        return 1
+    
+    page_numbers = []
+    for li in pagination.xpath('.//li'):
+        a_tag = html_backend.first(li.xpath('.//a'))
+        if a_tag is not None and a_tag.get('onclick'):
+            onclick = a_tag.get('onclick')
+            if 'gotoPage' in onclick:
+                try:
+                    page_num = int(onclick.split("'")[1])
+                    page_numbers.append(page_num)
+                except (IndexError, ValueError):
+                    continue
+    
+    if page_numbers:
+        return max(page_numbers)
+    
+    if has_next_page(doc):
+        return None
+    
+    return 1
+
+def has_next_page(soup):
+    if soup is None:
+        return False
+    if html_backend.is_lxml(soup):
+        next_button = html_backend.first(soup.xpath('//' + html_backend.class_xpath('li', 'next')))
+        return next_button is not None and 'disabled' not in next_button.get('class', '').split()
+    next_button = soup.find('li', class_='next')
+    return bool(next_button) and 'disabled' not in next_button.get('class', [])
+
+def filter_new_records(state, search_term, dataset_info):
+    entries = [(item["Dataset URL"], item["Record Modified"]) for item in dataset_info]
+    new_entries, all_known = state.filter_new(PORTAL, search_term, entries)
+    new_urls = {url for url, _ in new_entries}
+    return [item for item in dataset_info if item["Dataset URL"] in new_urls], all_known
+
+# Pipe delimited; fields containing '|' or quotes are quoted so titles
+# can't shift the columns
+def save_to_txt(data, filename):
+    with open(filename, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter='|', lineterminator='\n')
+        writer.writerow(["Title", "Dataset URL", "Record Modified", "Record Released"])
+        for item in data:
+            writer.writerow([item['Title'], item['Dataset URL'], item['Record Modified'], item['Record Released']])
+
+# CKAN API version of the page loop in scrape_search_term, see ckan_api.py
+def search_api(search_term, year_from=None, year_to=None, state=None):
+    packages = ckan_api.package_search(PORTAL, search_term, year_from, year_to)
+    all_data = ckan_api.to_canada_records(packages)
+    
+    if state is not None:
+        all_data, _ = filter_new_records(state, search_term, all_data)
+    
+    metrics.log('scrape_done', f"API returned {len(all_data)} datasets for '{search_term}'",
+                portal=PORTAL, search_term=search_term, datasets=len(all_data), source='api')
+    return all_data
+
+# Adds a page's records to all_data; True once the crawl can stop. With
+# `progress` (a crawl_checkpoint.SearchCheckpoint) the page is checkpointed;
+# with `stream` (a result_sink.SearchOutput) its records are stored right away.
+def collect_records(all_data, dataset_info, dates, state, search_term, progress=None, page=None, total_pages=None,
+                    stream=None):
+    metrics.count('pages_total', portal=PORTAL)
+    dataset_info, passed = filter_by_date(dataset_info, dates)
+    all_known = False
+    if state is not None:
+        # Results are sorted by metadata_modified desc, so a page with
+        # nothing new means the rest of the results are known as well
+        dataset_info, all_known = filter_new_records(state, search_term, dataset_info)
+    all_data.extend(dataset_info)
+    # Stored before the checkpoint: a crash in between repeats the page
+    # rather than losing it
+    if stream is not None:
+        stream.add(dataset_info)
+    if progress is not None:
+        progress.page_done(page, dataset_info, total_pages)
+    
+    if all_known:
+        metrics.log('known_datasets_reached', f"Reached already seen datasets for '{search_term}', stopping",
+                    portal=PORTAL, search_term=search_term)
+        return True
+    if passed:
+        metrics.log('year_range_passed', f"Reached datasets older than {dates.year_from} for '{search_term}', stopping",
+                    portal=PORTAL, search_term=search_term)
+    return passed
+
+# Failed pages from the retry queue, fetched one at a time after the crawl
+def retry_failed_pages(progress, all_data, dates, state, search_term, stream=None):
+    for page, page_url in progress.retry_queue():
+        dataset_info, soup = parse_page(page_url)
+        if soup is None:
+            progress.page_failed(page, page_url)
+        else:
+            collect_records(all_data, dataset_info, dates, state, search_term, progress, page, stream=stream)
+
+# Page 1 gives the page count the rest of the search needs, so when it fails
+# it goes through the retry queue right away (nothing else has been reached
+# yet, so the queue only holds page 1). Returns parse_page's result, with
+# soup None if it still failed after the retries.
+def scrape_first_page(page_url, progress):
+    dataset_info, soup = parse_page(page_url)
+    if soup is not None:
+        return dataset_info, soup
+    progress.page_failed(1, page_url)
+    for page, url in progress.retry_queue():
+        dataset_info, soup = parse_page(url)
+        if soup is not None:
+            return dataset_info, soup
+        progress.page_failed(page, url)
+    return [], None
+
+# Pages first_page..total_pages through the parse pool, fetched one at a
+# time per second like the page loop below
+def pipeline_pages(base_url, first_page, total_pages, all_data, dates, state, search_term, pool, progress,
+                   stream=None):
+    page_urls = [f'{base_url}{page}' for page in range(first_page, total_pages + 1)]
+    pages = pool.pipeline(page_urls, extract_page, (), {'max_per_host': 1, 'rate': 1.0})
+    try:
+        for page, (page_url, response, parsed) in enumerate(pages, first_page):
+            metrics.log('page_start', f"Scraping page: {page_url}", portal=PORTAL, page=page, url=page_url)
+            if isinstance(response, Exception):
+                progress.page_failed(page, page_url, response)
+                continue
+            if response.status_code != 200:
+                progress.page_failed(page, page_url, f"status code {response.status_code}")
+                continue
+            if isinstance(parsed, Exception):
+                progress.page_failed(page, page_url, parsed)
+                continue
+            if collect_records(all_data, parsed[0], dates, state, search_term, progress, page, stream=stream):
+                return
+    finally:
+        pages.close()
+
+# Records are stored in `output`'s sink page by page and exported once the
+# search is done; returns the ones stored (duplicates of datasets written
+# earlier in the run are left out)
+@metrics.timed('scrape_seconds', portal=PORTAL)
+def scrape_search_term(search_term, filename_prefix, state=None, source='html', year_from=None, year_to=None,
+                       pool=None, output=None, checkpoints=None):
+    stream = result_sink.SearchOutput(output, PORTAL, search_term)
+    if source == 'api':
+        try:
+            all_data = search_api(search_term, year_from, year_to, state)
+            mark_seen(state, search_term, all_data)
+            stream.add(all_data)
+            records = stream.finish()
+            save_search_results(records, search_term, filename_prefix, output)
+            return records
+        except Exception as e:
+            metrics.log('api_failed', f"API search failed ({e}), falling back to HTML scraping", level='warning',
+                        portal=PORTAL, search_term=search_term, error=str(e))
+    
+    dates = date_filter.DateFilter(year_from, year_to)
+    base_url = f'https://search.open.canada.ca/opendata/?portal_type=dataset&portal_type=info&sort=metadata_modified+desc&search_text={search_term.replace(" ", "+")}&page='
+    
+    # Records of the pages finished by an earlier, interrupted run
+    progress = crawl_checkpoint.search_checkpoint(checkpoints, PORTAL, f"{search_term} {dates.describe()}")
+    all_data = progress.records()
+    stream.resume(all_data)
+    page = progress.last_page + 1
+    total_pages = progress.total_pages
+    complete = True
+    
+    while not progress.paged_through():
+        page_url = f'{base_url}{page}'
+        metrics.log('page_start', f"Scraping page {page} for '{search_term}'...", portal=PORTAL, search_term=search_term,
+                    page=page, url=page_url)
+        
+        if page == 1:
+            dataset_info, soup = scrape_first_page(page_url, progress)
+        else:
+            dataset_info, soup = parse_page(page_url)
+            if soup is None:
+                progress.page_failed(page, page_url)
+        if soup is None:
+            # Without a page count only the failed page can tell if there are
+            # more, so the search stays unfinished and resumes here next run
+            if not total_pages:
+                complete = False
+                break
+        else:
+            if page == 1:
+                total_pages = get_total_pages(soup)
+                metrics.log('total_pages', f"Total pages for '{search_term}': {total_pages if total_pages else 'unknown'}",
+                            portal=PORTAL, search_term=search_term, pages=total_pages)
+            if collect_records(all_data, dataset_info, dates, state, search_term, progress, page, total_pages, stream):
+                break
+            if not total_pages and not has_next_page(soup):
+                break
+        
+        if total_pages and page >= total_pages:
+            break
+        if pool is not None and total_pages:
+            pipeline_pages(base_url, page + 1, total_pages, all_data, dates, state, search_term, pool, progress, stream)
+            break
+        page += 1
+        metrics.sleep(1, 'page_delay')
+    
+    retry_failed_pages(progress, all_data, dates, state, search_term, stream)
+    if complete:
+        progress.finish()
+    
+    metrics.count('datasets_total', len(all_data), portal=PORTAL)
+    metrics.log('scrape_done', f"Finished '{search_term}': {len(all_data)} datasets",
+                portal=PORTAL, search_term=search_term, datasets=len(all_data))
+    mark_seen(state, search_term, all_data)
+    records = stream.finish()
+    save_search_results(records, search_term, filename_prefix, output)
+    return records
+
+def mark_seen(state, search_term, all_data):
+    if state is None:
+        return
+    newest_modified = all_data[0]["Record Modified"] if all_data else None
+    state.mark_seen(PORTAL, search_term, [(item["Dataset URL"], item["Record Modified"]) for item in all_data], newest_modified)
+
+# Writes the file exports the output asks for (by default, without a sink,
+# all of TXT, CSV and Excel). The records are already in the sink: the
+# search stores them page by page.
+def save_search_results(all_data, search_term, filename_prefix, output=None):
+    output = output or result_sink.FILES_ONLY
+    
+    if not all_data:
+        metrics.log('no_data', f"No valid datasets found for '{search_term}'\n", portal=PORTAL, search_term=search_term)
+        return
+    
+    if not output.formats:
+        return
+    
+    results_dir = "search_results"
+    if not os.path.exists(results_dir):
+        os.makedirs(results_dir)
+    
+    # Сохраняем в Excel
+    if output.wants('xlsx'):
+        if len(all_data) > result_sink.EXCEL_MAX_ROWS:
+            metrics.log('excel_skipped', f"Excel export skipped - {len(all_data)} rows don't fit in a sheet", level='warning',
+                        records=len(all_data))
+        else:
+            excel_file = os.path.join(results_dir, f"{filename_prefix}.xlsx")
+            pd.DataFrame(all_data).to_excel(excel_file, index=False)
+            metrics.log('saved', f"Saved {len(all_data)} records to {excel_file}", path=excel_file, records=len(all_data))
+    
+    if output.wants('csv'):
+        csv_file = os.path.join(results_dir, f"{filename_prefix}.csv")
+        pd.DataFrame(all_data).to_csv(csv_file, index=False)
+        metrics.log('saved', f"Saved {len(all_data)} records to {csv_file}", path=csv_file, records=len(all_data))
+    
+    # Сохраняем в TXT
+    if output.wants('txt'):
+        txt_file = os.path.join(results_dir, f"{filename_prefix}.txt")
+        save_to_txt(all_data, txt_file)
+        metrics.log('saved', f"Saved {len(all_data)} records to {txt_file}\n", path=txt_file, records=len(all_data))
+# what do you want to find
+def main(state=None, source='html', year_from=None, year_to=None, pool=None, output=None, checkpoints=None):
+    search_terms = [
+        ("something","something"),
+        ("something", "something")
+    ]
+    
+    metrics.log('run_start', "Starting scraping process...\n", portal=PORTAL)
+    
+    for term, filename in search_terms:
+        metrics.log('search_start', f"=== Processing: '{term}' ===", portal=PORTAL, search_term=term)
+        scrape_search_term(term, filename, state, source, year_from, year_to, pool, output, checkpoints)
+    
+    metrics.log('run_done', "All searches completed successfully!", portal=PORTAL)
+    http_client.print_connection_stats()
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Scrape open.canada.ca search results")
+    http_cache.add_cache_arguments(arg_parser)
+    http_client.add_connection_arguments(arg_parser)
+    crawl_state.add_state_arguments(arg_parser)
+    crawl_checkpoint.add_checkpoint_arguments(arg_parser)
+    html_backend.add_backend_arguments(arg_parser)
+    ckan_api.add_source_arguments(arg_parser)
+    date_filter.add_date_arguments(arg_parser)
+    parse_pool.add_parse_arguments(arg_parser)
+    result_sink.add_sink_arguments(arg_parser)
+    metrics.add_metrics_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    metrics.configure_from_args(args)
+    http_client.configure_from_args(args)
+    http_client.configure_cache_from_args(args)
+    html_backend.backend_from_args(args)
+    pool = parse_pool.pool_from_args(args)
+    output = result_sink.output_from_args(args)
+    checkpoints = crawl_checkpoint.checkpoints_from_args(args)
+    try:
+        main(crawl_state.state_from_args(args), args.source, args.year_from, args.year_to, pool, output, checkpoints)
+    finally:
+        if pool is not None:
+            pool.close()
+        if checkpoints is not None:
+            checkpoints.close()
+        output.close()
@@ -0,0 +1,107 @@
+from abc import ABC, abstractmethod
+
+import ckan_api
+import metrics
+import parser
+import parser_angular
+import parser_can
+import result_sink
+
+# One driver per supported portal, all behind the same interface so the
+# crawl orchestrator (crawl.py) can run jobs for any of them. A driver's run()
+# searches one term over a year range, saves the results under the job's
+# output name and returns the records it saved.
+
+DRIVERS = {}
+
+def register(cls):
+    DRIVERS[cls.name] = cls()
+    return cls
+
+def get_driver(name):
+    if name not in DRIVERS:
+        raise ValueError(f"Unknown portal: {name} (choose from {', '.join(sorted(DRIVERS))})")
+    return DRIVERS[name]
+
+class PortalDriver(ABC):
+    name = None
+    portal = None
+    # Jobs for this portal allowed to run at once unless overridden
+    max_concurrency = 2
+
+    # job: dict with search_term, year_from, year_to and output.
+    # state: CrawlState for incremental crawls or None.
+    # options: dict of crawl options (source, browser_fallback, pool,
+    # browser_pool, output, checkpoints).
+    @abstractmethod
+    def run(self, job, state, options):
+        pass
+
+@register
+class UKDriver(PortalDriver):
+    name = 'uk'
+    portal = parser.PORTAL
+
+    def run(self, job, state, options):
+        records = parser.scrape_datasets(job['search_term'], job['year_from'], state=state,
+                                         source=options.get('source', 'api'), year_to=job['year_to'],
+                                         pool=options.get('pool'), checkpoints=options.get('checkpoints'),
+                                         output=options.get('output'))
+        parser.save_results(records, job['output'], options.get('output'))
+        return records
+
+@register
+class CanadaDriver(PortalDriver):
+    name = 'ca'
+    portal = parser_can.PORTAL
+    # The HTML path pauses between pages; keep the search site load low
+    max_concurrency = 1
+
+    def run(self, job, state, options):
+        return parser_can.scrape_search_term(job['search_term'], job['output'], state,
+                                             options.get('source', 'api'), job['year_from'], job['year_to'],
+                                             options.get('pool'), options.get('output'), options.get('checkpoints'))
+
+@register
+class AustraliaDriver(PortalDriver):
+    name = 'au'
+    portal = parser_angular.PORTAL
+
+    def run(self, job, state, options):
+        records = parser_angular.scrape_research_datasets(job['search_term'], job['year_from'], job['year_to'],
+                                                          browser_fallback=options.get('browser_fallback', False),
+                                                          pool=options.get('browser_pool'), output=options.get('output'))
+        parser_angular.save_results(records, job['output'], options.get('output'))
+        return records
+
+# Portals only reachable through their CKAN API
+class CKANDriver(PortalDriver):
+    def run(self, job, state, options):
+        packages = ckan_api.package_search(self.portal, job['search_term'], job['year_from'], job['year_to'])
+        records = ckan_api.to_titled_records(self.portal, packages)
+
+        if state is not None:
+            entries = [(record['URL'], package.get('metadata_modified')) for record, package in zip(records, packages)]
+            new_entries, _ = state.filter_new(self.portal, job['search_term'], entries)
+            new_urls = {url for url, _ in new_entries}
+            records = [record for record in records if record['URL'] in new_urls]
+            state.mark_seen(self.portal, job['search_term'], new_entries,
+                            newest_modified=entries[0][1] if entries else None)
+
+        metrics.log('scrape_done', f"{self.portal} API returned {len(records)} datasets for '{job['search_term']}'",
+                    portal=self.portal, search_term=job['search_term'], datasets=len(records), source='api')
+        stream = result_sink.SearchOutput(options.get('output'), self.portal, job['search_term'])
+        stream.add(records)
+        records = stream.finish()
+        parser.save_results(records, job['output'], options.get('output'))
+        return records
+
+@register
+class NewZealandDriver(CKANDriver):
+    name = 'nz'
+    portal = 'data.govt.nz'
+
+@register
+class IrelandDriver(CKANDriver):
+    name = 'ie'
+    portal = 'data.gov.ie'
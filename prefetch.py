@@ -0,0 +1,83 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# Pipelining helpers for analizeAi: dataset pages for the next batches are
+# fetched in a thread pool while the current batch waits on the model.
+
+# Throughput of one pipeline stage: items handled, time spent working on
+# them (summed over threads) and wall-clock time from first start to last end
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.items = 0
+        self.busy = 0.0
+        self.first_start = None
+        self.last_end = None
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def timed(self, items=1):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            end = time.monotonic()
+            with self.lock:
+                self.calls += 1
+                self.items += items
+                self.busy += end - start
+                if self.first_start is None or start < self.first_start:
+                    self.first_start = start
+                if self.last_end is None or end > self.last_end:
+                    self.last_end = end
+
+    def wall(self):
+        if self.first_start is None:
+            return 0.0
+        return self.last_end - self.first_start
+
+    def summary(self):
+        wall = self.wall()
+        rate = self.items / wall if wall > 0 else 0.0
+        return (f"{self.name}: {self.items} items in {self.calls} calls, "
+                f"{self.busy:.1f}s busy, {wall:.1f}s wall, {rate:.2f} items/s")
+
+# Fetches the pages of upcoming batches ahead of time. get(i) returns the
+# contents for batch i (in URL order) and queues batches up to i + lookahead.
+class ContentPrefetcher:
+    def __init__(self, fetch, batches, workers=8, lookahead=2, stats=None):
+        self.fetch = fetch
+        self.batches = batches
+        self.lookahead = lookahead
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.futures = {}
+        self.next_batch = 0
+        self.lock = threading.Lock()
+        self.stats = stats or StageStats("Fetch stage")
+
+    def _fetch(self, url):
+        with self.stats.timed():
+            return self.fetch(url)
+
+    def _submit_until(self, index):
+        last = min(index, len(self.batches) - 1)
+        while self.next_batch <= last:
+            urls = self.batches[self.next_batch]
+            self.futures[self.next_batch] = [self.executor.submit(self._fetch, url) for url in urls]
+            self.next_batch += 1
+
+    def get(self, index):
+        # Several batches may be waiting on their pages at once
+        with self.lock:
+            self._submit_until(index + self.lookahead)
+            futures = self.futures.pop(index, None)
+        if futures is None:
+            # Batch was already taken or is out of range
+            return [self.fetch(url) for url in self.batches[index]]
+        return [future.result() for future in futures]
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,62 @@
+import dedup_index
+
+# Packs dataset URLs into model requests by token budget instead of a fixed
+# number per request. Items are added in order; a request is closed once the
+# next item would push its prompt over the input budget, its expected reply
+# over the output budget, or its size over max_items. An item too big for
+# any request goes out on its own.
+
+class PromptPacker:
+    def __init__(self, max_input_tokens=8000, max_output_tokens=4000, overhead_tokens=0,
+                 output_tokens_per_item=100, output_overhead=200, max_items=40):
+        self.max_input_tokens = max_input_tokens
+        self.max_output_tokens = max_output_tokens
+        self.overhead_tokens = overhead_tokens
+        self.output_tokens_per_item = output_tokens_per_item
+        self.output_overhead = output_overhead
+        self.max_items = max_items
+
+        self.items = []
+        self.input_tokens = overhead_tokens
+        self.requests = 0
+        self.packed_items = 0
+
+    # Reply size to ask for (max_tokens) for a request of n items
+    def output_tokens(self, n):
+        return min(self.max_output_tokens, self.output_overhead + n * self.output_tokens_per_item)
+
+    def _fits(self, tokens):
+        n = len(self.items) + 1
+        return (n <= self.max_items
+                and self.input_tokens + tokens <= self.max_input_tokens
+                and self.output_overhead + n * self.output_tokens_per_item <= self.max_output_tokens)
+
+    # Adds an item with its prompt size in tokens. Returns the request it
+    # closed (a list of items), or None while the current one is still open.
+    def add(self, item, tokens):
+        full = None
+        if self.items and not self._fits(tokens):
+            full = self.flush()
+        self.items.append(item)
+        self.input_tokens += tokens
+        return full
+
+    # Closes the current request; returns its items or None if it is empty
+    def flush(self):
+        if not self.items:
+            return None
+        items = self.items
+        self.items = []
+        self.input_tokens = self.overhead_tokens
+        self.requests += 1
+        self.packed_items += len(items)
+        return items
+
+    def average_items(self):
+        return self.packed_items / self.requests if self.requests else 0.0
+
+# Key identifying a dataset across URL variants (language prefixes,
+# trailing slashes, tracking parameters): its canonical URL. The query is
+# part of it, since some portals identify records by it (/view/?key=...).
+def dataset_key(url):
+    return dedup_index.canonical_url(url)
@@ -0,0 +1,77 @@
+import json
+import math
+
+import http_client
+import metrics
+
+# Source driver for researchdata.edu.au (Research Data Australia). The
+# Angular search page posts its filters to registry_object/filter and gets
+# the Solr response back as JSON; calling that endpoint directly returns the
+# same results without rendering the page in a browser.
+
+BASE_URL = "https://researchdata.edu.au"
+FILTER_URL = f"{BASE_URL}/registry_object/filter"
+
+class RDAError(Exception):
+    pass
+
+def search_filters(search_term, year_from, year_to, rows=100, page=1):
+    # Same filters the search page keeps in its #!/... URL
+    return {
+        'q': search_term,
+        'class': 'collection',
+        'rows': rows,
+        'p': page,
+        'sort': 'score desc',
+        'year_from': year_from,
+        'year_to': year_to,
+    }
+
+def _response_docs(response):
+    if response.status_code != 200:
+        raise RDAError(f"registry_object/filter returned status {response.status_code}")
+    try:
+        data = json.loads(response.content)
+    except ValueError as e:
+        raise RDAError(f"registry_object/filter returned invalid JSON: {e}")
+    result = data.get('result') or data.get('response')
+    if not isinstance(result, dict) or 'docs' not in result:
+        raise RDAError("registry_object/filter response has no result docs")
+    return result['docs'], int(result.get('numFound', len(result['docs'])))
+
+def record_url(doc):
+    # Record pages live at /<slug>/<id>
+    if doc.get('slug') and doc.get('id'):
+        return f"{BASE_URL}/{doc['slug']}/{doc['id']}"
+    return f"{BASE_URL}/view/?key={doc.get('key', '')}"
+
+def record_title(doc):
+    title = doc.get('title') or doc.get('display_title') or ''
+    if isinstance(title, list):
+        title = title[0] if title else ''
+    return title.strip()
+
+# Returns the same {'URL', 'Title'} records as scraping the rendered page
+def search(search_term, year_from, year_to, rows=100):
+    results = []
+    page = 1
+    total_pages = 1
+
+    while page <= total_pages:
+        filters = search_filters(search_term, year_from, year_to, rows, page)
+        response = http_client.post(FILTER_URL, json={'filters': filters})
+        docs, found = _response_docs(response)
+        metrics.count('pages_total', portal='researchdata.edu.au')
+        if page == 1:
+            total_pages = max(1, math.ceil(found / rows))
+            metrics.log('api_count', f"researchdata.edu.au API reports {found} records ({total_pages} pages)",
+                        portal='researchdata.edu.au', datasets=found, pages=total_pages)
+
+        for doc in docs:
+            results.append({'URL': record_url(doc), 'Title': record_title(doc)})
+
+        if not docs:
+            break
+        page += 1
+
+    return results
@@ -0,0 +1,243 @@
+import glob
+import itertools
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+import dedup_index
+import metrics
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Append-only stores for scraped results, keyed by portal and search term.
+# 'sqlite'  - one `results` table in a SQLite file, holding a dataset URL
+#             once per portal and search term however often it is re-run
+# 'parquet' - a directory of Parquet files partitioned as
+#             portal=<portal>/search_term=<term>/part-*.parquet
+# The scrapers stream each search's records to the sink page by page as
+# they are scraped (see SearchOutput), so a crash loses at most the page in
+# flight; the TXT, CSV and XLSX files are optional exports written once the
+# search is done. analizeAi can read the URLs straight from either store
+# (see sheet_io.read_chunks).
+
+SINKS = ('sqlite', 'parquet', 'none')
+DEFAULT_PATHS = {'sqlite': 'results.sqlite', 'parquet': 'results_parquet'}
+EXPORT_FORMATS = ('txt', 'csv', 'xlsx')
+EXCEL_MAX_ROWS = 1048575  # sheet rows below the header
+
+COLUMNS = ('portal', 'search_term', 'url', 'title', 'modified', 'released', 'scraped_at')
+
+# The scrapers' record dicts use different keys; map them onto COLUMNS
+def to_rows(portal, search_term, records, scraped_at=None):
+    scraped_at = scraped_at if scraped_at is not None else time.time()
+    return [(
+        portal,
+        search_term,
+        record.get('URL') or record.get('Dataset URL'),
+        record.get('Title'),
+        record.get('Record Modified'),
+        record.get('Record Released'),
+        scraped_at,
+    ) for record in records]
+
+class SQLiteSink:
+    def __init__(self, path=DEFAULT_PATHS['sqlite']):
+        self.location = path
+        # Shared by the crawl orchestrator's worker threads
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.db.execute("""CREATE TABLE IF NOT EXISTS results (
+            portal TEXT NOT NULL,
+            search_term TEXT NOT NULL,
+            url TEXT NOT NULL,
+            title TEXT,
+            modified TEXT,
+            released TEXT,
+            scraped_at REAL
+        )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS results_search ON results (portal, search_term)")
+        if not self.db.execute("SELECT 1 FROM sqlite_master WHERE name = 'results_unique'").fetchone():
+            # Files written before the unique key may hold repeats; the first copy stays
+            self.db.execute("""DELETE FROM results WHERE rowid NOT IN (
+                SELECT MIN(rowid) FROM results GROUP BY portal, search_term, url)""")
+            self.db.execute("CREATE UNIQUE INDEX results_unique ON results (portal, search_term, url)")
+        self.db.commit()
+
+    # Rows an earlier or resumed run already stored are skipped; returns the
+    # number of new rows
+    def write(self, portal, search_term, records):
+        rows = to_rows(portal, search_term, records)
+        with self.lock:
+            before = self.db.total_changes
+            self.db.executemany(f"INSERT OR IGNORE INTO results ({', '.join(COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.commit()
+            return self.db.total_changes - before
+
+    def close(self):
+        self.db.close()
+
+class ParquetSink:
+    def __init__(self, directory=DEFAULT_PATHS['parquet']):
+        if pa is None:
+            raise ImportError("The parquet result sink needs 'pyarrow' installed")
+        self.location = directory
+        # Orders part files written in the same nanosecond
+        self.sequence = itertools.count()
+
+    def partition(self, portal, search_term):
+        return os.path.join(self.location, f"portal={_safe(portal)}", f"search_term={_safe(search_term)}")
+
+    # Every write is a new part file, so nothing already written is touched.
+    # Its name starts with the write time and sequence number, which is the
+    # order the reader returns the files in across all partitions.
+    def write(self, portal, search_term, records):
+        rows = to_rows(portal, search_term, records)
+        if not rows:
+            return 0
+        directory = self.partition(portal, search_term)
+        os.makedirs(directory, exist_ok=True)
+        table = pa.Table.from_pandas(pd.DataFrame(rows, columns=COLUMNS), preserve_index=False)
+        name = f"part-{time.time_ns():020d}-{next(self.sequence):08d}-{uuid.uuid4().hex[:8]}.parquet"
+        path = os.path.join(directory, name)
+        pq.write_table(table, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        return len(rows)
+
+    def close(self):
+        pass
+
+def _safe(value):
+    # Partition directory names can't hold path separators
+    return "".join(c if c.isalnum() or c in " -_." else "_" for c in str(value))
+
+def open_sink(kind, path=None):
+    if kind == 'sqlite':
+        return SQLiteSink(path or DEFAULT_PATHS['sqlite'])
+    if kind == 'parquet':
+        return ParquetSink(path or DEFAULT_PATHS['parquet'])
+    return None
+
+# Where a search's results go: the sink (if any) and which files to export.
+# With a dedup index, datasets written earlier in the run are dropped first.
+class Output:
+    def __init__(self, sink=None, formats=EXPORT_FORMATS, dedup=None):
+        self.sink = sink
+        self.formats = tuple(formats)
+        self.dedup = dedup
+
+    def dedupe(self, records):
+        if self.dedup is None or not records:
+            return records
+        new_records = self.dedup.filter_records(records)
+        if len(new_records) < len(records):
+            metrics.log('duplicates_skipped', f"Skipping {len(records) - len(new_records)} datasets already written this run",
+                        skipped=len(records) - len(new_records))
+        return new_records
+
+    def wants(self, file_format):
+        return file_format in self.formats
+
+    # Returns the number of records stored
+    def write(self, portal, search_term, records):
+        if self.sink is None or not records:
+            return 0
+        return self.sink.write(portal, search_term, records)
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
+        if self.dedup is not None:
+            metrics.log('stage_summary', self.dedup.summary(), stage='dedup')
+            self.dedup.close()
+
+# What the scrapers did before there was a sink: write the files only
+FILES_ONLY = Output()
+
+# One search's records on their way to an Output. Each page's records are
+# deduplicated and stored as soon as they are scraped; the ones kept are
+# collected in `records` for the file exports and the scraper's result.
+class SearchOutput:
+    def __init__(self, output, portal, search_term):
+        self.output = output or FILES_ONLY
+        self.portal = portal
+        self.search_term = search_term
+        self.records = []
+        self.stored = 0
+
+    # Records of pages an earlier, interrupted run already stored: they are
+    # only deduplicated and kept for the exports
+    def resume(self, records):
+        self.records.extend(self.output.dedupe(records))
+
+    # Stores a page's records; returns the ones that weren't duplicates
+    def add(self, records):
+        records = self.output.dedupe(records)
+        self.stored += self.output.write(self.portal, self.search_term, records)
+        self.records.extend(records)
+        return records
+
+    def finish(self):
+        if self.stored:
+            metrics.log('stored', f"Stored {self.stored} records for {self.portal} '{self.search_term}' in "
+                        f"{self.output.sink.location}", portal=self.portal, search_term=self.search_term,
+                        records=self.stored, location=self.output.sink.location)
+        return self.records
+
+# Readers used by sheet_io for analizeAi input: DataFrames with a URL column,
+# in the order the results were stored, after skipping `skip` rows
+
+def is_sink_path(path):
+    return os.path.isdir(path) or os.path.splitext(path)[1].lower() in ('.sqlite', '.db')
+
+def read_url_chunks(path, chunk_rows=1000, skip=0):
+    if os.path.isdir(path):
+        return _read_parquet_urls(path, chunk_rows, skip)
+    return _read_sqlite_urls(path, chunk_rows, skip)
+
+def _read_sqlite_urls(path, chunk_rows, skip):
+    db = sqlite3.connect(path)
+    try:
+        query = "SELECT url AS URL FROM results ORDER BY rowid LIMIT -1 OFFSET ?"
+        for chunk in pd.read_sql_query(query, db, params=(skip,), chunksize=chunk_rows):
+            yield chunk.reset_index(drop=True)
+    finally:
+        db.close()
+
+def _read_parquet_urls(directory, chunk_rows, skip):
+    if pa is None:
+        raise ImportError("Reading a parquet result directory needs 'pyarrow' installed")
+    # Part file names start with their write time and sequence number, so
+    # sorting by file name (not by partition path) gives the write order,
+    # the same order the SQLite sink returns
+    paths = glob.glob(os.path.join(directory, '**', '*.parquet'), recursive=True)
+    for path in sorted(paths, key=os.path.basename):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=['url']):
+            if skip >= batch.num_rows:
+                skip -= batch.num_rows
+                continue
+            chunk = batch.to_pandas().iloc[skip:].rename(columns={'url': 'URL'}).reset_index(drop=True)
+            skip = 0
+            yield chunk
+
+# Command line options shared by the scrapers
+def add_sink_arguments(arg_parser):
+    arg_parser.add_argument('--sink', choices=SINKS, default='sqlite',
+                            help='store results in a SQLite table or a Parquet directory (none: only export files)')
+    arg_parser.add_argument('--sink-path', help='SQLite file or Parquet directory (default: %s)'
+                            % ', '.join(f"{kind} {path}" for kind, path in DEFAULT_PATHS.items()))
+    arg_parser.add_argument('--export', nargs='*', choices=EXPORT_FORMATS, default=None,
+                            help='also write these files per search (default: none, or all with --sink none)')
+    dedup_index.add_dedup_arguments(arg_parser)
+
+def output_from_args(args):
+    sink = open_sink(args.sink, args.sink_path)
+    formats = args.export if args.export is not None else (EXPORT_FORMATS if sink is None else ())
+    return Output(sink, formats, dedup_index.index_from_args(args))
@@ -0,0 +1,214 @@
+import itertools
+import json
+import os
+import shutil
+
+import pandas as pd
+
+import metrics
+import result_sink
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+# Chunked input and checkpointed output for analizeAi. Input sheets are read
+# a chunk of rows at a time (read-only openpyxl for .xlsx, pandas for .csv,
+# pyarrow for .parquet, or the URLs of a result_sink store). Enriched chunks are appended to a write-ahead CSV
+# next to the output file, and a small JSON checkpoint records how many input
+# rows are done, so an interrupted run picks up where it stopped. The final
+# .xlsx or .csv is built from the write-ahead file at the end. CSV cells are
+# read as text both ways, so IDs like 007 keep their leading zeros.
+
+def _extension(path):
+    return os.path.splitext(path)[1].lower()
+
+def _column_names(header):
+    return [name if name is not None else f"Column {i + 1}" for i, name in enumerate(header)]
+
+def _read_xlsx(path, chunk_rows, skip):
+    if openpyxl is None:
+        raise ImportError("Reading .xlsx files needs 'openpyxl' installed")
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _column_names(header)
+        chunk = []
+        for index, row in enumerate(rows):
+            if index < skip:
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield pd.DataFrame(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+def _read_csv(path, chunk_rows, skip):
+    for chunk in pd.read_csv(path, chunksize=chunk_rows, skiprows=range(1, skip + 1), dtype=str):
+        yield chunk.reset_index(drop=True)
+
+def _read_parquet(path, chunk_rows, skip):
+    if pq is None:
+        raise ImportError("Reading .parquet files needs 'pyarrow' installed")
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+        if skip >= batch.num_rows:
+            skip -= batch.num_rows
+            continue
+        chunk = batch.to_pandas().iloc[skip:].reset_index(drop=True)
+        skip = 0
+        yield chunk
+
+def check_input(path):
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Input not found: {path}")
+
+# Iterator of DataFrames of up to chunk_rows input rows, after skipping `skip` rows.
+# A scraper result store (SQLite file or Parquet directory) gives its URLs.
+# The first chunk is read right away, so a missing or unreadable input
+# raises here rather than on the first iteration (and a missing .sqlite
+# isn't created empty).
+def read_chunks(path, chunk_rows=1000, skip=0):
+    check_input(path)
+    chunks = _open_chunks(path, chunk_rows, skip)
+    first = next(chunks, None)
+    if first is None:
+        return iter(())
+    return itertools.chain([first], chunks)
+
+# Column names of the input, also when it has no rows
+def read_columns(path):
+    check_input(path)
+    if result_sink.is_sink_path(path):
+        return ['URL']
+    extension = _extension(path)
+    if extension == '.csv':
+        return list(pd.read_csv(path, nrows=0).columns)
+    if extension == '.parquet':
+        if pq is None:
+            raise ImportError("Reading .parquet files needs 'pyarrow' installed")
+        return list(pq.ParquetFile(path).schema_arrow.names)
+    if openpyxl is None:
+        raise ImportError("Reading .xlsx files needs 'openpyxl' installed")
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        header = next(workbook.active.iter_rows(values_only=True), None)
+    finally:
+        workbook.close()
+    return _column_names(header) if header is not None else []
+
+def _open_chunks(path, chunk_rows, skip):
+    if result_sink.is_sink_path(path):
+        return result_sink.read_url_chunks(path, chunk_rows, skip)
+    extension = _extension(path)
+    if extension == '.csv':
+        return _read_csv(path, chunk_rows, skip)
+    if extension == '.parquet':
+        return _read_parquet(path, chunk_rows, skip)
+    return _read_xlsx(path, chunk_rows, skip)
+
+class CheckpointWriter:
+    def __init__(self, output_path, input_path, resume=True):
+        self.output_path = output_path
+        self.input_path = os.path.abspath(input_path)
+        self.partial_path = output_path + '.partial.csv'
+        self.checkpoint_path = output_path + '.checkpoint.json'
+        self.rows_done = 0
+        self.offset = 0
+
+        if _extension(output_path) not in ('.xlsx', '.csv'):
+            raise ValueError(f"Unsupported output format: {output_path} (use .xlsx or .csv)")
+        # Checked up front rather than when the output is written at the end
+        if _extension(output_path) == '.xlsx' and openpyxl is None:
+            raise ImportError("Writing .xlsx files needs 'openpyxl' installed")
+
+        checkpoint = self._load_checkpoint() if resume else None
+        if checkpoint and checkpoint.get('input') == self.input_path and os.path.exists(self.partial_path):
+            self.rows_done = checkpoint['rows_done']
+            self.offset = checkpoint['offset']
+            # Drop anything written after the last checkpoint
+            with open(self.partial_path, 'r+b') as f:
+                f.truncate(self.offset)
+            metrics.log('resume', f"Resuming after {self.rows_done} rows from checkpoint {self.checkpoint_path}",
+                        rows=self.rows_done, checkpoint=self.checkpoint_path)
+        else:
+            if checkpoint:
+                metrics.log('checkpoint_discarded', f"Checkpoint {self.checkpoint_path} is for another input file, starting over",
+                            level='warning', checkpoint=self.checkpoint_path)
+            self._remove(self.partial_path)
+            self._remove(self.checkpoint_path)
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _remove(self, path):
+        if os.path.exists(path):
+            os.remove(path)
+
+    # Appends a finished chunk and records it in the checkpoint
+    def append(self, df):
+        with open(self.partial_path, 'a', newline='', encoding='utf-8') as f:
+            df.to_csv(f, header=self.offset == 0, index=False)
+            f.flush()
+            os.fsync(f.fileno())
+            self.offset = f.tell()
+        self.rows_done += len(df)
+
+        checkpoint = {'input': self.input_path, 'rows_done': self.rows_done, 'offset': self.offset}
+        temp_path = self.checkpoint_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def _chunks(self, extra, chunk_rows=10000):
+        if self.offset:
+            # As written: no number parsing, and empty cells stay empty strings
+            yield from pd.read_csv(self.partial_path, chunksize=chunk_rows, dtype=str, keep_default_na=False)
+        yield from extra
+
+    # Writes the output file from every checkpointed row followed by the
+    # `extra` chunks (rows not processed in this run). Without any rows the
+    # file still gets a header, made of `columns`. With complete=True the
+    # write-ahead file and checkpoint are removed afterwards.
+    def export(self, extra=(), complete=True, columns=()):
+        if _extension(self.output_path) == '.csv':
+            if self.offset:
+                shutil.copyfile(self.partial_path, self.output_path)
+            header = not self.offset
+            for chunk in extra:
+                chunk.to_csv(self.output_path, mode='w' if header else 'a', header=header, index=False)
+                header = False
+            if header:
+                pd.DataFrame(columns=list(columns)).to_csv(self.output_path, index=False)
+        else:
+            workbook = openpyxl.Workbook(write_only=True)
+            sheet = workbook.create_sheet()
+            header = True
+            for chunk in self._chunks(extra):
+                if header:
+                    sheet.append(list(chunk.columns))
+                    header = False
+                for row in chunk.itertuples(index=False):
+                    sheet.append([None if pd.isna(value) or value == '' else value for value in row])
+            if header and columns:
+                sheet.append(list(columns))
+            workbook.save(self.output_path)
+
+        if complete:
+            self._remove(self.partial_path)
+            self._remove(self.checkpoint_path)
@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+
+import bench_suite
+
+RESULT_FIELDS = {'portal', 'pages', 'records', 'seconds', 'pages_per_second', 'records_per_second',
+                 'peak_rss_mb', 'cpu_seconds'}
+
+# Runs the whole suite the way a user would, with two pages per portal, and
+# checks the baseline it writes
+def test_suite_runs_every_portal_and_writes_a_baseline(tmp_path):
+    baseline_path = str(tmp_path / 'baseline.json')
+    completed = subprocess.run([sys.executable, bench_suite.__file__, '--sizes', '2', '--baseline', baseline_path,
+                                '--save-baseline'], cwd=str(tmp_path), capture_output=True, text=True)
+    assert completed.returncode == 0, completed.stderr
+
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    assert set(baseline['environment']) == {'python', 'platform', 'html_backend', 'cpus'}
+    assert sorted(baseline['results']) == sorted(f"{portal}/2" for portal in bench_suite.PORTALS)
+    for key, result in baseline['results'].items():
+        assert set(result) == RESULT_FIELDS, key
+        assert key == f"{result['portal']}/{result['pages']}"
+        assert result['records'] == 2 * bench_suite.RESULTS_PER_PAGE, key
+        assert result['seconds'] > 0 and result['pages_per_second'] > 0
+        assert {'fetch' if result['portal'] != 'analyzer' else 'llm_request', 'parse', 'other', 'total'} \
+            <= set(result['cpu_seconds']), key
+    # Nothing is written outside the baseline
+    assert os.listdir(str(tmp_path)) == ['baseline.json']
+
+def test_compare_reports_only_real_regressions():
+    baseline = {'seconds': 1.0, 'pages_per_second': 100.0, 'records_per_second': 2000.0, 'peak_rss_mb': 100.0}
+    slower = dict(baseline, pages_per_second=70.0, peak_rss_mb=110.0)
+    assert bench_suite.compare(slower, baseline, 0.2) == ["pages_per_second 100.0 -> 70.0 (-30%)"]
+    # Too short to compare rates
+    quick = dict(slower, seconds=0.01)
+    assert bench_suite.compare(quick, baseline, 0.2) == []
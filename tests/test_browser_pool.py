@@ -0,0 +1,136 @@
+import itertools
+import threading
+import time
+from types import SimpleNamespace
+
+import browser_pool
+import parser_angular
+import portals
+
+# Just enough of a Selenium driver for the pool: window handles, tabs and
+# CDP commands. A crashed driver fails every call.
+class FakeDriver:
+    numbers = itertools.count(1)
+
+    def __init__(self):
+        self.number = next(self.numbers)
+        self.handles = ['home']
+        self.current = 'home'
+        self.tabs_opened = 0
+        self.cdp = []
+        self.crashed = False
+        self.quit_called = False
+        self.switch_to = SimpleNamespace(new_window=self.new_window, window=self.window)
+
+    def check(self):
+        if self.crashed:
+            raise RuntimeError("browser crashed")
+
+    @property
+    def current_window_handle(self):
+        self.check()
+        return self.current
+
+    def new_window(self, kind):
+        self.check()
+        self.tabs_opened += 1
+        self.current = f"tab{self.tabs_opened}"
+        self.handles.append(self.current)
+
+    def window(self, handle):
+        self.check()
+        self.current = handle
+
+    def close(self):
+        self.check()
+        self.handles.remove(self.current)
+
+    def execute_cdp_cmd(self, command, params):
+        self.cdp.append(command)
+
+    def quit(self):
+        self.quit_called = True
+
+def fake_pool(size, started):
+    def factory():
+        driver = FakeDriver()
+        started.append(driver)
+        return driver
+    return browser_pool.BrowserPool(size, driver_factory=factory)
+
+def test_tab_is_opened_and_closed_in_a_borrowed_browser():
+    started = []
+    with fake_pool(2, started) as pool:
+        with pool.tab() as driver:
+            assert driver.current == 'tab1'
+            assert driver.handles == ['home', 'tab1']
+        assert driver.handles == ['home'] and driver.current == 'home'
+        assert driver.cdp == ['Network.enable', 'Network.setBlockedURLs']
+        # Given back and handed out again rather than starting a second one
+        with pool.tab() as again:
+            assert again is driver
+    assert len(started) == 1
+    assert driver.quit_called
+
+def test_browsers_start_on_first_use_up_to_the_size():
+    started = []
+    pool = fake_pool(2, started)
+    assert started == []
+    running = []
+    most_running = []
+    lock = threading.Lock()
+
+    def job(n):
+        with pool.tab() as driver:
+            with lock:
+                running.append(driver)
+                most_running.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.remove(driver)
+        return n * 10
+
+    assert pool.map(job, range(6)) == [0, 10, 20, 30, 40, 50]
+    assert len(started) == 2
+    assert max(most_running) == 2
+    pool.close()
+    assert all(driver.quit_called for driver in started)
+
+def test_crashed_browser_is_replaced():
+    started = []
+    pool = fake_pool(1, started)
+    with pool.tab() as driver:
+        driver.crashed = True
+    assert driver.quit_called
+    with pool.tab() as replacement:
+        assert replacement is not driver
+    assert len(started) == 2
+    assert pool.drivers == [replacement]
+    pool.close()
+
+def test_waiting_job_gets_a_new_browser_when_the_busy_one_crashes():
+    started = []
+    pool = fake_pool(1, started)
+    got = []
+    with pool.tab() as driver:
+        waiter = threading.Thread(target=lambda: got.append(pool._borrow()))
+        waiter.start()
+        time.sleep(0.02)
+        assert got == []
+        driver.crashed = True
+    waiter.join(timeout=1)
+    assert got and got[0] is not driver
+    pool.close()
+
+def test_australia_jobs_share_the_crawl_browser_pool(monkeypatch):
+    pools = []
+
+    def scrape(search_term, year_from, year_to, **kwargs):
+        pools.append(kwargs['pool'])
+        return []
+    monkeypatch.setattr(parser_angular, 'scrape_research_datasets', scrape)
+    shared = fake_pool(2, [])
+    job = {'search_term': 'water', 'year_from': None, 'year_to': None, 'output': 'water'}
+    for _ in range(2):
+        portals.get_driver('au').run(job, None, {'browser_fallback': True, 'browser_pool': shared})
+    assert pools == [shared, shared]
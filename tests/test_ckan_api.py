@@ -0,0 +1,56 @@
+import json
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+import ckan_api
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self.status_code = status_code
+        self.content = json.dumps(data).encode('utf-8')
+
+def page(start, count, rows):
+    names = [f"ds-{n}" for n in range(start, min(start + rows, count))]
+    return FakeResponse({'success': True, 'result': {'count': count, 'results': [{'id': name, 'name': name} for name in names]}})
+
+def query(url):
+    return {key: values[0] for key, values in parse_qs(urlsplit(url).query).items()}
+
+def test_search_url_filters_on_the_year_range():
+    params = query(ckan_api.search_url('data.gov.ie', 'air quality', 2019, 2020, rows=50, start=100))
+    assert params == {'q': 'air quality', 'rows': '50', 'start': '100', 'sort': 'metadata_modified desc',
+                      'fq': 'metadata_modified:[2019-01-01T00:00:00Z TO 2020-12-31T23:59:59Z]'}
+    assert ckan_api.date_filter(None, 2020) == 'metadata_modified:[* TO 2020-12-31T23:59:59Z]'
+    assert 'fq' not in query(ckan_api.search_url('data.gov.ie', 'air'))
+
+def test_package_search_fetches_every_offset(monkeypatch):
+    monkeypatch.setattr(ckan_api.http_client, 'get', lambda url: page(0, 25, 10))
+    requested = []
+
+    def fetch_pages(urls, **kwargs):
+        requested.extend(urls)
+        return [page(int(query(url)['start']), 25, 10) for url in urls]
+
+    monkeypatch.setattr(ckan_api, 'fetch_pages', fetch_pages)
+    packages = ckan_api.package_search('data.gov.ie', 'air', rows=10)
+    assert [package['name'] for package in packages] == [f"ds-{n}" for n in range(25)]
+    assert [query(url)['start'] for url in requested] == ['10', '20']
+
+@pytest.mark.parametrize('response', [
+    FakeResponse({}, status_code=500),
+    FakeResponse({'success': False, 'error': {'message': 'bad query'}}),
+])
+def test_api_errors_raise(monkeypatch, response):
+    monkeypatch.setattr(ckan_api.http_client, 'get', lambda url: response)
+    with pytest.raises(ckan_api.CKANError):
+        ckan_api.package_search('data.gov.ie', 'air')
+
+def test_records_in_the_html_scrapers_shapes():
+    package = {'id': 'abc', 'name': 'air-quality', 'title': 'Qualité de l’air',
+               'title_translated': {'en': 'Air quality', 'fr': 'Qualité de l’air'},
+               'metadata_modified': '2024-01-05T10:20:30.123456', 'metadata_created': '2019-06-12T00:00:00'}
+    assert ckan_api.to_titled_records('data.gov.ie', [package]) == [{'URL': 'https://data.gov.ie/dataset/air-quality', 'Title': 'Air quality'}]
+    assert ckan_api.to_canada_records([package]) == [{
+        'Title': 'Air quality', 'Dataset URL': 'https://open.canada.ca/data/en/dataset/abc',
+        'Record Modified': 'Jan 05, 2024', 'Record Released': 'Jun 12, 2019'}]
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+import crawl
+import portals
+
+class FakeDriver(portals.PortalDriver):
+    def __init__(self, name, max_concurrency, running, most_running, lock):
+        self.name = self.portal = name
+        self.max_concurrency = max_concurrency
+        self.running = running
+        self.most_running = most_running
+        self.lock = lock
+
+    def run(self, job, state, options):
+        with self.lock:
+            self.running[self.name] += 1
+            self.running['all'] += 1
+            for key in (self.name, 'all'):
+                self.most_running[key] = max(self.most_running[key], self.running[key])
+        try:
+            time.sleep(0.02)
+            if job['search_term'] == 'broken':
+                raise RuntimeError("portal down")
+            return [{'URL': f"https://{self.name}.test/{job['search_term']}"}]
+        finally:
+            with self.lock:
+                self.running[self.name] -= 1
+                self.running['all'] -= 1
+
+@pytest.fixture
+def drivers(monkeypatch):
+    running, most_running, lock = Counter(), Counter(), threading.Lock()
+    fake = {name: FakeDriver(name, limit, running, most_running, lock) for name, limit in (('slow', 1), ('fast', 3))}
+    monkeypatch.setattr(portals, 'DRIVERS', fake)
+    return most_running
+
+def jobs(portal, count):
+    return [crawl._job({'portal': portal, 'search_term': f"term {n}"}, n) for n in range(count)]
+
+def test_jobs_respect_worker_and_portal_limits(drivers):
+    progress = crawl.run_jobs(jobs('slow', 4) + jobs('fast', 8), workers=4)
+    assert (progress.done, progress.failed, progress.records) == (12, 0, 12)
+    assert drivers['slow'] == 1
+    assert drivers['fast'] == 3
+    assert drivers['all'] == 4
+
+def test_portal_limit_override(drivers):
+    crawl.run_jobs(jobs('fast', 6), workers=4, limits={'fast': 1})
+    assert drivers['fast'] == 1
+
+def test_failed_job_does_not_stop_the_others(drivers):
+    failing = crawl._job({'portal': 'fast', 'search_term': 'broken'}, 0)
+    progress = crawl.run_jobs([failing] + jobs('fast', 3), workers=2)
+    assert (progress.done, progress.failed, progress.records) == (4, 1, 3)
+    assert progress.per_portal == {'fast': 3}
+
+def test_load_jobs_from_csv_and_json(tmp_path):
+    csv_path = tmp_path / 'jobs.csv'
+    csv_path.write_text("portal,search_term,year_from,year_to,output\nuk,Water Quality,2020,,\n")
+    json_path = tmp_path / 'jobs.json'
+    json_path.write_text('[{"portal": "ca", "search_term": "air", "output": "air_ca"}]')
+    assert crawl.load_jobs(str(csv_path)) == [{'portal': 'uk', 'search_term': 'Water Quality', 'year_from': 2020,
+                                               'year_to': None, 'output': 'uk_water_quality'}]
+    assert crawl.load_jobs(str(json_path))[0]['output'] == 'air_ca'
+
+def test_bad_jobs_and_limits_are_rejected(tmp_path):
+    path = tmp_path / 'jobs.json'
+    path.write_text('[{"portal": "nowhere", "search_term": "air"}]')
+    with pytest.raises(ValueError):
+        crawl.load_jobs(str(path))
+    with pytest.raises(ValueError):
+        crawl._job({'portal': 'uk'}, 1)
+    assert crawl.parse_limits(['uk=3', 'ca=0']) == {'uk': 3, 'ca': 1}
+
+def test_driver_without_run_cannot_be_created():
+    class Incomplete(portals.PortalDriver):
+        name = 'incomplete'
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,159 @@
+import os
+
+import pytest
+
+import crawl_checkpoint
+import date_filter
+import metrics
+import parser
+import parser_can
+import result_sink
+
+PORTAL = 'example.test'
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(metrics, 'sleep', lambda seconds, reason: None)
+
+@pytest.fixture
+def store(tmp_path):
+    store = crawl_checkpoint.CheckpointStore(str(tmp_path / 'checkpoint.sqlite'), page_retries=2)
+    yield store
+    store.close()
+
+def reopen(store, **kwargs):
+    store.close()
+    return crawl_checkpoint.CheckpointStore(store.path, **kwargs)
+
+def test_interrupted_search_resumes_after_last_page(store):
+    progress = crawl_checkpoint.search_checkpoint(store, PORTAL, 'water')
+    assert not progress.resumed
+    progress.page_done(1, [['a', 1]], total_pages=3)
+    progress.page_done(2, [['b', 2]])
+
+    store = reopen(store)
+    progress = crawl_checkpoint.search_checkpoint(store, PORTAL, 'water')
+    assert progress.resumed
+    assert progress.last_page == 2
+    assert progress.total_pages == 3
+    assert progress.records() == [['a', 1], ['b', 2]]
+    assert not progress.paged_through()
+    progress.page_done(3, [['c', 3]])
+    assert progress.paged_through()
+    store.close()
+
+def test_restart_ignores_the_checkpoint(store):
+    crawl_checkpoint.search_checkpoint(store, PORTAL, 'water').page_done(1, [['a', 1]], total_pages=3)
+    store = reopen(store, restart=True)
+    progress = crawl_checkpoint.search_checkpoint(store, PORTAL, 'water')
+    assert not progress.resumed
+    assert progress.records() == []
+    store.close()
+
+def test_retry_queue_gives_up_after_page_retries(store):
+    progress = crawl_checkpoint.search_checkpoint(store, PORTAL, 'water')
+    progress.page_failed(4, 'http://example.test/?page=4', 'timeout')
+    progress.page_failed(2, 'http://example.test/?page=2', 'timeout')
+    attempts = []
+    for page, url in progress.retry_queue():
+        attempts.append(page)
+        if page == 2 and attempts.count(2) == 1:
+            progress.page_done(page, [])
+        else:
+            progress.page_failed(page, url, 'timeout')
+    assert attempts == [2, 4, 4]
+    assert sorted(progress.failed) == [4]
+
+def test_failed_pages_are_retried_next_run(store):
+    progress = crawl_checkpoint.search_checkpoint(store, PORTAL, 'water')
+    progress.page_done(1, [], total_pages=2)
+    progress.page_failed(2, 'http://example.test/?page=2', 'timeout')
+    progress.finish()
+
+    store = reopen(store)
+    progress = crawl_checkpoint.search_checkpoint(store, PORTAL, 'water')
+    assert progress.paged_through()
+    retries = progress.retry_queue()
+    assert next(retries) == (2, 'http://example.test/?page=2')
+    progress.page_done(2, [])
+    assert next(retries, None) is None
+    progress.finish()
+    # Nothing left to retry: the checkpoint is gone
+    assert not crawl_checkpoint.search_checkpoint(store, PORTAL, 'water').resumed
+    store.close()
+
+class FakeResponse:
+    def __init__(self, status_code, text=''):
+        self.status_code = status_code
+        self.text = text
+
+def fake_get(statuses, requested):
+    with open(os.path.join(FIXTURES, 'uk_last_page.html'), encoding='utf-8') as f:
+        html = f.read()
+
+    def get(url, **kwargs):
+        requested.append(url)
+        return FakeResponse(statuses.pop(0) if statuses else 200, html)
+    return get
+
+def test_failed_first_page_is_retried(store, monkeypatch):
+    requested = []
+    monkeypatch.setattr(parser.http_client, 'get', fake_get([503], requested))
+    datasets = parser.scrape_datasets('water', None, checkpoints=store)
+    assert datasets == [{'URL': 'https://www.data.gov.uk/dataset/river-levels/river-levels'}]
+    assert len(requested) == 2
+    # Finished with nothing left to retry
+    progress = crawl_checkpoint.search_checkpoint(store, parser.PORTAL, f"water {date_filter.DateFilter(None, None).describe()}")
+    assert not progress.resumed and not progress.failed
+
+def test_first_page_failing_every_retry_resumes_next_run(store, monkeypatch):
+    requested = []
+    monkeypatch.setattr(parser.http_client, 'get', fake_get([503, 503, 503], requested))
+    assert parser.scrape_datasets('water', None, checkpoints=store) == []
+    assert len(requested) == 3
+
+    progress = crawl_checkpoint.search_checkpoint(store, parser.PORTAL, f"water {date_filter.DateFilter(None, None).describe()}")
+    assert sorted(progress.failed) == [1]
+    assert not progress.done
+
+    datasets = parser.scrape_datasets('water', None, checkpoints=store)
+    assert datasets == [{'URL': 'https://www.data.gov.uk/dataset/river-levels/river-levels'}]
+
+def fake_canada_pages(failures, requested):
+    def parse_page(page_url):
+        requested.append(page_url)
+        page = int(page_url.rsplit('=', 1)[1])
+        if failures.get(page):
+            failures[page] -= 1
+            return [], None
+        return [{'Title': f"T{page}", 'Dataset URL': f"https://ca.example/{page}",
+                 'Record Modified': '2024-01-01', 'Record Released': '2020-01-01'}], object()
+    return parse_page
+
+def test_canada_failed_first_page_is_retried_and_paging_continues(store, monkeypatch):
+    requested = []
+    monkeypatch.setattr(parser_can, 'parse_page', fake_canada_pages({1: 1}, requested))
+    monkeypatch.setattr(parser_can, 'get_total_pages', lambda soup: 3)
+    records = parser_can.scrape_search_term('water', 'water', output=result_sink.Output(formats=()), checkpoints=store)
+    assert [record['Dataset URL'] for record in records] == [f"https://ca.example/{page}" for page in (1, 2, 3)]
+    assert [int(url.rsplit('=', 1)[1]) for url in requested] == [1, 1, 2, 3]
+    progress = crawl_checkpoint.search_checkpoint(store, parser_can.PORTAL,
+                                                  f"water {date_filter.DateFilter(None, None).describe()}")
+    assert not progress.resumed and not progress.failed
+
+# Parse pool stand-in: every page comes back as the given response
+class FailingPool:
+    def __init__(self, response):
+        self.response = response
+
+    def pipeline(self, urls, fn, args=(), fetch_kwargs=None):
+        return ((url, self.response, None) for url in urls)
+
+def test_canada_pipeline_records_why_a_page_failed(store):
+    progress = crawl_checkpoint.search_checkpoint(store, parser_can.PORTAL, 'water')
+    response = type('Response', (), {'status_code': 503})()
+    parser_can.pipeline_pages('https://ca.example/?page=', 2, 2, [], date_filter.DateFilter(), None, 'water',
+                              FailingPool(response), progress)
+    error = store.db.execute("SELECT error FROM failed_pages WHERE page = 2").fetchone()[0]
+    assert error == "status code 503"
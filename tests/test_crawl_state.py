@@ -0,0 +1,35 @@
+import crawl_state
+import parser
+
+def test_only_new_or_changed_entries_are_emitted(tmp_path):
+    state = crawl_state.CrawlState(str(tmp_path / 'state.sqlite'))
+    state.mark_seen('data.gov.uk', 'water', [('u1', '1 March 2024'), ('u2', '2 March 2024')], '2 March 2024')
+
+    new, all_known = state.filter_new('data.gov.uk', 'water', [('u3', '3 March 2024'), ('u2', '5 March 2024'), ('u1', '1 March 2024')])
+    assert new == [('u3', '3 March 2024'), ('u2', '5 March 2024')]
+    assert not all_known
+    assert state.filter_new('data.gov.uk', 'water', [('u1', '1 March 2024')]) == ([], True)
+    # An empty page doesn't mean the crawl reached known datasets
+    assert state.filter_new('data.gov.uk', 'water', []) == ([], False)
+    # State is kept per portal and search term
+    assert state.filter_new('data.gov.uk', 'air', [('u1', '1 March 2024')])[1] is False
+    state.close()
+
+def test_newest_modified_survives_runs_without_new_entries(tmp_path):
+    path = str(tmp_path / 'state.sqlite')
+    state = crawl_state.CrawlState(path)
+    state.mark_seen('data.gov.uk', 'water', [('u1', '1 March 2024')], '1 March 2024')
+    state.close()
+    state = crawl_state.CrawlState(path)
+    state.mark_seen('data.gov.uk', 'water', [])
+    assert state.newest_modified('data.gov.uk', 'water') == '1 March 2024'
+    state.close()
+
+def test_incremental_crawl_stops_at_a_known_page(tmp_path):
+    state = crawl_state.CrawlState(str(tmp_path / 'state.sqlite'))
+    state.mark_seen(parser.PORTAL, 'water None', [('u1', 'd1'), ('u2', 'd2')])
+    entries = []
+    assert not parser.collect_page(entries, [('u0', 'd0'), ('u1', 'd1')], state, 'water None')
+    assert parser.collect_page(entries, [('u2', 'd2')], state, 'water None')
+    assert entries == [('u0', 'd0')]
+    state.close()
@@ -0,0 +1,33 @@
+import numpy as np
+
+import date_filter
+
+def test_portal_date_formats_parse():
+    dates = date_filter.parse_dates('test-formats', ['12 March 2024', 'Mar 5, 2021', 'June 2019', '2018', '2017-01-31', 'soon', None])
+    assert list(dates.dt.year.iloc[:5]) == [2024, 2021, 2019, 2018, 2017]
+    assert dates.iloc[5:].isna().all()
+
+def test_format_that_worked_is_tried_first():
+    date_filter.parse_dates('test-remember', ['2020-01-01', '2021-02-02', '3 March 2022'])
+    assert date_filter._portal_formats['test-remember'] == '%Y-%m-%d'
+
+def test_year_range_keeps_dates_inside_it():
+    keep, passed = date_filter.DateFilter(2020, 2022).check('test-range', ['2023-01-01', '2022-06-01', '2020-01-01', 'unknown'])
+    assert keep.tolist() == [False, True, True, False]
+    assert not passed
+
+def test_newest_first_page_past_the_range():
+    keep, passed = date_filter.DateFilter(2020).check('test-passed', ['2021-01-01', '2019-12-31'])
+    assert keep.tolist() == [True, False]
+    assert passed
+    # Only the oldest parsed date counts
+    assert not date_filter.DateFilter(2020).check('test-passed', ['2019-12-31', '2021-01-01', 'unknown'])[1]
+    # Results in any other order never end the crawl
+    assert not date_filter.DateFilter(2020, newest_first=False).check('test-passed', ['2021-01-01', '2019-12-31'])[1]
+
+def test_open_ranges_and_descriptions():
+    assert not date_filter.DateFilter().active()
+    assert date_filter.DateFilter().describe() == "any year"
+    assert date_filter.DateFilter(2020, 2020).describe() == "2020"
+    assert date_filter.DateFilter(None, 2020).describe() == "...-2020"
+    assert np.array_equal(date_filter.DateFilter(None, 2020).check('test-open', ['2019', '2021'])[0], [True, False])
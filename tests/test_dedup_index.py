@@ -0,0 +1,85 @@
+import dedup_index
+import result_sink
+
+def test_canonical_url_drops_url_noise():
+    canonical = dedup_index.canonical_url("https://data.gov.ie/dataset/air-quality")
+    assert dedup_index.canonical_url("http://www.data.gov.ie/en/dataset/air-quality/") == canonical
+    assert dedup_index.canonical_url("https://data.gov.ie/dataset/air-quality?utm_source=feed&fbclid=x#resources") == canonical
+
+def test_canonical_url_keeps_identifying_query():
+    assert (dedup_index.canonical_url("https://example.org/view?b=2&a=1")
+            == dedup_index.canonical_url("https://example.org/view?a=1&b=2"))
+    assert (dedup_index.canonical_url("https://example.org/view?id=1")
+            != dedup_index.canonical_url("https://example.org/view?id=2"))
+
+def test_url_and_title_duplicates(tmp_path):
+    index = dedup_index.DedupIndex(str(tmp_path / 'dedup.sqlite'))
+    first = "https://data.gov.uk/dataset/water-quality"
+    assert index.add(first, "Water quality monitoring of rivers and lakes in England") is None
+    assert index.add("http://www.data.gov.uk/dataset/water-quality/") == first
+    assert index.add("https://mirror.example/water", "Water quality monitoring of rivers and lakes in England") == first
+    assert index.add("https://data.gov.uk/dataset/traffic", "Road traffic accident statistics by region") is None
+    # Short titles are too generic to match on
+    assert index.add("https://data.gov.uk/dataset/a", "Census data") is None
+    assert index.add("https://data.gov.uk/dataset/b", "Census data") is None
+    assert (index.url_duplicates, index.title_duplicates) == (1, 1)
+    index.close()
+
+def test_title_threshold_zero_compares_urls_only(tmp_path):
+    index = dedup_index.DedupIndex(str(tmp_path / 'dedup.sqlite'), title_threshold=0)
+    title = "Water quality monitoring of rivers and lakes in England"
+    assert index.add("https://a.example/1", title) is None
+    assert index.add("https://b.example/1", title) is None
+    index.close()
+
+def test_index_is_scoped_to_one_run(tmp_path):
+    path = str(tmp_path / 'dedup.sqlite')
+    records = [{'URL': "https://data.gov.uk/dataset/a"}, {'URL': "https://data.gov.uk/dataset/a/"}]
+    index = dedup_index.DedupIndex(path)
+    assert index.filter_records(records) == records[:1]
+    index.close()
+
+    # A re-run writes (and exports) the datasets again
+    index = dedup_index.DedupIndex(path)
+    assert index.filter_records(records) == records[:1]
+    index.close()
+
+def test_output_dedupes_across_searches(tmp_path):
+    sink = result_sink.SQLiteSink(str(tmp_path / 'results.sqlite'))
+    output = result_sink.Output(sink, (), dedup_index.DedupIndex(str(tmp_path / 'dedup.sqlite')))
+    uk = [{'URL': "https://data.gov.uk/dataset/a"}, {'URL': "https://data.gov.uk/dataset/b"}]
+    ca = [{'Dataset URL': "https://www.data.gov.uk/dataset/b", 'Title': "B"}, {'Dataset URL': "https://open.canada.ca/c"}]
+    output.write('data.gov.uk', 'water', output.dedupe(uk))
+    output.write('open.canada.ca', 'water', output.dedupe(ca))
+    output.close()
+
+    urls = [url for chunk in result_sink.read_url_chunks(sink.location) for url in chunk['URL']]
+    assert urls == ["https://data.gov.uk/dataset/a", "https://data.gov.uk/dataset/b", "https://open.canada.ca/c"]
+
+def test_cross_host_titles_can_need_a_stricter_match(tmp_path):
+    index = dedup_index.DedupIndex(str(tmp_path / 'dedup.sqlite'), cross_host_threshold=1.0)
+    title = "Water quality monitoring of rivers and lakes in England"
+    assert index.add("https://data.gov.uk/dataset/water", title) is None
+    # Near-identical titles match on the same host only; identical ones anywhere
+    near = "Water quality monitoring of rivers and lakes in England 2020"
+    assert index.add("https://data.gov.uk/dataset/water-2020", near) == "https://data.gov.uk/dataset/water"
+    assert index.add("https://mirror.example/water-2020", near) is None
+    assert index.add("https://mirror.example/water", title) == "https://data.gov.uk/dataset/water"
+    index.close()
+
+def test_waiting_rows_get_a_validated_answer():
+    waiting = dedup_index.WaitingDuplicates()
+    waiting.wait("https://a.example/1", (3, "https://b.example/1", {}))
+    assert waiting.answered("https://a.example/1", "Water", "Environment") == [(3, "https://b.example/1", {})]
+    assert waiting.answer("https://a.example/1") == ("Water", "Environment")
+    assert waiting.release() == []
+
+def test_waiting_rows_are_released_when_the_first_copy_fails():
+    waiting = dedup_index.WaitingDuplicates()
+    waiting.wait("https://a.example/1", (3, "https://b.example/1", {}))
+    waiting.wait("https://a.example/2", (4, "https://b.example/2", {}))
+    # The first copy's answer didn't validate; the other one never came
+    assert waiting.answered("https://a.example/1", "Water", None) == []
+    assert waiting.answer("https://a.example/1") is None
+    assert waiting.release() == [(3, "https://b.example/1", {}), (4, "https://b.example/2", {})]
+    assert waiting.release() == []
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+
+import fetcher
+
+class Recorder:
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.most_in_flight = {}
+        self.started = []
+
+    # Stands in for AsyncFetcher._get (a bound method, so no fetcher argument)
+    def get(self, url):
+        host = url.split('/')[2]
+        with self.lock:
+            self.started.append((time.monotonic(), url))
+            self.in_flight[host] = self.in_flight.get(host, 0) + 1
+            self.most_in_flight[host] = max(self.most_in_flight.get(host, 0), self.in_flight[host])
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight[host] -= 1
+        if url.endswith('/fail'):
+            raise ConnectionError(url)
+        return url.upper()
+
+def test_results_keep_url_order_with_errors_in_place(monkeypatch):
+    recorder = Recorder()
+    monkeypatch.setattr(fetcher.AsyncFetcher, '_get', recorder.get)
+    urls = ["http://a.test/1", "http://a.test/fail", "http://b.test/3"]
+    results = fetcher.fetch_pages(urls, max_per_host=2, rate=1000)
+    assert results[0] == "HTTP://A.TEST/1" and results[2] == "HTTP://B.TEST/3"
+    assert isinstance(results[1], ConnectionError)
+
+def test_concurrency_is_limited_per_host(monkeypatch):
+    recorder = Recorder()
+    monkeypatch.setattr(fetcher.AsyncFetcher, '_get', recorder.get)
+    urls = [f"http://{host}.test/{n}" for n in range(8) for host in ('a', 'b')]
+    fetcher.fetch_pages(urls, max_per_host=2, rate=1000, burst=1000)
+    assert recorder.most_in_flight == {'a.test': 2, 'b.test': 2}
+
+def test_requests_are_rate_limited_per_host(monkeypatch):
+    recorder = Recorder(delay=0)
+    monkeypatch.setattr(fetcher.AsyncFetcher, '_get', recorder.get)
+    started = time.monotonic()
+    fetcher.fetch_pages([f"http://a.test/{n}" for n in range(5)], max_per_host=5, rate=20, burst=1)
+    # One request right away, then one every 1/20 s
+    assert time.monotonic() - started >= 4 / 20 * 0.9
+
+def test_token_bucket_allows_a_burst():
+    bucket = fetcher.TokenBucket(rate=1, capacity=3)
+
+    async def take(count):
+        for _ in range(count):
+            await bucket.acquire()
+
+    started = time.monotonic()
+    asyncio.run(take(3))
+    assert time.monotonic() - started < 0.5
+
+def test_stopped_fetch_is_skipped(monkeypatch):
+    recorder = Recorder()
+    monkeypatch.setattr(fetcher.AsyncFetcher, '_get', recorder.get)
+    stop = threading.Event()
+    stop.set()
+    assert asyncio.run(fetcher.AsyncFetcher().fetch("http://a.test/1", stop)) is None
+    assert recorder.started == []
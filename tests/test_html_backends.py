@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+import date_filter
+import html_backend
+import parser
+import parser_angular
+import parser_can
+
+# Search result pages with the edge cases the scrapers have to handle:
+# results without links or metadata, relative and absolute hrefs, entities,
+# nested markup, comments and pagination variants. Both backends must give
+# the same records, and those records are pinned here.
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+AU_BASE_URL = 'https://researchdata.edu.au'
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+@pytest.fixture(params=html_backend.BACKENDS)
+def backend(request):
+    previous = html_backend.get_backend()
+    html_backend.set_backend(request.param)
+    yield request.param
+    html_backend.set_backend(previous)
+
+def test_uk_search_page(backend):
+    entries, found, total_pages, next_href, passed = parser.extract_page(
+        read_fixture('uk_search.html'), parser.BASE_URL, date_filter.DateFilter(None, None))
+    assert entries == [
+        ('https://www.data.gov.uk/dataset/river-levels/river-levels', '12 March 2024'),
+        ('https://example.org/external-dataset', 'Unknown'),
+        ('https://www.data.gov.uk/dataset/bus-stops', '3 February 2023'),
+    ]
+    assert found == 5
+    assert total_pages == 7
+    assert next_href == '/search?q=water&page=3'
+    assert not passed
+
+def test_ca_search_page(backend):
+    datasets, total_pages, has_next = parser_can.extract_page(read_fixture('ca_search.html'))
+    assert datasets == [
+        {"Title": "Greenhouse gasemissions& sinks", "Dataset URL": "https://open.canada.ca/data/en/dataset/ghg",
+         "Record Modified": "2024-03-05", "Record Released": "2019-06-12"},
+        {"Title": "Relative link", "Dataset URL": "/data/en/dataset/relative",
+         "Record Modified": "2023-11-30", "Record Released": "2020-01-02"},
+    ]
+    assert total_pages == 12
+    assert has_next
+
+def test_au_search_page(backend):
+    results, next_page = parser_angular.parse_results(read_fixture('au_search.html'), AU_BASE_URL)
+    assert results == [
+        {'URL': 'https://researchdata.edu.au/coastal-sediment-cores/123', 'Title': 'Coastal sediment cores'},
+        {'URL': 'https://researchdata.edu.au/ocean-temperature/456', 'Title': 'Ocean temperature & salinity'},
+    ]
+    assert next_page == '3'
+
+def test_au_last_page(backend):
+    results, next_page = parser_angular.parse_results(read_fixture('au_last_page.html'), AU_BASE_URL)
+    assert results == [{'URL': 'https://researchdata.edu.au/last-record/1', 'Title': 'Last record'}]
+    assert next_page is None
+
+@pytest.mark.parametrize('name, extract', [
+    ('uk_search.html', lambda html: parser.extract_page(html, parser.BASE_URL, date_filter.DateFilter(None, None))),
+    ('ca_search.html', parser_can.extract_page),
+    ('au_search.html', lambda html: parser_angular.parse_results(html, AU_BASE_URL)),
+])
+def test_backends_agree(name, extract):
+    html = read_fixture(name)
+    previous = html_backend.get_backend()
+    try:
+        html_backend.set_backend('bs4')
+        expected = extract(html)
+        html_backend.set_backend('lxml')
+        assert extract(html) == expected
+    finally:
+        html_backend.set_backend(previous)
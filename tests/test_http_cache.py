@@ -0,0 +1,102 @@
+import io
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import http_cache
+
+def make_response(body, status=200, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = body
+    response.headers = CaseInsensitiveDict(headers or {})
+    response.encoding = 'utf-8'
+    return response
+
+def test_hit_within_ttl(tmp_path):
+    cache = http_cache.HTTPCache(str(tmp_path))
+    calls = []
+    fetch = lambda conditional: calls.append(conditional) or make_response(b'page')
+    assert cache.get('http://a.test/', fetch).content == b'page'
+    assert cache.get('http://a.test/', fetch).from_cache
+    assert len(calls) == 1
+
+def test_revalidates_with_etag(tmp_path):
+    cache = http_cache.HTTPCache(str(tmp_path), ttl=0)
+    cache.get('http://a.test/', lambda conditional: make_response(b'page', headers={'ETag': '"v1"'}))
+    sent = []
+
+    def not_modified(conditional):
+        sent.append(conditional)
+        return make_response(b'', status=304)
+    response = cache.get('http://a.test/', not_modified)
+    assert sent == [{'If-None-Match': '"v1"'}]
+    assert response.content == b'page'
+    assert cache.stats()['revalidated'] == 1
+
+def test_offline_miss(tmp_path):
+    cache = http_cache.HTTPCache(str(tmp_path), offline=True)
+    assert cache.get('http://a.test/', lambda conditional: make_response(b'page')).status_code == 504
+
+def test_changed_page_replaces_its_old_body(tmp_path):
+    cache = http_cache.HTTPCache(str(tmp_path), ttl=0)
+    cache.get('http://a.test/', lambda conditional: make_response(b'first version'))
+    cache.get('http://a.test/', lambda conditional: make_response(b'second version'))
+    bodies = cache.db.execute("SELECT body_hash FROM bodies").fetchall()
+    assert len(bodies) == 1
+    assert cache._lookup('http://a.test/')['body'] == b'second version'
+    assert len(list((tmp_path / 'bodies').rglob('*.z'))) == 1
+
+def test_shared_body_is_kept_while_used(tmp_path):
+    cache = http_cache.HTTPCache(str(tmp_path), ttl=0)
+    cache.get('http://a.test/1', lambda conditional: make_response(b'same'))
+    cache.get('http://a.test/2', lambda conditional: make_response(b'same'))
+    cache.get('http://a.test/1', lambda conditional: make_response(b'new'))
+    assert cache._lookup('http://a.test/2')['body'] == b'same'
+
+def test_eviction_keeps_the_cache_under_its_limit(tmp_path):
+    cache = http_cache.HTTPCache(str(tmp_path), max_size=3000)
+    for n in range(20):
+        body = bytes(range(256)) * 4 + str(n).encode()
+        cache.get(f'http://a.test/{n}', lambda conditional: make_response(body))
+    total = cache.db.execute("SELECT SUM(size) FROM bodies").fetchone()[0]
+    assert total <= 3000
+    assert cache._lookup('http://a.test/19') is not None
+    assert cache._lookup('http://a.test/0') is None
+
+# A streamed response whose body can only be read in chunks, like one that
+# is still on the wire
+class Streamed(requests.Response):
+    def __init__(self, body):
+        super().__init__()
+        self.status_code = 200
+        self.encoding = 'utf-8'
+        self.raw = io.BytesIO(body)
+        self.chunks = [body[start:start + 4] for start in range(0, len(body), 4)]
+
+    @property
+    def content(self):
+        raise AssertionError("cache read the whole streamed body")
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        yield from self.chunks
+
+def test_streamed_response_caches_what_was_read(tmp_path):
+    cache = http_cache.HTTPCache(str(tmp_path))
+    response = cache.get('http://a.test/', lambda conditional: Streamed(b'header body footer'), streamed=True)
+    assert next(response.iter_content()) == b'head'
+    assert cache._lookup('http://a.test/') is None
+    response.close()
+    assert cache._lookup('http://a.test/')['body'] == b'head'
+
+    # Served to a reader that stops at the same point, not to a full read
+    assert cache.get('http://a.test/', None, streamed=True).content == b'head'
+    assert cache.get('http://a.test/', lambda conditional: make_response(b'whole page')).content == b'whole page'
+
+def test_streamed_response_read_to_the_end_is_complete(tmp_path):
+    cache = http_cache.HTTPCache(str(tmp_path))
+    response = cache.get('http://a.test/', lambda conditional: Streamed(b'short page'), streamed=True)
+    assert b''.join(response.iter_content()) == b'short page'
+    response.close()
+    response.close()
+    assert cache.get('http://a.test/', None).content == b'short page'
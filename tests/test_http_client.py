@@ -0,0 +1,119 @@
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+import urllib3.util.retry
+
+import http_client
+
+# Answers every request with the next (status, headers) from server.replies,
+# then with 200 once they run out
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def reply(self):
+        self.server.requests.append((self.command, self.path))
+        status, headers = self.server.replies.pop(0) if self.server.replies else (200, {})
+        body = b'ok'
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.reply()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.reply()
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    server.replies = []
+    server.requests = []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    http_client.configure()
+    yield server
+    http_client.configure()
+    server.shutdown()
+    server.server_close()
+
+# Records the waits urllib3 would make between retries instead of sleeping
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(urllib3.util.retry, 'time', SimpleNamespace(sleep=sleeps.append, time=time.time))
+    return sleeps
+
+def test_pool_size_per_host():
+    session = http_client.create_session()
+    assert session.get_adapter('https://search.open.canada.ca/opendata/')._pool_maxsize == 4
+    assert session.get_adapter('https://www.data.gov.uk/search')._pool_maxsize == 8
+    assert session.get_adapter('https://unknown.example/')._pool_maxsize == http_client.DEFAULT_POOL_SIZE
+    session.close()
+
+def test_configured_pool_size_applies_to_the_new_session(monkeypatch):
+    monkeypatch.setitem(http_client.HOST_POOL_SIZES, 'data.example', 2)
+    http_client.configure(pool_sizes={'data.example': 3})
+    try:
+        assert http_client.get_session().get_adapter('https://data.example/')._pool_maxsize == 3
+    finally:
+        http_client.configure()
+
+def test_command_line_options_configure_the_session(monkeypatch):
+    for name in ('DEFAULT_TIMEOUT', 'DEFAULT_POOL_SIZE', 'MAX_RETRIES'):
+        monkeypatch.setattr(http_client, name, getattr(http_client, name))
+    monkeypatch.setattr(http_client, 'HOST_POOL_SIZES', dict(http_client.HOST_POOL_SIZES))
+    arg_parser = argparse.ArgumentParser()
+    http_client.add_connection_arguments(arg_parser)
+    try:
+        http_client.configure_from_args(arg_parser.parse_args(['--timeout', '3', '--pool-size', '2', '--max-retries', '1']))
+        assert http_client.DEFAULT_TIMEOUT == (3, 3)
+        session = http_client.get_session()
+        assert session.get_adapter('https://www.data.gov.uk/search')._pool_maxsize == 2
+        assert session.get_adapter('https://unknown.example/')._pool_maxsize == 2
+        assert session.get_adapter('https://unknown.example/').max_retries.total == 1
+    finally:
+        http_client.configure()
+
+def test_429_is_retried_after_retry_after(server, sleeps):
+    server.replies = [(429, {'Retry-After': '3'}), (503, {'Retry-After': '1'})]
+    before = http_client.connection_stats()
+    response = http_client.get(f"{server.url}/search?page=1")
+    assert response.status_code == 200
+    assert len(server.requests) == 3
+    assert sleeps == [3.0, 1.0]
+    assert http_client.connection_stats()['retries'] - before['retries'] == 2
+
+def test_gives_up_after_max_retries(server, sleeps):
+    server.replies = [(503, {})] * (http_client.MAX_RETRIES + 2)
+    response = http_client.get(f"{server.url}/search")
+    assert response.status_code == 503
+    assert len(server.requests) == http_client.MAX_RETRIES + 1
+
+def test_post_is_retried(server, sleeps):
+    server.replies = [(503, {'Retry-After': '2'})]
+    response = http_client.post(f"{server.url}/api", json={'filters': {}})
+    assert response.status_code == 200
+    assert server.requests == [('POST', '/api'), ('POST', '/api')]
+    assert sleeps == [2.0]
+
+def test_keep_alive_connection_is_reused(server):
+    before = http_client.connection_stats()
+    for page in range(3):
+        assert http_client.get(f"{server.url}/search?page={page}").status_code == 200
+    after = http_client.connection_stats()
+    assert after['requests'] - before['requests'] == 3
+    assert after['new_connections'] - before['new_connections'] == 1
+    assert after['reused_connections'] - before['reused_connections'] == 2
@@ -0,0 +1,69 @@
+import json
+from types import SimpleNamespace
+
+import llm_batch
+
+class FakeClient:
+    # Answers every request of a submitted file; custom_ids containing
+    # "fail" come back with an error status
+    def __init__(self, polls_until_done=1):
+        self.uploaded = {}
+        self.outputs = {}
+        self.polls = {}
+        self.polls_until_done = polls_until_done
+        self.files = SimpleNamespace(create=self.create_file, content=self.file_content)
+        self.batches = SimpleNamespace(create=self.create_batch, retrieve=self.retrieve)
+
+    def create_file(self, file, purpose):
+        file_id = f"file-{len(self.uploaded)}"
+        self.uploaded[file_id] = [json.loads(line) for line in file.read().decode('utf-8').splitlines()]
+        return SimpleNamespace(id=file_id)
+
+    def create_batch(self, input_file_id, endpoint, completion_window):
+        batch_id = f"batch-{input_file_id}"
+        lines = []
+        for request in self.uploaded[input_file_id]:
+            status = 500 if 'fail' in request['custom_id'] else 200
+            body = {'choices': [{'message': {'content': f" answer {request['custom_id']} "}}]}
+            lines.append(json.dumps({'custom_id': request['custom_id'], 'response': {'status_code': status, 'body': body}}))
+        self.outputs[f"out-{batch_id}"] = "\n".join(lines)
+        self.polls[batch_id] = 0
+        return SimpleNamespace(id=batch_id)
+
+    def retrieve(self, batch_id):
+        self.polls[batch_id] += 1
+        status = 'completed' if self.polls[batch_id] >= self.polls_until_done else 'in_progress'
+        return SimpleNamespace(id=batch_id, status=status, output_file_id=f"out-{batch_id}", error_file_id=None,
+                               request_counts=SimpleNamespace(completed=0, total=1, failed=0))
+
+    def file_content(self, file_id):
+        return SimpleNamespace(text=self.outputs[file_id])
+
+def requests(count, failing=()):
+    for n in range(count):
+        custom_id = f"fail-{n}" if n in failing else f"batch-{n}"
+        yield custom_id, {'model': 'gpt-3.5-turbo', 'messages': [{'role': 'user', 'content': str(n)}]}
+
+def test_files_are_split_at_the_request_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_batch, 'MAX_REQUESTS_PER_FILE', 2)
+    paths = llm_batch.write_batch_files(requests(5), str(tmp_path))
+    lines = [[json.loads(line) for line in open(path, encoding='utf-8')] for path in paths]
+    assert [len(file_lines) for file_lines in lines] == [2, 2, 1]
+    assert lines[0][0]['url'] == llm_batch.ENDPOINT and lines[2][0]['custom_id'] == 'batch-4'
+
+def test_run_matches_answers_by_custom_id(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_batch, 'MAX_REQUESTS_PER_FILE', 2)
+    client = FakeClient(polls_until_done=2)
+    results = llm_batch.run(client, requests(5, failing={3}), str(tmp_path), poll_interval=0)
+    assert sorted(results) == ['batch-0', 'batch-1', 'batch-2', 'batch-4']
+    assert llm_batch.response_text(results['batch-4']) == "answer batch-4"
+    assert len(client.uploaded) == 3
+
+def test_no_requests_submit_nothing(tmp_path):
+    client = FakeClient()
+    assert llm_batch.run(client, iter(()), str(tmp_path)) == {}
+    assert client.uploaded == {}
+
+def test_malformed_bodies_give_empty_answers():
+    assert llm_batch.response_text(None) == ""
+    assert llm_batch.response_message({'choices': []}) == {}
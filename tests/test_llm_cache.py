@@ -0,0 +1,60 @@
+import pytest
+
+import llm_cache
+
+URL = "https://open.canada.ca/data/en/dataset/abc"
+PAGE = {'title': 'Air quality', 'h1': 'Air quality', 'meta_desc': '', 'content': 'Hourly readings'}
+
+class Clock:
+    def __init__(self):
+        self.now = 1000000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache.time, 'time', clock.time)
+    return clock
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = llm_cache.LLMCache(str(tmp_path / 'llm.sqlite'), 'gpt-3.5-turbo', 1, ttl=100)
+    yield cache
+    cache.close()
+
+def test_fresh_answer_is_reused_without_the_page(cache, clock):
+    cache.put(URL, PAGE, "Air quality readings", "air, pollution, health")
+    clock.now += 50
+    assert cache.get_fresh(URL) == ("Air quality readings", "air, pollution, health")
+    # Another URL variant of the same dataset
+    assert cache.get_fresh("http://www.open.canada.ca/data/fr/dataset/abc/") is not None
+
+def test_stale_answer_needs_unchanged_content(cache, clock):
+    cache.put(URL, PAGE, "Air quality readings", "air")
+    clock.now += 500
+    assert cache.get_fresh(URL) is None
+    assert cache.get(URL, dict(PAGE, content='Daily readings')) is None
+    assert cache.get(URL, PAGE) == ("Air quality readings", "air")
+    # The content check refreshed it
+    assert cache.get_fresh(URL) is not None
+    assert (cache.fresh_hits, cache.content_hits, cache.misses) == (1, 1, 1)
+
+def test_answers_are_kept_per_model_and_prompt_version(tmp_path, clock):
+    path = str(tmp_path / 'llm.sqlite')
+    cache = llm_cache.LLMCache(path, 'gpt-3.5-turbo', 1)
+    cache.put(URL, PAGE, "Name", "topic")
+    cache.close()
+    for model, version in (('gpt-4o', 1), ('gpt-3.5-turbo', 2)):
+        other = llm_cache.LLMCache(path, model, version)
+        assert other.get_fresh(URL) is None
+        assert other.get(URL, PAGE) is None
+        other.close()
+
+def test_zero_ttl_always_checks_the_content(tmp_path, clock):
+    cache = llm_cache.LLMCache(str(tmp_path / 'llm.sqlite'), ttl=0)
+    cache.put(URL, PAGE, "Name", "topic")
+    assert cache.get_fresh(URL) is None
+    assert cache.get(URL, PAGE) == ("Name", "topic")
+    cache.close()
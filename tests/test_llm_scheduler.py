@@ -0,0 +1,204 @@
+import asyncio
+from types import SimpleNamespace
+
+import openai
+import pytest
+
+import fetcher
+import llm_scheduler
+
+# Only the response's retry-after header is read
+def rate_limit_error(retry_after='0'):
+    error = openai.RateLimitError.__new__(openai.RateLimitError)
+    error.response = SimpleNamespace(headers={'retry-after': retry_after})
+    return error
+
+def server_error():
+    return openai.InternalServerError.__new__(openai.InternalServerError)
+
+def timeout_error():
+    return openai.APITimeoutError.__new__(openai.APITimeoutError)
+
+class FakeClient:
+    def __init__(self, failures=0, delay=0.01, error=rate_limit_error):
+        self.failures = failures
+        self.delay = delay
+        self.error = error
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **request):
+        self.in_flight += 1
+        self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.failures:
+                self.failures -= 1
+                raise self.error()
+            usage = SimpleNamespace(prompt_tokens=10, completion_tokens=5)
+            return SimpleNamespace(content=request['messages'][0]['content'], usage=usage)
+        finally:
+            self.in_flight -= 1
+
+def request(text='hello'):
+    return {'model': 'gpt-3.5-turbo', 'messages': [{'role': 'user', 'content': text}], 'max_tokens': 10}
+
+def scheduler(client, **kwargs):
+    return llm_scheduler.LLMScheduler(client, rpm=60000, tpm=10 ** 7, **kwargs)
+
+def test_requests_in_flight_stay_under_concurrency():
+    client = FakeClient()
+    llm = scheduler(client, concurrency=3)
+
+    async def run():
+        return await asyncio.gather(*(llm.complete(**request(str(n))) for n in range(12)))
+
+    responses = asyncio.run(run())
+    assert [response.content for response in responses] == [str(n) for n in range(12)]
+    assert client.most_in_flight == 3
+    assert (llm.calls, llm.prompt_tokens, llm.completion_tokens) == (12, 120, 60)
+
+def test_rate_limit_is_retried_and_halves_the_limit():
+    client = FakeClient(failures=1)
+    llm = scheduler(client, concurrency=8)
+    response = asyncio.run(llm.complete(**request()))
+    assert response.content == 'hello'
+    assert (llm.calls, llm.rate_limited, llm.limit) == (2, 1, 4)
+
+def test_gives_up_after_max_retries():
+    llm = scheduler(FakeClient(failures=10), max_retries=2)
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(llm.complete(**request()))
+    assert llm.calls == 3
+
+@pytest.mark.parametrize('error', [server_error, timeout_error])
+def test_transient_error_is_retried_after_a_backoff(clock, error):
+    llm = scheduler(FakeClient(failures=1, delay=0, error=error), concurrency=8)
+    response = asyncio.run(llm.complete(**request()))
+    assert response.content == 'hello'
+    # Retried without touching the rate-limit state
+    assert (llm.calls, llm.transient_errors, llm.rate_limited, llm.limit) == (2, 1, 0, 8)
+    assert clock.now <= 1.0
+
+def test_limit_grows_back_after_successes():
+    llm = scheduler(FakeClient(failures=1, delay=0), concurrency=2)
+
+    async def run():
+        for _ in range(11):
+            await llm.complete(**request())
+
+    asyncio.run(run())
+    # Halved to 1 by the error, one step back up after 10 successes
+    assert llm.limit == 2
+
+def test_map_queue_runs_every_item_until_the_end_marker():
+    llm = scheduler(FakeClient(), concurrency=3)
+    done = []
+
+    async def worker(n):
+        await asyncio.sleep(0.001)
+        if n == 4:
+            raise ValueError("bad item")
+        done.append(n)
+
+    async def run():
+        queue = asyncio.Queue(maxsize=2)
+
+        async def produce():
+            for n in range(10):
+                await queue.put(n)
+            await queue.put(None)
+
+        await asyncio.gather(produce(), llm.map_queue(worker, queue))
+
+    asyncio.run(run())
+    assert sorted(done) == [n for n in range(10) if n != 4]
+
+# Time only moves when something sleeps, so waits can be checked exactly
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    real_sleep = asyncio.sleep
+
+    async def sleep(seconds, *args):
+        clock.now += max(0.0, seconds)
+        await real_sleep(0)
+
+    fake_time = SimpleNamespace(monotonic=clock.monotonic)
+    monkeypatch.setattr(fetcher, 'time', fake_time)
+    monkeypatch.setattr(llm_scheduler, 'time', fake_time)
+    monkeypatch.setattr(asyncio, 'sleep', sleep)
+    return clock
+
+class TimedClient(FakeClient):
+    def __init__(self, clock, failures=0, retry_after='0'):
+        super().__init__(failures=failures, delay=0)
+        self.clock = clock
+        self.retry_after = retry_after
+        self.started = []
+
+    async def create(self, **request):
+        self.in_flight += 1
+        self.started.append((self.clock.now, self.in_flight))
+        try:
+            # Let the other workers start their requests before answering
+            await asyncio.sleep(0)
+            if self.failures:
+                self.failures -= 1
+                raise rate_limit_error(self.retry_after)
+            return SimpleNamespace(content=request['messages'][0]['content'], usage=None)
+        finally:
+            self.in_flight -= 1
+
+def start_times_of(expected):
+    return [pytest.approx(started) for started in expected]
+
+def run_requests(llm, count):
+    async def run():
+        await asyncio.gather(*(llm.complete(**request(str(n))) for n in range(count)))
+    asyncio.run(run())
+
+def test_requests_per_minute_limit_spaces_out_requests(clock):
+    client = TimedClient(clock)
+    # 6 a minute: a burst of 6, then one every 10 seconds
+    llm = llm_scheduler.LLMScheduler(client, concurrency=10, rpm=6, tpm=10 ** 7)
+    run_requests(llm, 9)
+    assert sorted(started for started, _ in client.started) == start_times_of([0] * 6 + [10, 20, 30])
+
+def test_tokens_per_minute_limit_spaces_out_requests(clock):
+    client = TimedClient(clock)
+    cost = llm_scheduler.estimate_request_tokens(request('0')['messages'], 10)
+    # Room for 3 requests a minute: a burst of 3, then one every 20 seconds
+    llm = llm_scheduler.LLMScheduler(client, concurrency=10, rpm=60000, tpm=3 * cost)
+    run_requests(llm, 5)
+    assert sorted(started for started, _ in client.started) == start_times_of([0, 0, 0, 20, 40])
+
+def test_rate_limit_pauses_every_worker_and_lowers_concurrency(clock):
+    client = TimedClient(clock, failures=1, retry_after='5')
+    llm = llm_scheduler.LLMScheduler(client, concurrency=2, rpm=60000, tpm=10 ** 7)
+    run_requests(llm, 6)
+    # The first two start together; everything after the 429 waits out the
+    # retry-after and then runs one at a time
+    assert sorted(started for started, _ in client.started) == start_times_of([0, 0, 5, 5, 5, 5, 5])
+    assert all(in_flight == 1 for started, in_flight in client.started if started >= 5)
+    assert (llm.calls, llm.rate_limited, llm.limit) == (7, 1, 1)
+
+def test_budgets_carry_over_between_batches(clock):
+    client = TimedClient(clock)
+    llm = llm_scheduler.LLMScheduler(client, concurrency=10, rpm=6, tpm=10 ** 7)
+
+    async def run():
+        # Two chunks through the same scheduler share the one-minute budget
+        for _ in range(2):
+            await asyncio.gather(*(llm.complete(**request()) for _ in range(4)))
+
+    asyncio.run(run())
+    assert sorted(started for started, _ in client.started) == start_times_of([0] * 6 + [10, 20])
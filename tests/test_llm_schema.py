@@ -0,0 +1,30 @@
+import json
+from types import SimpleNamespace
+
+import llm_schema
+
+def items(*entries):
+    return json.dumps({'items': [dict(zip(('index', 'dataset_name', 'topics'), entry)) for entry in entries]})
+
+def test_valid_items_by_index():
+    valid, failed = llm_schema.parse_items(items((2, "Two", ["a", "b", "c", "d"]), (1, " One ", "x, y")), 2)
+    assert valid == {1: {'dataset_name': "One", 'topic': "x, y"}, 2: {'dataset_name': "Two", 'topic': "a, b, c"}}
+    assert failed == []
+
+def test_bad_items_fail_on_their_own():
+    arguments = items((1, "One", ["a"]), (2, "Unknown", ["a"]), (3, "Three", ["N/A"]), (4, "Four", ["a"]),
+                      (4, "Four again", ["a"]), (9, "Nine", ["a"]))
+    valid, failed = llm_schema.parse_items(arguments, 5)
+    assert list(valid) == [1]
+    assert failed == [2, 3, 4, 5]
+
+def test_malformed_arguments_fail_every_item():
+    assert llm_schema.parse_items("not json", 2) == ({}, [1, 2])
+    assert llm_schema.parse_items('{"items": "x"}', 1) == ({}, [1])
+
+def test_arguments_from_sdk_objects_and_batch_dicts():
+    call = SimpleNamespace(function=SimpleNamespace(name=llm_schema.FUNCTION_NAME, arguments='{"items": []}'))
+    assert llm_schema.message_arguments(SimpleNamespace(tool_calls=[call], content=None)) == '{"items": []}'
+    message = {'tool_calls': [{'function': {'name': 'other', 'arguments': 'x'}}], 'content': '{"items": [1]}'}
+    assert llm_schema.message_arguments(message) == '{"items": [1]}'
+    assert llm_schema.message_arguments(None) == ""
@@ -0,0 +1,51 @@
+import llm_text
+import topic_fallback
+
+URLS = [f"https://open.canada.ca/data/en/dataset/ds{n}" for n in range(1, 4)]
+
+def answer(number, name, label=None):
+    return f"URL {label or number}:\nDataset Name: {name}\nTopic: t{number}a, t{number}b, t{number}c\n\n"
+
+def parse(text, urls=URLS):
+    return llm_text.parse_batch_results(text, len(urls), urls, topic_fallback.TopicClassifier())
+
+def test_answers_in_order():
+    results = parse(answer(1, "One") + answer(2, "Two") + answer(3, "Three"))
+    assert [result['dataset_name'] for result in results] == ["One", "Two", "Three"]
+    assert [result['url_num'] for result in results] == ['1', '2', '3']
+    assert results[1]['topic'] == "t2a, t2b, t2c"
+
+def test_reordered_answers_go_to_their_urls():
+    results = parse(answer(3, "Three") + answer(1, "One") + answer(2, "Two"))
+    assert [result['dataset_name'] for result in results] == ["One", "Two", "Three"]
+
+def test_skipped_answer_does_not_shift_the_rest():
+    results = parse(answer(1, "One") + answer(3, "Three"))
+    assert results[0]['dataset_name'] == "One"
+    assert results[1]['dataset_name'] == topic_fallback.NAME_TEMPLATE.format(dataset_id='ds2')
+    assert results[2]['dataset_name'] == "Three"
+
+def test_answers_labelled_by_url_or_in_markdown():
+    text = (f"**URL 2:**\nDataset Name: Two\nTopic: a, b, c\n\n"
+            f"URL: {URLS[0]}\nDataset Name: One\nTopic: a, b, c\n\n")
+    results = parse(text)
+    assert [result['dataset_name'] for result in results[:2]] == ["One", "Two"]
+
+def test_unknown_and_repeated_numbers_are_ignored():
+    results = parse(answer(2, "Two") + answer(2, "Again") + answer(7, "Seven"))
+    assert results[1]['dataset_name'] == "Two"
+    assert results[0]['dataset_name'] == topic_fallback.NAME_TEMPLATE.format(dataset_id='ds1')
+
+def test_placeholders_are_replaced():
+    results = parse("URL 1:\nDataset Name: [Unavailable]\nTopic: N/A\n")
+    assert results[0]['dataset_name'] == topic_fallback.NAME_TEMPLATE.format(dataset_id='ds1')
+    assert results[0]['topic'] not in ("N/A", "")
+
+def test_url_mentioned_in_a_name_does_not_split_the_answer():
+    results = parse("URL 1:\nDataset Name: Short URL click counts\nTopic: a, b, c\n", URLS[:1])
+    assert results[0]['dataset_name'] == "Short URL click counts"
+
+def test_without_a_classifier_missing_fields_stay_empty():
+    results = llm_text.parse_batch_results("URL 1:\nDataset Name: [Unavailable]\nTopic: a, b, c\n", 2, URLS[:2], None)
+    assert results[0] == {'url_num': '1', 'dataset_name': None, 'topic': "a, b, c"}
+    assert results[1] == {'url_num': '2', 'dataset_name': None, 'topic': None}
@@ -0,0 +1,62 @@
+import json
+import threading
+
+import pytest
+
+import metrics
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    monkeypatch.setattr(metrics, '_counters', {})
+    monkeypatch.setattr(metrics, '_histograms', {})
+
+def test_counters_add_up_per_label_set():
+    threads = [threading.Thread(target=lambda: [metrics.count('pages_total', portal='uk') for _ in range(100)])
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    metrics.count('pages_total', 5, portal='ca')
+    assert metrics.total('pages_total') == 405
+    assert metrics.summary()['counters'] == {'pages_total{portal="ca"}': 5, 'pages_total{portal="uk"}': 400}
+
+def test_histogram_buckets_and_quantiles():
+    for value in (0.004, 0.02, 0.02, 0.3, 100):
+        metrics.observe('fetch_seconds', value)
+    histogram = metrics.summary()['histograms']['fetch_seconds']
+    assert histogram['count'] == 5
+    assert histogram['p50'] == 0.025
+    assert histogram['p95'] == float('inf')
+    text = metrics.prometheus_text()
+    assert 'fetch_seconds_bucket{le="0.025"} 3' in text
+    assert 'fetch_seconds_bucket{le="+Inf"} 5' in text
+
+def test_timed_decorator_and_llm_cost():
+    @metrics.timed('parse_seconds', portal='uk')
+    def parse():
+        return 'done'
+
+    assert parse() == 'done'
+    assert metrics.summary()['histograms']['parse_seconds{portal="uk"}']['count'] == 1
+    cost = metrics.record_llm_usage('gpt-3.5-turbo', 1000000, 1000000, discount=0.5)
+    assert cost == pytest.approx(1.0)
+    assert metrics.total('llm_tokens_total') == 2000000
+
+def test_write_json_and_prometheus(tmp_path):
+    metrics.count('pages_total', 2)
+    metrics.write(str(tmp_path / 'run.json'))
+    assert json.loads((tmp_path / 'run.json').read_text())['counters'] == {'pages_total': 2}
+    metrics.write(str(tmp_path / 'run.prom'))
+    assert "# TYPE pages_total counter\npages_total 2\n" in (tmp_path / 'run.prom').read_text()
+
+def test_log_prints_text_or_json_lines(monkeypatch, capsys):
+    metrics.log('page_done', "Found 20 results on page 3", portal='uk', page=3)
+    metrics.log('pages_total', portal='uk')
+    assert capsys.readouterr().out == "Found 20 results on page 3\npages_total: portal=uk\n"
+
+    monkeypatch.setattr(metrics, '_log_format', 'json')
+    metrics.log('page_failed', "\nError accessing page 4", level='error', page=4)
+    record = json.loads(capsys.readouterr().out)
+    assert record['event'] == 'page_failed' and record['level'] == 'error'
+    assert record['message'] == "Error accessing page 4" and record['page'] == 4
@@ -0,0 +1,90 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bs4 import BeautifulSoup
+
+import http_client
+import page_summary
+
+PRIORITY_PAGE = b"""<html><head><title>Air quality</title>
+<meta name="description" content="Hourly air quality readings"></head>
+<body><h1> Air quality monitoring </h1>
+<p>Intro paragraph that priority content replaces</p>
+<div class="field-item">First field</div>
+<div class="dataset-description">Readings from <b>roadside</b> stations</div>
+<div class="field-item">Third field</div>
+<div class="field-item">Fourth field, past the limit</div>
+</body></html>"""
+
+FALLBACK_PAGE = b"""<html><head><title>Road traffic</title></head>
+<body><h1>Road traffic counts</h1><p>Counts by road</p><h2>Methods</h2><p></p><h3>Coverage</h3></body></html>"""
+
+def chunks(data, size=16):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+def test_stream_matches_the_full_parse():
+    for page in (PRIORITY_PAGE, FALLBACK_PAGE):
+        expected = page_summary.summarize_soup(BeautifulSoup(page, 'html.parser'))
+        assert page_summary.summarize_stream(chunks(page)) == expected
+
+def test_priority_content_wins_over_paragraphs():
+    summary = page_summary.summarize_stream(chunks(PRIORITY_PAGE))
+    assert summary == {'title': 'Air quality', 'h1': 'Air quality monitoring', 'meta_desc': 'Hourly air quality readings',
+                       'content': 'First field Readings from roadside stations Third field'}
+
+def test_stream_stops_reading_once_the_summary_is_complete():
+    read = []
+    tail = b"<p>" + b"x" * 1000 + b"</p>"
+
+    def page():
+        for chunk in chunks(PRIORITY_PAGE.replace(b"</body>", tail * 200 + b"</body>"), 256):
+            read.append(chunk)
+            yield chunk
+
+    page_summary.summarize_stream(page())
+    assert sum(len(chunk) for chunk in read) < 2048
+
+def test_long_content_is_cut():
+    page = b"<html><body><h1>T</h1><p>" + b"word " * 300 + b"</p></body></html>"
+    content = page_summary.summarize_stream(chunks(page, 4096))['content']
+    assert len(content) == page_summary.MAX_CONTENT + 3 and content.endswith("...")
+
+def test_summary_without_lxml_matches():
+    assert (page_summary._summarize_strained(chunks(PRIORITY_PAGE))
+            == page_summary.summarize_soup(BeautifulSoup(PRIORITY_PAGE, 'html.parser')))
+
+# Serves one big dataset page and counts the requests it gets
+class PageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests += 1
+        body = PRIORITY_PAGE.replace(b"</body>", b"<p>" + b"x" * 200000 + b"</p></body>")
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def test_fetched_summary_is_replayed_offline(tmp_path):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PageHandler)
+    server.daemon_threads = True
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/dataset/air-quality"
+    try:
+        http_client.enable_cache(str(tmp_path))
+        summary = page_summary.fetch_summary(url)
+        assert summary['title'] == 'Air quality'
+        assert page_summary.fetch_summary(url) == summary
+        assert server.requests == 1
+
+        http_client.enable_cache(str(tmp_path), offline=True)
+        assert page_summary.fetch_summary(url) == summary
+        assert server.requests == 1
+    finally:
+        http_client.disable_cache()
+        server.shutdown()
+        server.server_close()
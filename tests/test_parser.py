@@ -0,0 +1,40 @@
+import os
+
+import crawl_state
+import metrics
+import parser
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+class FakeResponse:
+    status_code = 200
+    text = '<html><body><div class="dgu-results"></div></body></html>'
+
+def test_results_sorted_by_date_only_for_incremental_crawls(monkeypatch, tmp_path):
+    requested = []
+    monkeypatch.setattr(parser.http_client, 'get', lambda url, **kwargs: requested.append(url) or FakeResponse())
+    parser.scrape_datasets('water', None)
+    parser.scrape_datasets('water', 2020)
+    state = crawl_state.CrawlState(str(tmp_path / 'state.sqlite'))
+    parser.scrape_datasets('water', 2020, state=state)
+    state.close()
+    assert requested == ["https://www.data.gov.uk/search?q=water",
+                         "https://www.data.gov.uk/search?q=water+2020",
+                         "https://www.data.gov.uk/search?q=water+2020&sort=recent"]
+
+class FixtureResponse:
+    status_code = 200
+
+    def __init__(self, text):
+        self.text = text
+
+# In relevance order an old dataset on page 1 says nothing about page 2
+def test_year_crawl_in_relevance_order_reads_every_page(monkeypatch):
+    with open(os.path.join(FIXTURES, 'uk_search.html'), encoding='utf-8') as f:
+        html = f.read()
+    requested = []
+    monkeypatch.setattr(parser.http_client, 'get', lambda url, **kwargs: requested.append(url) or FixtureResponse(html))
+    monkeypatch.setattr(metrics, 'sleep', lambda seconds, reason: None)
+    # The fixture's last dated result is from 2023, before the range
+    parser.scrape_datasets('water', 2024, rate=1e6)
+    assert len(requested) == 7
@@ -0,0 +1,12 @@
+import parser_angular
+
+BASE_URL = 'https://researchdata.edu.au'
+SEARCH = f"{BASE_URL}/search/#!/rows=100/sort=score%20desc/class=collection/p=1/q=sea%20level/"
+
+def test_browser_url_without_years():
+    assert parser_angular.browser_search_url(BASE_URL, 'sea level', None, None, 100) == SEARCH
+
+def test_browser_url_with_year_range():
+    assert (parser_angular.browser_search_url(BASE_URL, 'sea level', 2015, 2020, 100)
+            == SEARCH + "year_from=2015/year_to=2020/")
+    assert parser_angular.browser_search_url(BASE_URL, 'sea level', None, 2020, 100) == SEARCH + "year_to=2020/"
@@ -0,0 +1,45 @@
+import threading
+
+import prefetch
+
+class Pages:
+    def __init__(self):
+        self.fetched = []
+        self.lock = threading.Lock()
+
+    def fetch(self, url):
+        with self.lock:
+            self.fetched.append(url)
+        return url.upper()
+
+def test_batches_come_back_in_url_order():
+    pages = Pages()
+    batches = [[f"u{b}-{n}" for n in range(3)] for b in range(4)]
+    prefetcher = prefetch.ContentPrefetcher(pages.fetch, batches, workers=4, lookahead=1)
+    assert [prefetcher.get(b) for b in range(4)] == [[url.upper() for url in batch] for batch in batches]
+    prefetcher.close()
+    assert sorted(pages.fetched) == sorted(url for batch in batches for url in batch)
+
+def test_only_lookahead_batches_are_fetched_ahead():
+    pages = Pages()
+    batches = [[f"u{b}"] for b in range(6)]
+    prefetcher = prefetch.ContentPrefetcher(pages.fetch, batches, workers=2, lookahead=2)
+    prefetcher.get(0)
+    prefetcher.executor.shutdown(wait=True)
+    assert sorted(pages.fetched) == ["u0", "u1", "u2"]
+    assert prefetcher.stats.items == 3
+
+def test_batch_taken_twice_is_fetched_again():
+    pages = Pages()
+    prefetcher = prefetch.ContentPrefetcher(pages.fetch, [["a"]], workers=1, lookahead=0)
+    assert prefetcher.get(0) == ["A"]
+    assert prefetcher.get(0) == ["A"]
+    prefetcher.close()
+    assert pages.fetched == ["a", "a"]
+
+def test_stage_stats_summary():
+    stats = prefetch.StageStats("Fetch stage")
+    with stats.timed(items=3):
+        pass
+    assert (stats.calls, stats.items) == (1, 3)
+    assert stats.summary().startswith("Fetch stage: 3 items in 1 calls")
@@ -0,0 +1,31 @@
+import prompt_packing
+
+def test_url_variants_share_a_key():
+    key = prompt_packing.dataset_key("https://open.canada.ca/data/en/dataset/abc-123")
+    assert prompt_packing.dataset_key("http://www.open.canada.ca/data/fr/dataset/abc-123/") == key
+    assert prompt_packing.dataset_key("https://open.canada.ca/data/en/dataset/abc-123?utm_source=x#top") == key
+
+def test_datasets_identified_by_query_keep_their_own_key():
+    first = prompt_packing.dataset_key("https://researchdata.edu.au/view/?key=first-record")
+    second = prompt_packing.dataset_key("https://researchdata.edu.au/view/?key=second-record")
+    assert first != second
+
+def test_different_ids_differ():
+    assert (prompt_packing.dataset_key("https://data.gov.ie/dataset/a")
+            != prompt_packing.dataset_key("https://data.gov.ie/dataset/b"))
+
+def test_packer_closes_request_at_max_items():
+    packer = prompt_packing.PromptPacker(max_items=2)
+    assert packer.add('a', 10) is None
+    assert packer.add('b', 10) is None
+    assert packer.add('c', 10) == ['a', 'b']
+    assert packer.flush() == ['c']
+    assert packer.average_items() == 1.5
+
+def test_packer_respects_input_budget():
+    packer = prompt_packing.PromptPacker(max_input_tokens=100, overhead_tokens=20)
+    packer.add('a', 50)
+    assert packer.add('b', 50) == ['a']
+    # Too big for any request: goes out on its own
+    assert packer.add('c', 500) == ['b']
+    assert packer.flush() == ['c']
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+import rda_api
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self.status_code = status_code
+        self.content = json.dumps(data).encode('utf-8')
+
+def test_search_pages_through_every_record(monkeypatch):
+    docs = [{'slug': f"record-{n}", 'id': 100 + n, 'title': [f" Record {n} "]} for n in range(5)]
+    posted = []
+
+    def post(url, json):
+        filters = json['filters']
+        posted.append(filters)
+        start = (filters['p'] - 1) * filters['rows']
+        return FakeResponse({'result': {'docs': docs[start:start + filters['rows']], 'numFound': len(docs)}})
+
+    monkeypatch.setattr(rda_api.http_client, 'post', post)
+    results = rda_api.search('sea level', 2015, None, rows=2)
+    assert results == [{'URL': f"https://researchdata.edu.au/record-{n}/{100 + n}", 'Title': f"Record {n}"} for n in range(5)]
+    assert [filters['p'] for filters in posted] == [1, 2, 3]
+    assert posted[0]['year_from'] == 2015 and posted[0]['q'] == 'sea level'
+
+def test_record_without_slug_uses_its_key():
+    assert rda_api.record_url({'key': 'abc'}) == "https://researchdata.edu.au/view/?key=abc"
+    assert rda_api.record_title({'display_title': 'Title'}) == "Title"
+
+@pytest.mark.parametrize('response', [
+    FakeResponse({}, status_code=503),
+    FakeResponse({'unexpected': True}),
+])
+def test_bad_responses_raise(monkeypatch, response):
+    monkeypatch.setattr(rda_api.http_client, 'post', lambda url, json: response)
+    with pytest.raises(rda_api.RDAError):
+        rda_api.search('sea level', None, None)
@@ -0,0 +1,110 @@
+import sqlite3
+
+import pytest
+
+import result_sink
+
+def test_to_rows_maps_each_scrapers_keys():
+    rows = result_sink.to_rows('open.canada.ca', 'water', [
+        {'Title': 'T', 'Dataset URL': 'https://ca.example/1', 'Record Modified': '2024-01-01', 'Record Released': '2020-01-01'},
+        {'URL': 'https://uk.example/2'},
+    ], scraped_at=1.0)
+    assert rows == [
+        ('open.canada.ca', 'water', 'https://ca.example/1', 'T', '2024-01-01', '2020-01-01', 1.0),
+        ('open.canada.ca', 'water', 'https://uk.example/2', None, None, None, 1.0),
+    ]
+
+def test_sqlite_sink_appends_and_reads_back_in_chunks(tmp_path):
+    path = str(tmp_path / 'results.sqlite')
+    sink = result_sink.SQLiteSink(path)
+    assert sink.write('data.gov.uk', 'water', [{'URL': f"https://uk.example/{n}"} for n in range(5)]) == 5
+    sink.close()
+    # A later run appends to the same table
+    sink = result_sink.SQLiteSink(path)
+    sink.write('data.gov.uk', 'air', [{'URL': "https://uk.example/5"}])
+    sink.close()
+
+    assert result_sink.is_sink_path(path)
+    chunks = list(result_sink.read_url_chunks(path, chunk_rows=2, skip=1))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert [url for chunk in chunks for url in chunk['URL']] == [f"https://uk.example/{n}" for n in range(1, 6)]
+
+def test_sqlite_sink_keeps_one_row_per_search_and_url(tmp_path):
+    path = str(tmp_path / 'results.sqlite')
+    records = [{'URL': f"https://uk.example/{n}"} for n in range(3)]
+    sink = result_sink.SQLiteSink(path)
+    assert sink.write('data.gov.uk', 'water', records) == 3
+    sink.close()
+    # A re-run stores only what is new; the same URL under another search stays
+    sink = result_sink.SQLiteSink(path)
+    assert sink.write('data.gov.uk', 'water', records + [{'URL': "https://uk.example/3"}]) == 1
+    assert sink.write('data.gov.uk', 'air', records[:1]) == 1
+    sink.close()
+    assert [url for chunk in result_sink.read_url_chunks(path) for url in chunk['URL']] == \
+        [f"https://uk.example/{n}" for n in range(4)] + ["https://uk.example/0"]
+
+def test_sqlite_sink_drops_repeats_from_older_files(tmp_path):
+    path = str(tmp_path / 'results.sqlite')
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE results (portal TEXT NOT NULL, search_term TEXT NOT NULL, url TEXT NOT NULL, "
+               "title TEXT, modified TEXT, released TEXT, scraped_at REAL)")
+    db.executemany("INSERT INTO results (portal, search_term, url) VALUES (?, ?, ?)",
+                   [('p', 't', 'a'), ('p', 't', 'b'), ('p', 't', 'a')])
+    db.commit()
+    db.close()
+    result_sink.SQLiteSink(path).close()
+    assert [url for chunk in result_sink.read_url_chunks(path) for url in chunk['URL']] == ['a', 'b']
+
+def test_output_without_sink_only_exports():
+    output = result_sink.Output(formats=('csv',))
+    assert output.wants('csv') and not output.wants('xlsx')
+    assert output.dedupe([{'URL': 'a'}, {'URL': 'a'}]) == [{'URL': 'a'}, {'URL': 'a'}]
+    output.write('portal', 'term', [{'URL': 'a'}])
+    output.close()
+
+def test_search_output_stores_each_page_as_it_comes(tmp_path):
+    path = str(tmp_path / 'results.sqlite')
+    output = result_sink.Output(result_sink.SQLiteSink(path), formats=())
+    stream = result_sink.SearchOutput(output, 'data.gov.uk', 'water')
+    stream.resume([{'URL': 'https://uk.example/0'}])
+    stream.add([{'URL': 'https://uk.example/1'}, {'URL': 'https://uk.example/2'}])
+    # Readable before the search finishes
+    assert [url for chunk in result_sink.read_url_chunks(path) for url in chunk['URL']] == \
+        ['https://uk.example/1', 'https://uk.example/2']
+    stream.add([{'URL': 'https://uk.example/3'}])
+    assert stream.finish() == [{'URL': f"https://uk.example/{n}"} for n in range(4)]
+    assert stream.stored == 3
+    output.close()
+
+def test_canada_crawl_stores_pages_before_a_crash(tmp_path, monkeypatch):
+    import parser_can
+
+    path = str(tmp_path / 'results.sqlite')
+    output = result_sink.Output(result_sink.SQLiteSink(path), formats=())
+    monkeypatch.setattr(parser_can.metrics, 'sleep', lambda seconds, reason: None)
+    monkeypatch.setattr(parser_can, 'get_total_pages', lambda soup: 3)
+
+    def parse_page(page_url):
+        page = int(page_url.rsplit('=', 1)[1])
+        if page == 3:
+            raise RuntimeError("crashed")
+        return [{'Title': f"T{page}", 'Dataset URL': f"https://ca.example/{page}",
+                 'Record Modified': '2024-01-01', 'Record Released': '2020-01-01'}], object()
+    monkeypatch.setattr(parser_can, 'parse_page', parse_page)
+
+    with pytest.raises(RuntimeError):
+        parser_can.scrape_search_term('water', 'water', output=output)
+    assert [url for chunk in result_sink.read_url_chunks(path) for url in chunk['URL']] == \
+        ['https://ca.example/1', 'https://ca.example/2']
+    output.close()
+
+def test_parquet_parts_are_read_in_write_order(tmp_path):
+    pytest.importorskip('pyarrow')
+    directory = str(tmp_path / 'results_parquet')
+    sink = result_sink.ParquetSink(directory)
+    # Partition paths sort as air < water, the opposite of the write order
+    sink.write('data.gov.uk', 'water', [{'URL': 'https://uk.example/1'}])
+    sink.write('data.gov.uk', 'air', [{'URL': 'https://uk.example/2'}])
+    sink.write('data.gov.uk', 'water', [{'URL': 'https://uk.example/3'}])
+    assert [url for chunk in result_sink.read_url_chunks(directory) for url in chunk['URL']] == \
+        ['https://uk.example/1', 'https://uk.example/2', 'https://uk.example/3']
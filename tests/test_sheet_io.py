@@ -0,0 +1,111 @@
+import os
+
+import pandas as pd
+import pytest
+
+import sheet_io
+
+def write_csv(path, rows):
+    pd.DataFrame({'URL': [f"https://example.org/{n}" for n in range(rows)]}).to_csv(path, index=False)
+
+def test_csv_chunks_after_skip(tmp_path):
+    path = str(tmp_path / 'in.csv')
+    write_csv(path, 5)
+    chunks = list(sheet_io.read_chunks(path, chunk_rows=2, skip=1))
+    assert [len(chunk) for chunk in chunks] == [2, 2]
+    assert list(chunks[0]['URL']) == ["https://example.org/1", "https://example.org/2"]
+
+def test_xlsx_chunks(tmp_path):
+    path = str(tmp_path / 'in.xlsx')
+    pd.DataFrame({'URL': ['a', 'b', 'c']}).to_excel(path, index=False)
+    chunks = list(sheet_io.read_chunks(path, chunk_rows=2))
+    assert [list(chunk['URL']) for chunk in chunks] == [['a', 'b'], ['c']]
+
+def test_missing_input_fails_on_call(tmp_path):
+    path = str(tmp_path / 'results.sqlite')
+    with pytest.raises(FileNotFoundError):
+        sheet_io.read_chunks(path)
+    assert not os.path.exists(path)
+
+def test_malformed_input_fails_on_call(tmp_path):
+    path = tmp_path / 'in.csv'
+    path.write_text("URL,B\nhttps://example.org/1,x\nhttps://example.org/2,x,y,z\n")
+    with pytest.raises(Exception):
+        sheet_io.read_chunks(str(path))
+    not_a_store = tmp_path / 'results.sqlite'
+    not_a_store.write_text("x")
+    with pytest.raises(Exception):
+        sheet_io.read_chunks(str(not_a_store))
+
+def test_everything_skipped_gives_no_chunks(tmp_path):
+    path = str(tmp_path / 'in.csv')
+    write_csv(path, 3)
+    assert sum(len(chunk) for chunk in sheet_io.read_chunks(path, skip=3)) == 0
+
+def test_checkpoint_writer_resumes(tmp_path):
+    input_path = str(tmp_path / 'in.csv')
+    output_path = str(tmp_path / 'out.csv')
+    write_csv(input_path, 4)
+    chunks = sheet_io.read_chunks(input_path, chunk_rows=2)
+    writer = sheet_io.CheckpointWriter(output_path, input_path)
+    writer.append(next(chunks))
+
+    # Interrupted: the next run skips the rows already written
+    writer = sheet_io.CheckpointWriter(output_path, input_path)
+    assert writer.rows_done == 2
+    rest = list(sheet_io.read_chunks(input_path, chunk_rows=2, skip=writer.rows_done))
+    writer.append(rest[0])
+    writer.export()
+    assert list(pd.read_csv(output_path)['URL']) == [f"https://example.org/{n}" for n in range(4)]
+    assert not os.path.exists(writer.partial_path)
+    assert not os.path.exists(writer.checkpoint_path)
+
+def test_export_copies_unprocessed_rows(tmp_path):
+    input_path = str(tmp_path / 'in.csv')
+    output_path = str(tmp_path / 'out.xlsx')
+    write_csv(input_path, 3)
+    chunks = sheet_io.read_chunks(input_path, chunk_rows=2)
+    writer = sheet_io.CheckpointWriter(output_path, input_path)
+    writer.append(next(chunks))
+    writer.export(extra=chunks, complete=False)
+    assert list(pd.read_excel(output_path)['URL']) == [f"https://example.org/{n}" for n in range(3)]
+    # Not complete: the checkpoint stays for the next run
+    assert sheet_io.CheckpointWriter(output_path, input_path).rows_done == 2
+
+# Cells come out as they went in: zero-padded IDs, whole numbers next to a
+# missing value, and empty cells
+@pytest.mark.parametrize('extension', ['.csv', '.xlsx'])
+def test_zero_padded_ids_survive_the_round_trip(tmp_path, extension):
+    input_path = str(tmp_path / 'in.csv')
+    with open(input_path, 'w', encoding='utf-8') as f:
+        f.write("URL,ID,Count\nhttps://example.org/a,007,3\nhttps://example.org/b,0100,\nhttps://example.org/c,12,4\n")
+    output_path = str(tmp_path / f"out{extension}")
+    writer = sheet_io.CheckpointWriter(output_path, input_path)
+    for chunk in sheet_io.read_chunks(input_path, chunk_rows=2):
+        writer.append(chunk)
+    writer.export()
+    if extension == '.csv':
+        written = pd.read_csv(output_path, dtype=str, keep_default_na=False)
+    else:
+        written = pd.read_excel(output_path, dtype=str, keep_default_na=False)
+    assert list(written['ID']) == ['007', '0100', '12']
+    assert list(written['Count']) == ['3', '', '4']
+
+@pytest.mark.parametrize('extension', ['.csv', '.xlsx'])
+def test_export_without_rows_writes_the_header(tmp_path, extension):
+    input_path = str(tmp_path / 'in.xlsx')
+    pd.DataFrame({'URL': [], 'Name': []}).to_excel(input_path, index=False)
+    assert list(sheet_io.read_chunks(input_path)) == []
+    output_path = str(tmp_path / f"out{extension}")
+    writer = sheet_io.CheckpointWriter(output_path, input_path)
+    writer.export(columns=sheet_io.read_columns(input_path))
+    read = pd.read_csv if extension == '.csv' else pd.read_excel
+    written = read(output_path)
+    assert list(written.columns) == ['URL', 'Name'] and written.empty
+
+def test_xlsx_output_needs_openpyxl(tmp_path, monkeypatch):
+    input_path = str(tmp_path / 'in.csv')
+    write_csv(input_path, 1)
+    monkeypatch.setattr(sheet_io, 'openpyxl', None)
+    with pytest.raises(ImportError, match='openpyxl'):
+        sheet_io.CheckpointWriter(str(tmp_path / 'out.xlsx'), input_path)
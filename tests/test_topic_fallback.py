@@ -0,0 +1,42 @@
+import json
+
+import topic_fallback
+
+def test_first_matching_rule_wins():
+    classifier = topic_fallback.TopicClassifier()
+    # "env" and "health" both occur; the environment rule comes first
+    assert classifier.topic("health-env-2021") == topic_fallback.DEFAULT_RULES[0][1]
+    assert classifier.topic("Hospital-Beds") == topic_fallback.DEFAULT_RULES[2][1]
+    assert classifier.topic("road-traffic") == topic_fallback.DEFAULT_TOPIC
+
+def test_column_matches_one_by_one():
+    classifier = topic_fallback.TopicClassifier()
+    ids = ["env-1", "survey-2", "x", None, "env-1", "MEDICAL"]
+    assert list(classifier.topics_for(ids)) == [classifier.topic(i or '') for i in ids]
+
+def test_made_up_results():
+    classifier = topic_fallback.TopicClassifier()
+    frame = classifier.results_for(["https://open.canada.ca/data/en/dataset/eco-zones", "https://a.test/x/zz"])
+    assert list(frame['dataset_name']) == ["Canadian Government Dataset eco-zones", "Canadian Government Dataset zz"]
+    assert list(frame['topic']) == [topic_fallback.DEFAULT_RULES[0][1], topic_fallback.DEFAULT_TOPIC]
+
+def test_only_missing_names_and_topics_are_filled():
+    classifier = topic_fallback.TopicClassifier()
+    urls = ["https://a.test/x/env-1", "https://a.test/x/stat-2", "https://a.test/x/zz"]
+    names, topics = classifier.fill_missing(urls, ["Rivers", None, None], ["water", None, "given"])
+    assert list(names) == ["Rivers", "Canadian Government Dataset stat-2", "Canadian Government Dataset zz"]
+    assert list(topics) == ["water", topic_fallback.DEFAULT_RULES[1][1], "given"]
+
+def test_placeholders():
+    assert all(topic_fallback.is_placeholder(value) for value in (None, "", "N/A", "Unknown", "[Unavailable]"))
+    assert not topic_fallback.is_placeholder("Ecological zones of Canada")
+
+def test_rules_file_keeps_priority_order(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps({"transport": ["road", "rail"], "weather": ["rain", "road"]}))
+    classifier = topic_fallback.TopicClassifier(topic_fallback.load_rules(str(path)))
+    assert classifier.topic("road-rain") == "transport"
+    assert classifier.topic("rainfall") == "weather"
+
+def test_no_rules_gives_the_default():
+    assert topic_fallback.TopicClassifier([], "other").topic("env") == "other"
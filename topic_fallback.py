@@ -0,0 +1,82 @@
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+# Made-up names and topics for datasets the model gave no usable answer
+# for. Topics come from keywords found in the dataset ID. The keyword table
+# is compiled into one regex with a lookahead branch per rule, tried in
+# order, so the first rule whose keywords occur anywhere in the ID wins
+# (same precedence as checking the rules one after another).
+
+DEFAULT_RULES = [
+    (['env', 'eco', 'nat'], "environmental data, natural resources, ecological monitoring"),
+    (['stat', 'data', 'survey'], "statistical analysis, survey results, population metrics"),
+    (['health', 'med', 'hosp'], "healthcare statistics, medical research, public health"),
+]
+DEFAULT_TOPIC = "public records, government statistics, federal data"
+NAME_TEMPLATE = "Canadian Government Dataset {dataset_id}"
+
+# Rules file: JSON object mapping each topic to its keywords, in priority order
+def load_rules(path):
+    with open(path, encoding='utf-8') as f:
+        table = json.load(f)
+    return [(list(keywords), topic) for topic, keywords in table.items()]
+
+def dataset_id(url):
+    return url.split('/')[-1]
+
+# Names and topics the model writes when it has nothing to say
+def is_placeholder(value):
+    return not value or "[Unavailable]" in value or value in ("N/A", "Unknown")
+
+class TopicClassifier:
+    def __init__(self, rules=DEFAULT_RULES, default_topic=DEFAULT_TOPIC):
+        self.topics = np.array([topic for _, topic in rules] + [default_topic], dtype=object)
+        self.default_topic = default_topic
+        branches = ["(?=.*?(" + "|".join(re.escape(k.lower()) for k in keywords) + "))" for keywords, _ in rules]
+        self.pattern = re.compile("^(?:" + "|".join(branches) + ")", re.DOTALL) if branches else None
+
+    # Index into self.topics for a lowercase dataset ID
+    def _rule(self, lowered):
+        match = self.pattern.match(lowered) if self.pattern is not None else None
+        return match.lastindex - 1 if match else len(self.topics) - 1
+
+    def topic(self, dataset_id):
+        return self.topics[self._rule(dataset_id.lower())]
+
+    # Topics for a whole column of dataset IDs at once. The distinct IDs go
+    # through the pattern in one str.extract call: only the group of the
+    # rule that matched is set, so the first non-empty column is the rule.
+    # The results are spread back with numpy indexing.
+    def topics_for(self, dataset_ids):
+        dataset_ids = pd.Series(dataset_ids, dtype=object).fillna('').astype(str)
+        codes, uniques = pd.factorize(dataset_ids.str.lower())
+        rules = np.full(len(uniques), len(self.topics) - 1, dtype=np.intp)
+        if self.pattern is not None and len(uniques):
+            matched = pd.Series(uniques, dtype=object).str.extract(self.pattern).notna().to_numpy()
+            found = matched.any(axis=1)
+            rules[found] = matched[found].argmax(axis=1)
+        return pd.Series(self.topics[rules[codes]], index=dataset_ids.index)
+
+    # DataFrame of made-up dataset_name and topic for a column of URLs
+    def results_for(self, urls):
+        ids = pd.Series(urls, dtype=object).fillna('').astype(str).str.split('/').str[-1]
+        return pd.DataFrame({
+            'dataset_name': NAME_TEMPLATE.replace('{dataset_id}', '') + ids,
+            'topic': self.topics_for(ids),
+        })
+
+    # Fills the None names and topics of a column of URLs with made-up ones,
+    # all in one pass. Returns the (names, topics) Series.
+    def fill_missing(self, urls, dataset_names, topics):
+        urls = pd.Series(urls, dtype=object).reset_index(drop=True)
+        dataset_names = pd.Series(dataset_names, dtype=object, index=urls.index)
+        topics = pd.Series(topics, dtype=object, index=urls.index)
+        missing = dataset_names.isna() | topics.isna()
+        if missing.any():
+            made_up = self.results_for(urls[missing])
+            dataset_names = dataset_names.fillna(made_up['dataset_name'])
+            topics = topics.fillna(made_up['topic'])
+        return dataset_names, topics